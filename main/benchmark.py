@@ -0,0 +1,543 @@
+"""Offline benchmark for every pipeline stage.
+
+Generates a synthetic scanned PDF (text, a light-gray diagonal watermark and
+scanner noise), then times each stage in its own subprocess with the local
+storage backend, so no credentials or network are needed::
+
+    python main/benchmark.py --pages 8 --dpi 300 --output bench.json
+    python main/benchmark.py --compare bench.json   # exit 1 on a regression
+
+For every stage it reports pages/sec, peak RSS and bytes written.
+``--profiles`` also times every enhancement profile on the de-watermarked
+pages and reports how closely each agrees with the "quality" profile, and
+``--buffers`` times text_enhancement's Enhancer (work buffers reused across
+pages) against enhance_array (fresh arrays for every intermediate).
+"""
+
+import argparse
+import json
+import os
+import platform
+import random
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+
+MAIN_DIR = os.path.dirname(os.path.abspath(__file__))
+STAGES = ("split", "watermark", "enhance", "ocr", "combine")
+
+WORDS = (
+    "lorem ipsum dolor sit amet consectetur adipiscing elit sed do eiusmod "
+    "tempor incididunt ut labore et dolore magna aliqua enim ad minim veniam"
+).split()
+
+
+def make_synthetic_pdf(pdf_path, pages=4, scan_dpi=300, seed=0, noise=8.0):
+    """Writes a scanned-looking PDF: every page is a noisy raster image.
+
+    Each page carries a few paragraphs of text and a light-gray diagonal
+    "CONFIDENTIAL" watermark inside remove_watermark's default bands.
+    ``noise`` is the standard deviation of the added scanner noise.
+    """
+    import cv2
+    import fitz  # PyMuPDF
+    import numpy as np
+
+    rng = random.Random(seed)
+    noise_rng = np.random.default_rng(seed)
+    out = fitz.open()
+    for _ in range(pages):
+        src = fitz.open()
+        page = src.new_page()  # A4-ish default page size
+        y = 72
+        while y < page.rect.height - 72:
+            line = " ".join(rng.choice(WORDS) for _ in range(rng.randint(6, 11)))
+            page.insert_text((72, y), line, fontsize=11)
+            y += 16 if rng.random() > 0.15 else 32  # Paragraph breaks
+        center = fitz.Point(page.rect.width / 2, page.rect.height / 2)
+        page.insert_text(
+            center - (220, 0),
+            "CONFIDENTIAL",
+            fontsize=72,
+            color=(0.85, 0.85, 0.85),
+            morph=(center, fitz.Matrix(-35)),
+            overlay=False,
+        )
+
+        pix = page.get_pixmap(dpi=scan_dpi, colorspace=fitz.csGRAY, alpha=False)
+        img = np.frombuffer(pix.samples, dtype=np.uint8).reshape(pix.h, pix.w)
+        noisy = img.astype(np.int16) + noise_rng.normal(0, noise, img.shape).astype(
+            np.int16
+        )
+        ok, jpeg = cv2.imencode(
+            ".jpg",
+            np.clip(noisy, 0, 255).astype(np.uint8),
+            [cv2.IMWRITE_JPEG_QUALITY, 90],
+        )
+        scanned = out.new_page(width=page.rect.width, height=page.rect.height)
+        scanned.insert_image(scanned.rect, stream=jpeg.tobytes())
+        src.close()
+    out.save(pdf_path, deflate=True)
+    out.close()
+
+
+def _list_images(folder):
+    return sorted(
+        os.path.join(folder, f) for f in os.listdir(folder) if f.endswith(".png")
+    )
+
+
+def _folder_bytes(folder):
+    return sum(
+        os.path.getsize(os.path.join(folder, f))
+        for f in os.listdir(folder)
+        if os.path.isfile(os.path.join(folder, f))
+    )
+
+
+def run_stage(stage, work_dir, dpi):
+    """Runs one stage on the fixtures in ``work_dir``. Returns (pages, out_dir).
+
+    Each stage reads the previous stage's output, so stages must run in
+    STAGES order; only the stage's own work is timed by the caller.
+    """
+    import cv2
+
+    folders = {name: os.path.join(work_dir, name) for name in STAGES}
+    out_dir = folders[stage]
+    os.makedirs(out_dir, exist_ok=True)
+
+    if stage == "split":
+        from split_pdf import iter_pages
+
+        pages = 0
+        for page_number, img in iter_pages(
+            os.path.join(work_dir, "input.pdf"), dpi=dpi
+        ):
+            cv2.imwrite(os.path.join(out_dir, f"page_{page_number:04d}.png"), img)
+            pages += 1
+        return pages, out_dir
+
+    if stage == "watermark":
+        from remove_watermark import remove_watermark
+
+        images = _list_images(folders["split"])
+        for image_path in images:
+            img = cv2.imread(image_path)
+            remove_watermark(img)
+            cv2.imwrite(os.path.join(out_dir, os.path.basename(image_path)), img)
+        return len(images), out_dir
+
+    if stage == "enhance":
+        from text_enhancement import enhance_page, save_enhanced
+
+        images = _list_images(folders["watermark"])
+        for image_path in images:
+            img = cv2.imread(image_path, cv2.IMREAD_GRAYSCALE)
+            enhanced = enhance_page(img)
+            save_enhanced(os.path.join(out_dir, os.path.basename(image_path)), enhanced)
+        return len(images), out_dir
+
+    if stage == "ocr":
+        from ocr import ocr_batch
+
+        images = _list_images(folders["enhance"])
+        if not ocr_batch(images, os.path.join(out_dir, "ocr_batch.pdf"), image_dpi=dpi):
+            raise RuntimeError("ocrmypdf failed")
+        return len(images), out_dir
+
+    if stage == "combine":
+        from combine_ocr_pdf import merge_pdfs
+
+        page_pdfs = os.path.join(work_dir, "page_pdfs")
+        page_order = [
+            (os.path.join(page_pdfs, f), None) for f in sorted(os.listdir(page_pdfs))
+        ]
+        return merge_pdfs(page_order, os.path.join(out_dir, "merged.pdf")), out_dir
+
+    raise ValueError(f"Unknown stage: {stage}")
+
+
+def prepare_stage(stage, work_dir):
+    """Builds untimed fixtures a stage needs beyond the previous stage's output.
+
+    The merge works on one PDF per page, as per-page OCR would leave them.
+    They are cut from the OCR output, or built from the enhanced images
+    (without a text layer) when the OCR stage could not run.
+    """
+    if stage != "combine":
+        return
+    import fitz  # PyMuPDF
+    from ocr import assemble_images_pdf
+
+    page_pdfs = os.path.join(work_dir, "page_pdfs")
+    os.makedirs(page_pdfs, exist_ok=True)
+    ocr_pdf = os.path.join(work_dir, "ocr", "ocr_batch.pdf")
+    if not os.path.exists(ocr_pdf):
+        for image_path in _list_images(os.path.join(work_dir, "enhance")):
+            name = os.path.splitext(os.path.basename(image_path))[0]
+            assemble_images_pdf([image_path], os.path.join(page_pdfs, f"{name}.pdf"))
+        return
+    with fitz.open(ocr_pdf) as doc:
+        for index in range(doc.page_count):
+            single = fitz.open()
+            single.insert_pdf(doc, from_page=index, to_page=index)
+            single.save(os.path.join(page_pdfs, f"page_{index + 1:04d}.pdf"))
+            single.close()
+
+
+def _stage_child(stage, work_dir, dpi):
+    """Subprocess entry point: runs one stage and prints its metrics as JSON."""
+    sys.path.insert(0, MAIN_DIR)
+    os.chdir(work_dir)  # Keep the stages' default output folders in the sandbox
+
+    prepare_stage(stage, work_dir)
+    start = time.perf_counter()
+    pages, out_dir = run_stage(stage, work_dir, dpi)
+    seconds = time.perf_counter() - start
+    print(
+        json.dumps(
+            {
+                "pages": pages,
+                "seconds": round(seconds, 4),
+                "pages_per_sec": round(pages / seconds, 3) if seconds else None,
+                "peak_rss_mb": round(
+                    resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1
+                ),
+                "bytes_written": _folder_bytes(out_dir),
+            }
+        )
+    )
+
+
+def _agreement(result, reference):
+    """Returns (pixel_agreement, ink_iou) of two enhanced pages.
+
+    Pixel agreement is dominated by the white background, so the overlap of
+    the black (ink) pixels is reported as well.
+    """
+    ink, reference_ink = result == 0, reference == 0
+    union = (ink | reference_ink).sum()
+    ink_iou = (ink & reference_ink).sum() / union if union else 1.0
+    return float((result == reference).mean()), float(ink_iou)
+
+
+def _profiles_child(work_dir):
+    """Subprocess entry point: times each enhancement profile and prints JSON.
+
+    Every profile runs on the de-watermarked pages and is compared page by
+    page against the "quality" profile's output. "auto" judges each page's
+    noise on the split output, before watermark removal, as the stages do.
+    """
+    sys.path.insert(0, MAIN_DIR)
+    os.chdir(work_dir)
+    import cv2
+    from text_enhancement import (
+        PROFILE_CHOICES,
+        enhance_page,
+        estimate_noise,
+        select_profile,
+    )
+
+    images = [
+        cv2.imread(image_path, cv2.IMREAD_GRAYSCALE)
+        for image_path in _list_images(os.path.join(work_dir, "watermark"))
+    ]
+    noises = [
+        estimate_noise(cv2.imread(image_path, cv2.IMREAD_GRAYSCALE))
+        for image_path in _list_images(os.path.join(work_dir, "split"))
+    ]
+    results, references = {}, []
+    for profile in ("quality",) + tuple(p for p in PROFILE_CHOICES if p != "quality"):
+        seconds, agreement, ink_iou, chosen = 0.0, 0.0, 0.0, {}
+        for index, img in enumerate(images):
+            start = time.perf_counter()
+            name, params = select_profile(img, profile, noise=noises[index])
+            enhanced = enhance_page(img, params).copy()
+            seconds += time.perf_counter() - start
+            chosen[name] = chosen.get(name, 0) + 1
+            if profile == "quality":
+                references.append(enhanced)
+            page_agreement, page_iou = _agreement(enhanced, references[index])
+            agreement += page_agreement
+            ink_iou += page_iou
+        results[profile] = {
+            "pages": len(images),
+            "seconds": round(seconds, 4),
+            "pages_per_sec": round(len(images) / seconds, 3) if seconds else None,
+            "pixel_agreement": round(agreement / len(images), 5),
+            "ink_iou": round(ink_iou / len(images), 5),
+            "chosen": chosen,
+        }
+    results["auto"]["noise"] = [round(noise, 2) for noise in noises]
+    print(json.dumps(results))
+
+
+def _buffers_child(work_dir, rounds=3):
+    """Subprocess entry point: times Enhancer against enhance_array, prints JSON.
+
+    Both run on every de-watermarked page for each profile, interleaved page
+    by page; a page's time is its fastest of ``rounds`` runs. The Enhancer
+    is warmed up on the first page so its buffers exist before timing, as
+    they do for every page after the first in a run.
+    """
+    sys.path.insert(0, MAIN_DIR)
+    os.chdir(work_dir)
+    import cv2
+    import numpy as np
+    from text_enhancement import ENHANCE_PROFILES, Enhancer, enhance_array
+
+    images = [
+        cv2.imread(image_path, cv2.IMREAD_GRAYSCALE)
+        for image_path in _list_images(os.path.join(work_dir, "watermark"))
+    ]
+    results = {}
+    for profile, params in ENHANCE_PROFILES.items():
+        enhancer = Enhancer(params)
+        enhancer.enhance(images[0])
+        best = {"enhance_array": [float("inf")] * len(images)}
+        best["Enhancer"] = list(best["enhance_array"])
+        identical = True
+        for _ in range(rounds):
+            for index, img in enumerate(images):
+                start = time.perf_counter()
+                expected = enhance_array(img, params)
+                middle = time.perf_counter()
+                result = enhancer.enhance(img)
+                end = time.perf_counter()
+                best["enhance_array"][index] = min(
+                    best["enhance_array"][index], middle - start
+                )
+                best["Enhancer"][index] = min(best["Enhancer"][index], end - middle)
+                identical = identical and np.array_equal(result, expected)
+        seconds = {name: sum(times) for name, times in best.items()}
+        results[profile] = {
+            "pages": len(images),
+            **{f"{name}_seconds": round(t, 4) for name, t in seconds.items()},
+            "speedup": round(seconds["enhance_array"] / seconds["Enhancer"], 4),
+            "identical": identical,
+        }
+    print(json.dumps(results))
+
+
+def _git_commit():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            cwd=MAIN_DIR,
+            capture_output=True,
+            text=True,
+            check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run_benchmark(
+    pages=4, dpi=300, stages=STAGES, seed=0, noise=8.0, profiles=False, buffers=False
+):
+    """Generates fixtures and benchmarks each stage. Returns the report dict.
+
+    With ``profiles`` the enhancement profiles are compared as well, and
+    with ``buffers`` Enhancer is timed against enhance_array; both need the
+    split and watermark stages.
+    """
+    report = {
+        "meta": {
+            "commit": _git_commit(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpu_count": os.cpu_count(),
+            "pages": pages,
+            "dpi": dpi,
+            "seed": seed,
+            "noise": noise,
+            "enhance_output": os.getenv("ENHANCE_OUTPUT", "bilevel"),
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        },
+        "stages": {},
+    }
+    with tempfile.TemporaryDirectory(prefix="pdf-bench-") as work_dir:
+        # Anything a stage would upload goes to a folder in the sandbox
+        env = {
+            **os.environ,
+            "PAGE_CACHE": "0",
+            "STORAGE_BACKEND": "local",
+            "LOCAL_STORAGE_DIR": os.path.join(work_dir, "storage"),
+        }
+
+        def run_child(child):
+            # Every child is forked from this (small) process; Linux carries
+            # ru_maxrss across exec, so nothing heavy may run in the parent.
+            return subprocess.run(
+                [sys.executable, os.path.abspath(__file__), "--child", child]
+                + ["--work-dir", work_dir, "--dpi", str(dpi)]
+                + ["--pages", str(pages), "--seed", str(seed)]
+                + ["--noise", str(noise)],
+                env=env,
+                capture_output=True,
+                text=True,
+            )
+
+        print(f"🧪 Generating a {pages}-page synthetic scan...")
+        run_child("fixture").check_returncode()
+
+        for stage in STAGES:
+            if stage not in stages:
+                continue
+            result = run_child(stage)
+            if result.returncode != 0:
+                error = (result.stderr.strip().splitlines() or ["unknown error"])[-1]
+                print(f"⚠️ {stage}: skipped ({error})")
+                report["stages"][stage] = {"skipped": error}
+                continue
+            metrics = json.loads(result.stdout.strip().splitlines()[-1])
+            report["stages"][stage] = metrics
+            print(
+                f"⏱️ {stage:<9} {metrics['pages_per_sec']:>8} pages/s  "
+                f"{metrics['peak_rss_mb']:>7} MB peak  "
+                f"{metrics['bytes_written'] / 1024**2:>7.1f} MB written"
+            )
+
+        if profiles:
+            result = run_child("profiles")
+            if result.returncode != 0:
+                error = (result.stderr.strip().splitlines() or ["unknown error"])[-1]
+                print(f"⚠️ profiles: skipped ({error})")
+            else:
+                report["profiles"] = json.loads(result.stdout.strip().splitlines()[-1])
+                quality_rate = report["profiles"]["quality"]["pages_per_sec"]
+                for profile, metrics in report["profiles"].items():
+                    print(
+                        f"🎛️ {profile:<9} {metrics['pages_per_sec']:>8} pages/s "
+                        f"({metrics['pages_per_sec'] / quality_rate:.1f}x)  "
+                        f"{metrics['pixel_agreement']:.2%} pixels, "
+                        f"{metrics['ink_iou']:.2%} ink IoU vs quality  "
+                        f"{metrics['chosen']}"
+                    )
+
+        if buffers:
+            result = run_child("buffers")
+            if result.returncode != 0:
+                error = (result.stderr.strip().splitlines() or ["unknown error"])[-1]
+                print(f"⚠️ buffers: skipped ({error})")
+            else:
+                report["buffers"] = json.loads(result.stdout.strip().splitlines()[-1])
+                for profile, metrics in report["buffers"].items():
+                    print(
+                        f"♻️ {profile:<9} enhance_array "
+                        f"{metrics['enhance_array_seconds']:.3f}s, Enhancer "
+                        f"{metrics['Enhancer_seconds']:.3f}s "
+                        f"({metrics['speedup']:.3f}x, "
+                        f"{'identical' if metrics['identical'] else 'DIFFERENT'})"
+                    )
+    return report
+
+
+def compare_reports(baseline, current, threshold=0.10):
+    """Prints per-stage throughput and output size changes.
+
+    Returns the stages whose throughput regressed.
+    """
+    regressions = []
+    for stage, metrics in current["stages"].items():
+        before = baseline.get("stages", {}).get(stage, {})
+        if "pages_per_sec" not in metrics or "pages_per_sec" not in before:
+            continue
+        change = metrics["pages_per_sec"] / before["pages_per_sec"] - 1
+        marker = "✅"
+        if change < -threshold:
+            marker = "❌"
+            regressions.append(stage)
+        print(
+            f"{marker} {stage:<9} {before['pages_per_sec']:>8} -> "
+            f"{metrics['pages_per_sec']:>8} pages/s ({change:+.1%}), "
+            f"{before['bytes_written'] / 1024:.0f} -> "
+            f"{metrics['bytes_written'] / 1024:.0f} KB written"
+        )
+    return regressions
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark pipeline stages offline.")
+    parser.add_argument("--pages", type=int, default=4, help="Synthetic page count.")
+    parser.add_argument("--dpi", type=int, default=300, help="Scan/render DPI.")
+    parser.add_argument("--seed", type=int, default=0, help="Fixture random seed.")
+    parser.add_argument(
+        "--noise",
+        type=float,
+        default=8.0,
+        help="Scanner noise standard deviation of the fixture (0 = clean).",
+    )
+    parser.add_argument(
+        "--profiles",
+        action="store_true",
+        help="Also compare the enhancement profiles' speed and agreement.",
+    )
+    parser.add_argument(
+        "--buffers",
+        action="store_true",
+        help="Also time the buffer-reusing Enhancer against enhance_array.",
+    )
+    parser.add_argument(
+        "--stages",
+        nargs="+",
+        choices=STAGES,
+        default=list(STAGES),
+        help="Stages to run (later stages need the earlier ones).",
+    )
+    parser.add_argument("--output", help="Write the JSON report to this file.")
+    parser.add_argument("--compare", help="Baseline JSON report to compare against.")
+    parser.add_argument(
+        "--threshold",
+        type=float,
+        default=0.10,
+        help="Allowed pages/sec drop before --compare fails (default 10%%).",
+    )
+    parser.add_argument(
+        "--child",
+        choices=STAGES + ("fixture", "profiles", "buffers"),
+        help=argparse.SUPPRESS,
+    )
+    parser.add_argument("--work-dir", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child == "fixture":
+        pdf_path = os.path.join(args.work_dir, "input.pdf")
+        make_synthetic_pdf(pdf_path, args.pages, args.dpi, args.seed, args.noise)
+        raise SystemExit(0)
+    if args.child == "profiles":
+        _profiles_child(args.work_dir)
+        raise SystemExit(0)
+    if args.child == "buffers":
+        _buffers_child(args.work_dir)
+        raise SystemExit(0)
+    if args.child:
+        _stage_child(args.child, args.work_dir, args.dpi)
+        raise SystemExit(0)
+
+    report = run_benchmark(
+        args.pages,
+        args.dpi,
+        args.stages,
+        args.seed,
+        args.noise,
+        args.profiles,
+        args.buffers,
+    )
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+        print(f"📝 Report written to {args.output}")
+    else:
+        print(json.dumps(report, indent=2))
+
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+        regressions = compare_reports(baseline, report, args.threshold)
+        if regressions:
+            print(f"❌ Regressed stages: {', '.join(regressions)}")
+            raise SystemExit(1)
@@ -1,7 +1,14 @@
+import argparse
 import os
+import re
+import time
 
 import fitz  # PyMuPDF
+import instrument
 from drive_utils import upload_to_drive  # Import upload function
+from drive_utils import add_storage_argument, apply_storage_arguments, uploads_stage
+from journal import atomic_output
+from manifest import MANIFEST_PATH, Manifest, shard_manifest_path
 
 # Define folder containing PDFs
 pdf_folder = "main/pdfs/pdfs_output"
@@ -10,44 +17,223 @@ output_pdf = os.path.join(pdf_folder, "percentage.pdf")
 
 # Function to extract page number safely
 def extract_page_number(filename):
-    parts = filename.split("_")
+    """Sort key comparing the numbers in a file name numerically.
+
+    "page_2.pdf" sorts before "page_10.pdf"; names are compared piece by
+    piece so files without a number still get a stable position.
+    """
+    return [
+        (0, int(part), "") if part.isdigit() else (1, 0, part)
+        for part in re.split(r"(\d+)", filename)
+    ]
+
+
+def page_order_from_folder(folder, exclude=()):
+    """Fallback page order for runs without a manifest: (pdf_path, None) pairs."""
+    pdf_files = sorted(
+        [f for f in os.listdir(folder) if f.endswith(".pdf") and f not in exclude],
+        key=extract_page_number,
+    )
+    return [(os.path.join(folder, f), None) for f in pdf_files]
+
+
+def page_order_from_manifest(manifest):
+    """Page order from the manifest: (pdf_path, index) pairs.
+
+    Blank pages come as (None, (width, height)) so the merge can insert an
+    empty page of the original size and page numbering is preserved.
+    """
+    page_order = []
+    for page_number, pdf_path, index in manifest.ordered():
+        if pdf_path is None:
+            info = manifest.pages[page_number]
+            index = (info["width"], info["height"])
+        page_order.append((pdf_path, index))
+    return page_order
+
+
+def manifest_problems(manifest):
+    """Lists the manifest's pages without an output or whose PDF does not exist."""
+    problems = []
+    missing = manifest.missing_pages()
+    if missing:
+        problems.append(f"{len(missing)} pages have no output: {missing}")
+    for page_number in sorted(manifest.pages):
+        if "pdf" in manifest.pages[page_number]:
+            pdf_path = manifest.page_pdf(page_number)
+            if not os.path.exists(pdf_path):
+                problems.append(f"page {page_number}: {pdf_path} does not exist")
+    return problems
+
+
+def load_shard_manifests(count, path=MANIFEST_PATH):
+    """Loads the ``count`` shard manifests of a sharded run as one Manifest.
+
+    Raises ValueError listing every problem found: missing shard manifests,
+    shards of different sources, and pages that are missing (including
+    pages a shard failed on), covered by two shards or whose output PDF
+    does not exist.
+    """
+    problems, shards = [], []
+    for index in range(1, count + 1):
+        shard_path = shard_manifest_path(index, count, path)
+        if os.path.exists(shard_path):
+            shards.append(Manifest.load(shard_path))
+        else:
+            problems.append(f"shard {index}/{count}: {shard_path} is missing")
+
+    sources = {(shard.source, shard.page_count) for shard in shards}
+    if len(sources) > 1:
+        problems.append(f"shards come from different sources: {sorted(sources)}")
+    source, page_count = min(sources) if sources else (None, None)
+
+    merged = Manifest(path, source=source, page_count=page_count)
+    owners = {}
+    for shard in shards:
+        for page_number, info in shard.pages.items():
+            if page_number in owners:
+                problems.append(
+                    f"page {page_number} is in shards {owners[page_number]} "
+                    f"and {shard.shard[0]}"
+                )
+            owners[page_number] = shard.shard[0]
+            merged.pages[page_number] = info
+
+    problems += manifest_problems(merged)
+    if problems:
+        raise ValueError("\n".join(problems))
+    return merged
+
+
+def merge_ranges(page_order):
+    """Collapses consecutive pages of the same PDF into (pdf_path, first, last).
+
+    ``first``/``last`` of None means every page of ``pdf_path``. Blank pages
+    (a ``pdf_path`` of None) are never collapsed.
+    """
+    ranges = []
+    for pdf_path, index in page_order:
+        if (
+            pdf_path is not None
+            and index is not None
+            and ranges
+            and ranges[-1][0] == pdf_path
+            and ranges[-1][2] == index - 1
+        ):
+            ranges[-1] = (pdf_path, ranges[-1][1], index)
+        else:
+            ranges.append((pdf_path, index, index))
+    return ranges
+
+
+def merge_pdfs(page_order, output_path):
+    """Merges pages into ``output_path``, opening each source PDF once.
+
+    Consecutive pages of one source are inserted with a single insert_pdf
+    call, and the result is saved with garbage collection, object
+    deduplication and deflate so shared fonts and resources are stored once.
+    Blank pages in ``page_order`` become empty pages of their recorded size.
+    """
+    merged_pdf = fitz.open()
+    open_docs = {}
     try:
-        return int(parts[-1].split(".")[0])  # Extract number if available
-    except ValueError:
-        return float("inf")  # If no number, place at the end
+        for pdf_path, first, last in merge_ranges(page_order):
+            if pdf_path is None:
+                width, height = first
+                merged_pdf.new_page(width=width, height=height)
+                continue
+            if pdf_path not in open_docs:
+                open_docs[pdf_path] = fitz.open(pdf_path)
+            doc = open_docs[pdf_path]
+            if first is None:
+                merged_pdf.insert_pdf(doc)
+            else:
+                merged_pdf.insert_pdf(doc, from_page=first, to_page=last)
+    finally:
+        for doc in open_docs.values():
+            doc.close()
 
+    page_count = merged_pdf.page_count
+    merged_pdf.save(
+        output_path,
+        garbage=4,  # Drop unused objects and merge duplicate ones
+        deflate=True,
+        deflate_images=True,
+        deflate_fonts=True,
+        use_objstms=True,
+    )
+    merged_pdf.close()
+    return page_count
 
-# Get and sort input PDFs **excluding** percentage.pdf
-pdf_files = sorted(
-    [f for f in os.listdir(pdf_folder) if f.endswith(".pdf") and f != "percentage.pdf"],
-    key=extract_page_number,
-)
 
-if not pdf_files:
-    print("⚠️ No valid PDF files found for merging.")
-    exit()
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Merge OCRed pages into one PDF.")
+    parser.add_argument("--output", default=output_pdf, help="Path of the merged PDF.")
+    parser.add_argument(
+        "--shards",
+        type=int,
+        metavar="N",
+        help="Merge the N shard manifests of a pipeline.py --shard run, "
+        "failing if any page is missing.",
+    )
+    add_storage_argument(parser)
+    args = parser.parse_args()
+    apply_storage_arguments(args)
+    output_pdf = args.output
 
-print(f"📄 Merging {len(pdf_files)} PDFs in order...")
+    output_name = os.path.basename(output_pdf)
+    manifest = Manifest.load(MANIFEST_PATH)
+    if args.shards:
+        try:
+            manifest = load_shard_manifests(args.shards)
+        except ValueError as error:
+            print(f"❌ Shard outputs are incomplete:\n{error}")
+            raise SystemExit(1)
+        manifest.save()  # The combined manifest, for later stages and debugging
+        page_order = page_order_from_manifest(manifest)
+        print(f"📒 Using page order from {args.shards} shard manifests")
+    elif manifest.pages:
+        problems = manifest_problems(manifest)
+        if problems:
+            print("❌ Page outputs are incomplete:\n" + "\n".join(problems))
+            raise SystemExit(1)
+        page_order = page_order_from_manifest(manifest)
+        print(f"📒 Using page order from {MANIFEST_PATH}")
+    else:
+        page_order = page_order_from_folder(pdf_folder, exclude=(output_name,))
+        print("⚠️ No manifest found, ordering PDFs by file name.")
 
-# Create a new PDF document
-merged_pdf = fitz.open()
+    if not page_order:
+        print("⚠️ No valid PDF files found for merging.")
+        exit()
 
-for pdf in pdf_files:
-    pdf_path = os.path.join(pdf_folder, pdf)
-    doc = fitz.open(pdf_path)
-    merged_pdf.insert_pdf(doc)
-    doc.close()
+    print(f"📄 Merging {len(page_order)} pages in order...")
 
-# Save the merged PDF
-merged_pdf.save(output_pdf)
-merged_pdf.close()
+    input_bytes = sum(
+        os.path.getsize(pdf_path)
+        for pdf_path in {pdf_path for pdf_path, _ in page_order if pdf_path}
+    )
+    start = time.perf_counter()
+    with instrument.span("merge", "combine", pages=len(page_order)) as info:
+        with atomic_output(output_pdf) as tmp_pdf:
+            page_count = merge_pdfs(page_order, tmp_pdf)
+        info["bytes_written"] = os.path.getsize(output_pdf)
+    elapsed = time.perf_counter() - start
+    size_mb = os.path.getsize(output_pdf) / 1024**2
 
-print(f"✅ Merged PDF saved as: {output_pdf}")
+    print(
+        f"✅ Merged PDF saved as: {output_pdf} "
+        f"({page_count} pages, {size_mb:.1f} MB in {elapsed:.1f}s, "
+        f"from {input_bytes / 1024**2:.1f} MB of input PDFs)"
+    )
 
-# Upload the final merged PDF to Google Drive
-uploaded_pdf_id = upload_to_drive(output_pdf, folder_name="Merged_PDFs")
+    # Upload the final merged PDF to Google Drive
+    if not uploads_stage("final"):
+        print("⏭️ Upload policy skips the merged PDF.")
+        raise SystemExit(0)
+    uploaded_pdf_id = upload_to_drive(output_pdf, folder_name="Merged_PDFs")
 
-if uploaded_pdf_id:
-    print(f"🚀 Uploaded merged PDF to Google Drive: {uploaded_pdf_id}")
-else:
-    print("❌ Failed to upload merged PDF.")
+    if uploaded_pdf_id:
+        print(f"🚀 Uploaded merged PDF to Google Drive: {uploaded_pdf_id}")
+    else:
+        print("❌ Failed to upload merged PDF.")
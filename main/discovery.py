@@ -0,0 +1,173 @@
+"""Finds new and changed source PDFs without listing the folder every run.
+
+The first scan lists the source folder once (all pages) and saves a token
+for the storage's changes feed; every later scan reads only the changes
+since that token. New PDFs and PDFs whose md5 changed are queued, and a PDF
+stays queued until ``done`` is called for it, so a run that dies part-way
+picks it up again next time::
+
+    python main/discovery.py scan            # update the queue
+    python main/discovery.py pending         # "file_id<TAB>name" per queued PDF
+    python main/discovery.py done FILE_ID    # mark a PDF as processed
+
+The state (token, queue and the md5 of every processed PDF) is JSON in
+DISCOVERY_STATE, which the workflow keeps in its cache between runs.
+"""
+
+import argparse
+import json
+import os
+
+from drive_utils import add_storage_argument, apply_storage_arguments, get_storage
+
+DISCOVERY_STATE = os.getenv(
+    "DISCOVERY_STATE",
+    os.path.expanduser("~/.cache/pdf-automation/discovery.json"),
+)
+PDF_MIME_TYPE = "application/pdf"
+
+
+class DiscoveryState:
+    """Changes-feed token, queued PDFs and processed md5s, saved atomically."""
+
+    def __init__(self, path=DISCOVERY_STATE, data=None):
+        data = data or {}
+        self.path = path
+        self.backend = data.get("backend")
+        self.folder_id = data.get("folder_id")
+        self.page_token = data.get("page_token")
+        self.pending = data.get("pending", {})  # file_id -> file metadata
+        self.processed = data.get("processed", {})  # file_id -> md5Checksum
+
+    @classmethod
+    def load(cls, path=DISCOVERY_STATE):
+        """Reads the state, or returns an empty one if it does not exist."""
+        if not os.path.exists(path):
+            return cls(path)
+        with open(path) as f:
+            return cls(path, json.load(f))
+
+    def save(self):
+        """Writes the state through a temporary file and an atomic rename."""
+        folder = os.path.dirname(self.path)
+        if folder:
+            os.makedirs(folder, exist_ok=True)
+        data = {
+            "backend": self.backend,
+            "folder_id": self.folder_id,
+            "page_token": self.page_token,
+            "pending": self.pending,
+            "processed": self.processed,
+        }
+        tmp_path = f"{self.path}.{os.getpid()}.tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(data, f, indent=2)
+        os.replace(tmp_path, self.path)
+
+    def mark_done(self, file_id):
+        """Records a queued PDF as processed. Returns False if it was not queued."""
+        file = self.pending.pop(file_id, None)
+        if file is None:
+            return False
+        self.processed[file_id] = file.get("md5Checksum")
+        return True
+
+
+def is_source_pdf(file):
+    """True for PDFs (by MIME type or extension) that are not in the trash."""
+    if file.get("trashed"):
+        return False
+    return file.get("mimeType") == PDF_MIME_TYPE or file["name"].lower().endswith(
+        ".pdf"
+    )
+
+
+def scan(state, storage=None, folder_id=None):
+    """Queues the source folder's new and changed PDFs. Returns the newly queued files.
+
+    Runs a full (paginated) listing when the state has no token yet, or
+    belongs to another backend or folder, and reads the changes feed
+    otherwise. PDFs that were deleted, trashed or moved out of the folder
+    leave the queue.
+    """
+    storage = storage or get_storage()
+    folder_id = folder_id or storage.root_folder_id
+    if (
+        not state.page_token
+        or state.backend != storage.name
+        or state.folder_id != folder_id
+    ):
+        # Take the token before listing, so changes made during the
+        # listing are seen (again) by the next scan rather than lost
+        page_token = storage.start_page_token()
+        candidates = [f for f in storage.list_files(folder_id) if is_source_pdf(f)]
+        if state.backend != storage.name or state.folder_id != folder_id:
+            state.pending, state.processed = {}, {}
+        print(f"🔎 Listed the source folder: {len(candidates)} PDFs")
+    else:
+        changes, page_token = storage.list_changes(state.page_token)
+        candidates = {}
+        for change in changes:
+            file = change.get("file")
+            if (
+                change.get("removed")
+                or not file
+                or folder_id not in file.get("parents", [])
+                or not is_source_pdf(file)
+            ):
+                state.pending.pop(change["fileId"], None)
+                candidates.pop(change["fileId"], None)
+                continue
+            candidates[file["id"]] = file  # Latest change per file wins
+        candidates = list(candidates.values())
+        print(f"🔎 Read {len(changes)} changes: {len(candidates)} PDFs touched")
+
+    queued = []
+    for file in candidates:
+        md5 = file.get("md5Checksum")
+        if md5 and state.processed.get(file["id"]) == md5:
+            continue  # Already processed with this content
+        state.pending[file["id"]] = {
+            key: file[key]
+            for key in ("id", "name", "md5Checksum", "size")
+            if key in file
+        }
+        queued.append(file)
+
+    state.backend, state.folder_id, state.page_token = (
+        storage.name,
+        folder_id,
+        page_token,
+    )
+    return queued
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Queue new or changed source PDFs.")
+    parser.add_argument("command", choices=("scan", "pending", "done"))
+    parser.add_argument("file_ids", nargs="*", help="IDs to mark done.")
+    parser.add_argument(
+        "--folder-id", help="Source folder (default: the storage's root folder)."
+    )
+    parser.add_argument("--state", default=DISCOVERY_STATE, help="State file.")
+    add_storage_argument(parser)
+    args = parser.parse_args()
+    apply_storage_arguments(args)
+
+    state = DiscoveryState.load(args.state)
+    if args.command == "scan":
+        queued = scan(state, folder_id=args.folder_id)
+        state.save()
+        for file in queued:
+            print(f"📥 Queued {file['name']} ({file['id']})")
+        print(f"📚 {len(state.pending)} PDFs waiting to be processed")
+    elif args.command == "pending":
+        for file_id, file in state.pending.items():
+            print(f"{file_id}\t{file['name']}")
+    else:
+        for file_id in args.file_ids:
+            if state.mark_done(file_id):
+                print(f"✅ Marked {file_id} as processed")
+            else:
+                print(f"⚠️ {file_id} is not queued")
+        state.save()
@@ -22,38 +22,59 @@
 #         else:
 #             print(f"❌ Error: {pdf_name} not found after download!")
 
+import argparse
 import os
-import time
+from concurrent.futures import ThreadPoolExecutor
 
-from drive_utils import download_from_drive, upload_to_drive
+from discovery import DISCOVERY_STATE, DiscoveryState, scan
+from drive_utils import (
+    add_storage_argument,
+    apply_storage_arguments,
+    download_file,
+    download_many,
+)
 
 # 📂 Define folder for storing PDFs
 PDF_DIR = "main/pdfs"
 os.makedirs(PDF_DIR, exist_ok=True)  # Ensure the directory exists
 
-# 📄 List of PDFs to download and re-upload
+# 📄 List of PDFs to download
 PDF_NAMES = ["demo.pdf"]  # Add more names if needed
 
 if __name__ == "__main__":
-    for pdf_name in PDF_NAMES:
-        print(f"🔄 Processing {pdf_name}...")
+    parser = argparse.ArgumentParser(description="Sync source PDFs from Drive.")
+    parser.add_argument("--workers", type=int, default=4, help="Parallel downloads.")
+    parser.add_argument(
+        "--discover",
+        action="store_true",
+        help="Download the PDFs discovery.py queues (new or changed since the "
+        "last scan) instead of PDF_NAMES.",
+    )
+    parser.add_argument(
+        "--state", default=DISCOVERY_STATE, help="Discovery state file."
+    )
+    add_storage_argument(parser)
+    args = parser.parse_args()
+    apply_storage_arguments(args)
 
-        # Step 1: Download the PDF from Google Drive
-        download_from_drive(pdf_name)
+    # Step 1: Download the PDFs from Google Drive (streamed, verified, atomic)
+    if args.discover:
+        state = DiscoveryState.load(args.state)
+        scan(state)
+        state.save()
+        files = list(state.pending.values())
+        print(f"🔄 Downloading {len(files)} queued PDFs...")
+        # Discovery already has the file IDs, so no name query per file
+        with ThreadPoolExecutor(max_workers=args.workers) as pool:
+            paths = pool.map(lambda file: download_file(file, PDF_DIR), files)
+            downloaded = {file["name"]: path for file, path in zip(files, paths)}
+    else:
+        print(f"🔄 Downloading {len(PDF_NAMES)} PDFs...")
+        downloaded = download_many(PDF_NAMES, PDF_DIR, workers=args.workers)
 
-        # Path of the downloaded PDF
-        pdf_path = os.path.join(PDF_DIR, pdf_name)
-
-        # Wait for the file to appear (handling potential delays)
-        for _ in range(10):  # Retry for up to 10 seconds
-            if os.path.exists(pdf_path) and os.path.getsize(pdf_path) > 0:
-                break
-            print(f"⏳ Waiting for {pdf_name} to appear...")
-            time.sleep(1)
-
-        # Step 2: Upload the PDF back to Google Drive
-        if os.path.exists(pdf_path) and os.path.getsize(pdf_path) > 0:
-            upload_to_drive(pdf_path)
+    # The source PDFs already live in Drive, so nothing is uploaded back
+    for pdf_name, pdf_path in downloaded.items():
+        if pdf_path and os.path.getsize(pdf_path) > 0:
             print(f"✅ Successfully processed {pdf_name}\n")
         else:
             print(f"❌ Error: {pdf_name} not found or empty after download!\n")
@@ -192,54 +192,244 @@
 #         print(f"❌ Failed to delete folder '{folder_name}': {error}")
 
 
+import hashlib
 import json
 import os
+import queue
+import re
+import shutil
+import tempfile
+import threading
 import time
+import zipfile
+from abc import ABC, abstractmethod
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlparse
 
+import google_auth_httplib2
+import httplib2
+import instrument
 from google.oauth2 import service_account
-from googleapiclient.discovery import build
+from googleapiclient.discovery import build, build_from_document
+from googleapiclient.discovery_cache import get_static_doc
 from googleapiclient.errors import HttpError
 from googleapiclient.http import MediaFileUpload
 
 # Load service account credentials from environment variable
 SERVICE_ACCOUNT_JSON = os.getenv("GDRIVE_SERVICE_ACCOUNT")
 FOLDER_ID = os.getenv("GDRIVE_FOLDER_ID")  # Root folder ID from GitHub secrets
+API_ROOT = os.getenv("GDRIVE_API_ROOT")  # Optional API override (e.g. fake_drive.py)
+UPLOAD_WORKERS = int(os.getenv("GDRIVE_UPLOAD_WORKERS", "4"))
+FOLDER_CACHE_FILE = os.getenv("GDRIVE_FOLDER_CACHE")  # Optional persisted folder map
+FOLDER_CACHE_TTL = float(os.getenv("GDRIVE_FOLDER_CACHE_TTL", "86400"))
+DOWNLOAD_CHUNK_SIZE = 8 * 1024 * 1024
 
-if not SERVICE_ACCOUNT_JSON:
-    raise ValueError(
-        "❌ Service Account JSON not found! Set GDRIVE_SERVICE_ACCOUNT as a secret."
-    )
-
-if not FOLDER_ID:
-    raise ValueError(
-        "❌ Google Drive Folder ID not found! Set GDRIVE_FOLDER_ID as a secret."
-    )
+# Storage backend: "drive" (Google Drive) or "local" (a directory, for offline
+# runs and load tests). Can also be chosen with --storage on the stage scripts.
+STORAGE_BACKEND = os.getenv("STORAGE_BACKEND", "drive")
+LOCAL_STORAGE_DIR = os.getenv("LOCAL_STORAGE_DIR", "local_storage")
+STORAGE_BACKENDS = ("drive", "local")
 
-# Save service account JSON to a temporary file
-SERVICE_ACCOUNT_FILE = "service_account.json"
-with open(SERVICE_ACCOUNT_FILE, "w") as f:
-    f.write(SERVICE_ACCOUNT_JSON)
+# Upload policy: which stages' outputs are uploaded at all. "final" uploads
+# only the merged PDF, "all" every stage, or name the stages, e.g.
+# UPLOAD_POLICY=enhance,final. UPLOAD_BUNDLE=1 packs each intermediate
+# stage's pages into one zip instead of uploading them one by one. Files the
+# destination folder already holds (same name and md5) are never re-sent.
+UPLOAD_STAGES = ("split", "watermark", "enhance", "final")
+UPLOAD_POLICY = os.getenv("UPLOAD_POLICY", "final")
+UPLOAD_BUNDLE = os.getenv("UPLOAD_BUNDLE", "0") == "1"
+UPLOAD_DEDUPE = os.getenv("UPLOAD_DEDUPE", "1") == "1"
 
-# Authenticate and create the Drive API service
 SCOPES = ["https://www.googleapis.com/auth/drive"]
-creds = service_account.Credentials.from_service_account_file(
-    SERVICE_ACCOUNT_FILE, scopes=SCOPES
-)
-service = build("drive", "v3", credentials=creds)
 
-# Remove the service account file for security
-os.remove(SERVICE_ACCOUNT_FILE)
+_auth_lock = threading.Lock()
+_creds = None
+_service = None
+
+
+def get_credentials():
+    """Loads the service account credentials on first use.
+
+    Nothing is authenticated at import time, so stages that never touch
+    Drive (or use the local backend) start without credentials or latency.
+    """
+    global _creds
+    with _auth_lock:
+        if _creds is None:
+            if not SERVICE_ACCOUNT_JSON:
+                raise ValueError(
+                    "❌ Service Account JSON not found! Set GDRIVE_SERVICE_ACCOUNT as a secret."
+                )
+            if not FOLDER_ID:
+                raise ValueError(
+                    "❌ Google Drive Folder ID not found! Set GDRIVE_FOLDER_ID as a secret."
+                )
+            _creds = service_account.Credentials.from_service_account_info(
+                json.loads(SERVICE_ACCOUNT_JSON), scopes=SCOPES
+            )
+        return _creds
+
+
+class TracedHttp(httplib2.Http):
+    """httplib2 client that reports every request's latency to instrument."""
+
+    def request(self, uri, method="GET", *args, **kwargs):
+        path = urlparse(uri).path
+        route = re.sub(r"/files/[^/]+", "/files/{id}", path)
+        start = time.perf_counter()
+        status = None
+        try:
+            response, content = super().request(uri, method, *args, **kwargs)
+            status = response.status
+            return response, content
+        finally:
+            instrument.record_call(
+                "drive", f"{method} {route}", time.perf_counter() - start, status
+            )
+
+
+def authorized_http():
+    """Returns a new authorized, traced HTTP client (one per thread)."""
+    return google_auth_httplib2.AuthorizedHttp(get_credentials(), http=TracedHttp())
+
+
+def build_service(http=None):
+    """Builds a Drive v3 service, honouring GDRIVE_API_ROOT when it is set."""
+    auth = {"http": http} if http else {"credentials": get_credentials()}
+    if API_ROOT:
+        # The media upload URL comes from the discovery document's rootUrl,
+        # so override it there rather than through client_options.
+        discovery = json.loads(get_static_doc("drive", "v3"))
+        discovery["rootUrl"] = API_ROOT
+        return build_from_document(discovery, **auth)
+    return build("drive", "v3", **auth)
+
+
+def get_service():
+    """Returns the shared Drive service, building it on first use."""
+    global _service
+    if _service is None:
+        service = build_service(authorized_http())
+        with _auth_lock:
+            _service = _service or service
+    return _service
+
+
+def __getattr__(name):
+    # Lazy aliases for code that used the old import-time globals
+    if name == "service":
+        return get_service()
+    if name == "creds":
+        return get_credentials()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
 
 # 📂 Define local PDF storage folder
 LOCAL_PDF_DIR = "main/pdfs"
 os.makedirs(LOCAL_PDF_DIR, exist_ok=True)
 
 
-def get_or_create_folder(folder_name, parent_folder_id=FOLDER_ID):
-    """Checks if a folder exists in Google Drive; creates it if not."""
+# Folder-ID cache: (parent_folder_id, folder_name) -> (folder_id, resolved_at)
+_folder_cache = {}
+_folder_cache_loaded = False
+_folder_cache_lock = threading.Lock()
+_folder_locks = {}
+folder_cache_stats = Counter()
+
+
+def _load_folder_cache():
+    """Loads unexpired entries from GDRIVE_FOLDER_CACHE into memory (once)."""
+    global _folder_cache_loaded
+    if _folder_cache_loaded:
+        return
+    _folder_cache_loaded = True
+    if not FOLDER_CACHE_FILE or not os.path.exists(FOLDER_CACHE_FILE):
+        return
+    try:
+        with open(FOLDER_CACHE_FILE) as f:
+            entries = json.load(f)
+    except (OSError, ValueError) as error:
+        print(f"⚠️ Ignoring unreadable folder cache {FOLDER_CACHE_FILE}: {error}")
+        return
+    now = time.time()
+    for parent_id, name, folder_id, resolved_at in entries:
+        if now - resolved_at < FOLDER_CACHE_TTL:
+            _folder_cache[(parent_id, name)] = (folder_id, resolved_at)
+
+
+def _save_folder_cache():
+    """Persists the folder cache atomically when GDRIVE_FOLDER_CACHE is set."""
+    if not FOLDER_CACHE_FILE:
+        return
+    entries = [
+        [parent_id, name, folder_id, resolved_at]
+        for (parent_id, name), (folder_id, resolved_at) in _folder_cache.items()
+    ]
+    tmp_path = f"{FOLDER_CACHE_FILE}.tmp"
+    with open(tmp_path, "w") as f:
+        json.dump(entries, f)
+    os.replace(tmp_path, FOLDER_CACHE_FILE)
+
+
+def _cached_folder(key):
+    with _folder_cache_lock:
+        _load_folder_cache()
+        entry = _folder_cache.get(key)
+        if entry and time.time() - entry[1] < FOLDER_CACHE_TTL:
+            return entry[0]
+        return None
+
+
+def invalidate_folder(folder_id):
+    """Drops every cache entry pointing at ``folder_id`` (e.g. after a 404)."""
+    with _folder_cache_lock:
+        stale = [key for key, entry in _folder_cache.items() if entry[0] == folder_id]
+        for key in stale:
+            del _folder_cache[key]
+        if stale:
+            folder_cache_stats["invalidations"] += len(stale)
+            _save_folder_cache()
+
+
+def _drive_get_or_create_folder(folder_name, parent_folder_id=None):
+    """Checks if a folder exists in Google Drive; creates it if not.
+
+    Results are cached per (parent, name). Concurrent callers for the same
+    folder wait on a per-key lock, so only one of them queries Drive and the
+    folder is never created twice. No parent means GDRIVE_FOLDER_ID.
+    """
+    parent_folder_id = parent_folder_id or FOLDER_ID
+    key = (parent_folder_id, folder_name)
+    folder_id = _cached_folder(key)
+    if folder_id:
+        folder_cache_stats["hits"] += 1
+        return folder_id
+
+    with _folder_cache_lock:
+        key_lock = _folder_locks.setdefault(key, threading.Lock())
+    with key_lock:
+        folder_id = _cached_folder(key)  # Resolved while we were waiting
+        if folder_id:
+            folder_cache_stats["hits"] += 1
+            return folder_id
+        folder_cache_stats["misses"] += 1
+
+        folder_id = _lookup_or_create_folder(folder_name, parent_folder_id)
+        if folder_id:
+            with _folder_cache_lock:
+                _folder_cache[key] = (folder_id, time.time())
+                _save_folder_cache()
+        return folder_id
+
+
+def _lookup_or_create_folder(folder_name, parent_folder_id):
+    """Runs the Drive list (and, if needed, create) for one folder."""
+    drive_service = get_thread_service()
     query = f"'{parent_folder_id}' in parents and name='{folder_name}' and mimeType='application/vnd.google-apps.folder'"
     try:
-        response = service.files().list(q=query, fields="files(id)").execute()
+        folder_cache_stats["api_lists"] += 1
+        response = drive_service.files().list(q=query, fields="files(id)").execute()
         folders = response.get("files", [])
 
         if folders:
@@ -251,78 +441,833 @@ def get_or_create_folder(folder_name, parent_folder_id=FOLDER_ID):
             "mimeType": "application/vnd.google-apps.folder",
             "parents": [parent_folder_id],
         }
-        folder = service.files().create(body=folder_metadata, fields="id").execute()
+        folder_cache_stats["api_creates"] += 1
+        folder = (
+            drive_service.files().create(body=folder_metadata, fields="id").execute()
+        )
         return folder.get("id")
     except HttpError as error:
         print(f"❌ Error creating folder '{folder_name}': {error}")
         return None
 
 
-def download_from_drive(file_name, local_dir=LOCAL_PDF_DIR, retries=3):
-    """Downloads a specific file from Google Drive with retries."""
+def get_folder_cache_stats():
+    """Returns a snapshot of folder cache hit/miss and API call counters."""
+    return dict(folder_cache_stats)
+
+
+def _file_md5(file_path):
+    """Returns the hex MD5 of a file, read in chunks."""
+    digest = hashlib.md5()
+    with open(file_path, "rb") as f:
+        for block in iter(lambda: f.read(1024 * 1024), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def _download_chunks(drive_service, file_id, part_path, chunk_size=DOWNLOAD_CHUNK_SIZE):
+    """Streams a file into ``part_path`` with ranged GETs, resuming from its size."""
+    request = drive_service.files().get_media(fileId=file_id)
+    offset = os.path.getsize(part_path) if os.path.exists(part_path) else 0
+    with open(part_path, "ab") as part:
+        while True:
+            headers = dict(request.headers)
+            headers["range"] = f"bytes={offset}-{offset + chunk_size - 1}"
+            resp, content = request.http.request(
+                request.uri, method="GET", headers=headers
+            )
+            if resp.status == 416:
+                return  # Nothing left past ``offset``
+            if resp.status == 200:
+                # Server ignored the range and sent the whole file
+                part.truncate(0)
+                part.write(content)
+                return
+            if resp.status != 206:
+                raise HttpError(resp, content, uri=request.uri)
+            part.write(content)
+            offset += len(content)
+            content_range = resp.get("content-range")
+            if content_range:
+                if offset >= int(content_range.rsplit("/", 1)[-1]):
+                    return
+            elif len(content) < chunk_size:
+                return  # No total given; a short chunk is the last one
+
+
+def _drive_download(file_name, local_dir=LOCAL_PDF_DIR, retries=3):
+    """Streams a specific file from Google Drive to disk with resumable retries.
+
+    Chunks are written to ``<file>.part``; a retry continues from the bytes
+    already on disk. The result is checked against Drive's md5Checksum and
+    renamed into place atomically. Returns the local path, or None.
+    """
+    drive_service = get_thread_service()
     query = f"'{FOLDER_ID}' in parents and name='{file_name}'"
     try:
-        results = service.files().list(q=query, fields="files(id, name)").execute()
+        results = (
+            drive_service.files()
+            .list(q=query, fields="files(id, name, md5Checksum)")
+            .execute()
+        )
         files = results.get("files", [])
         if not files:
             print(f"⚠️ File {file_name} not found in Google Drive.")
-            return
-
-        file_id = files[0]["id"]
-        file_path = os.path.join(local_dir, file_name)
-
-        for attempt in range(retries):
-            try:
-                request = service.files().get_media(fileId=file_id)
-                with open(file_path, "wb") as file:
-                    file.write(request.execute())
-                print(f"✅ Downloaded {file_name} to {file_path}")
-                return
-            except HttpError as error:
-                print(
-                    f"❌ Error downloading {file_name} (attempt {attempt+1}/{retries}): {error}"
-                )
-                time.sleep(2**attempt)  # Exponential backoff
+            return None
     except HttpError as error:
         print(f"❌ Failed to search for {file_name}: {error}")
+        return None
+
+    return _drive_download_file(files[0], local_dir, retries)
+
+
+def _drive_download_file(file, local_dir=LOCAL_PDF_DIR, retries=3):
+    """Streams the file described by ``file`` (id, name, md5Checksum) to disk.
+
+    See _drive_download; no name lookup is needed when the ID is known.
+    """
+    drive_service = get_thread_service()
+    file_id, file_name = file["id"], file["name"]
+    expected_md5 = file.get("md5Checksum")
+    os.makedirs(local_dir, exist_ok=True)
+    file_path = os.path.join(local_dir, file_name)
+    part_path = f"{file_path}.part"
+
+    for attempt in range(retries):
+        try:
+            _download_chunks(drive_service, file_id, part_path)
+            if expected_md5 and _file_md5(part_path) != expected_md5:
+                os.remove(part_path)  # Corrupt: start over from byte zero
+                raise ValueError("md5Checksum mismatch")
+            os.replace(part_path, file_path)
+            print(f"✅ Downloaded {file_name} to {file_path}")
+            return file_path
+        except (HttpError, httplib2.HttpLib2Error, OSError, ValueError) as error:
+            print(
+                f"❌ Error downloading {file_name} (attempt {attempt+1}/{retries}): {error}"
+            )
+            time.sleep(2**attempt)  # Exponential backoff
+    return None
+
+
+def _drive_list_files(folder_id=None):
+    """Lists the non-trashed files directly inside a Drive folder (all pages)."""
+    folder_id = folder_id or FOLDER_ID
+    drive_service = get_thread_service()
+    files, page_token = [], None
+    while True:
+        response = (
+            drive_service.files()
+            .list(
+                q=f"'{folder_id}' in parents and trashed=false",
+                fields="nextPageToken, files(id, name, mimeType, md5Checksum, size)",
+                pageSize=1000,
+                pageToken=page_token,
+            )
+            .execute()
+        )
+        files.extend(response.get("files", []))
+        page_token = response.get("nextPageToken")
+        if not page_token:
+            return files
 
 
-def upload_to_drive(file_path, folder_name=None, parent_folder_id=FOLDER_ID, retries=3):
-    """Uploads a file to Google Drive inside a specified folder using resumable upload."""
+CHANGE_FIELDS = (
+    "nextPageToken, newStartPageToken, changes(fileId, removed, "
+    "file(id, name, mimeType, md5Checksum, size, parents, trashed))"
+)
+
+
+def _drive_start_page_token():
+    """Returns a changes-feed token for "everything from now on"."""
+    response = get_thread_service().changes().getStartPageToken().execute()
+    return response["startPageToken"]
+
+
+def _drive_list_changes(page_token):
+    """Reads the changes feed from ``page_token`` to its end (all pages).
+
+    Returns (changes, new_start_page_token) for the next call.
+    """
+    drive_service = get_thread_service()
+    changes = []
+    while True:
+        response = (
+            drive_service.changes()
+            .list(
+                pageToken=page_token,
+                fields=CHANGE_FIELDS,
+                pageSize=1000,
+                includeRemoved=True,
+            )
+            .execute()
+        )
+        changes.extend(response.get("changes", []))
+        if "newStartPageToken" in response:
+            return changes, response["newStartPageToken"]
+        page_token = response["nextPageToken"]
+
+
+MIME_TYPES = {
+    ".pdf": "application/pdf",
+    ".png": "image/png",
+    ".jpg": "image/jpeg",
+    ".jpeg": "image/jpeg",
+    ".txt": "text/plain",
+    ".zip": "application/zip",
+}
+
+_thread_local = threading.local()
+
+
+def get_thread_service():
+    """Returns a Drive service owned by the calling thread.
+
+    googleapiclient service objects share one httplib2 connection and are not
+    thread-safe, so every thread gets its own authorized HTTP client.
+    """
+    if not hasattr(_thread_local, "service"):
+        _thread_local.service = build_service(authorized_http())
+    return _thread_local.service
+
+
+def _upload_file(
+    drive_service, file_path, parent_folder_id, folder_name=None, retries=3
+):
+    """Uploads one file into ``folder_name`` under ``parent_folder_id``.
+
+    If the cached folder ID turns out to be stale (404), it is invalidated
+    and resolved again on the next attempt. Returns the new file ID.
+    """
     file_name = os.path.basename(file_path)
 
     if not os.path.exists(file_path) or os.path.getsize(file_path) == 0:
         print(f"⚠️ Skipping upload: {file_path} does not exist or is empty.")
-        return
+        return None
 
-    mime_types = {
-        ".pdf": "application/pdf",
-        ".png": "image/png",
-        ".jpg": "image/jpeg",
-        ".jpeg": "image/jpeg",
-        ".txt": "text/plain",
-    }
-    mime_type = mime_types.get(
+    mime_type = MIME_TYPES.get(
         os.path.splitext(file_name)[1], "application/octet-stream"
     )
 
-    if folder_name:
-        parent_folder_id = get_or_create_folder(folder_name, parent_folder_id)
-
-    file_metadata = {"name": file_name, "parents": [parent_folder_id]}
     media = MediaFileUpload(
         file_path, mimetype=mime_type, resumable=True, chunksize=20 * 1024 * 1024
     )
 
     for attempt in range(retries):
+        target_folder_id = parent_folder_id
+        if folder_name:
+            target_folder_id = _drive_get_or_create_folder(
+                folder_name, parent_folder_id
+            )
+        file_metadata = {"name": file_name, "parents": [target_folder_id]}
         try:
             uploaded_file = (
-                service.files().create(body=file_metadata, media_body=media).execute()
+                drive_service.files()
+                .create(body=file_metadata, media_body=media)
+                .execute()
             )
             print(
                 f"✅ Uploaded {file_name} to Google Drive in {folder_name or 'root'} (File ID: {uploaded_file.get('id')})"
             )
-            return
+            return uploaded_file.get("id")
         except HttpError as error:
             print(f"❌ Upload failed (attempt {attempt+1}/{retries}): {error}")
+            if error.resp.status == 404 and folder_name:
+                invalidate_folder(target_folder_id)  # Stale cached folder ID
+                continue
             time.sleep(2**attempt)  # Exponential backoff
+    return None
+
+
+class Storage(ABC):
+    """Where the pipeline's inputs come from and its outputs go.
+
+    Folder and file IDs are opaque strings owned by the backend; ``None`` as
+    a parent means the backend's root folder (GDRIVE_FOLDER_ID for Drive).
+    """
+
+    name = None
+
+    @property
+    @abstractmethod
+    def root_folder_id(self):
+        """The ID the backend uses for its root folder in ``parents``."""
+
+    @abstractmethod
+    def get_or_create_folder(self, folder_name, parent_folder_id=None):
+        """Returns the ID of ``folder_name`` under the parent, creating it."""
+
+    @abstractmethod
+    def list_files(self, folder_id=None):
+        """Returns metadata dicts (id, name, mimeType, md5Checksum, size)."""
+
+    @abstractmethod
+    def download(self, file_name, local_dir=LOCAL_PDF_DIR, retries=3):
+        """Copies ``file_name`` from the root folder. Returns the local path or None."""
+
+    @abstractmethod
+    def download_file(self, file, local_dir=LOCAL_PDF_DIR, retries=3):
+        """Copies a file described by list_files metadata (no name lookup)."""
+
+    @abstractmethod
+    def start_page_token(self):
+        """Returns a token marking the current end of the change log."""
+
+    @abstractmethod
+    def list_changes(self, page_token):
+        """Returns (changes, new_page_token) for everything since ``page_token``.
+
+        Changes are dicts with ``fileId``, ``removed`` and (unless removed)
+        ``file`` metadata including ``parents`` and ``trashed``.
+        """
+
+    @abstractmethod
+    def upload(self, file_path, folder_name=None, parent_folder_id=None, retries=3):
+        """Stores a file (inside ``folder_name`` if given). Returns its ID or None."""
+
+
+class DriveStorage(Storage):
+    """Google Drive, through the cached and thread-safe helpers above."""
+
+    name = "drive"
+
+    @property
+    def root_folder_id(self):
+        return FOLDER_ID
+
+    def get_or_create_folder(self, folder_name, parent_folder_id=None):
+        return _drive_get_or_create_folder(folder_name, parent_folder_id or FOLDER_ID)
+
+    def list_files(self, folder_id=None):
+        return _drive_list_files(folder_id or FOLDER_ID)
+
+    def download(self, file_name, local_dir=LOCAL_PDF_DIR, retries=3):
+        return _drive_download(file_name, local_dir, retries)
+
+    def download_file(self, file, local_dir=LOCAL_PDF_DIR, retries=3):
+        return _drive_download_file(file, local_dir, retries)
+
+    def start_page_token(self):
+        return _drive_start_page_token()
+
+    def list_changes(self, page_token):
+        return _drive_list_changes(page_token)
+
+    def upload(self, file_path, folder_name=None, parent_folder_id=None, retries=3):
+        return _upload_file(
+            get_thread_service(),
+            file_path,
+            parent_folder_id or FOLDER_ID,
+            folder_name,
+            retries,
+        )
+
+
+class LocalStorage(Storage):
+    """A directory standing in for Drive; folder and file IDs are relative paths.
+
+    GDRIVE_FOLDER_ID (if set) is accepted as an alias for the root, so the
+    stages can pass it unchanged. The change log is emulated from file
+    modification times: a page token is a timestamp, and removals are not
+    reported.
+    """
+
+    name = "local"
+
+    def __init__(self, root=LOCAL_STORAGE_DIR):
+        self.root = root
+
+    @property
+    def root_folder_id(self):
+        return self._id(self.root)
+
+    def _path(self, item_id):
+        if item_id in (None, "", FOLDER_ID):
+            return self.root
+        return os.path.join(self.root, item_id)
+
+    def _id(self, path):
+        return os.path.relpath(path, self.root)
+
+    def get_or_create_folder(self, folder_name, parent_folder_id=None):
+        folder_path = os.path.join(self._path(parent_folder_id), folder_name)
+        os.makedirs(folder_path, exist_ok=True)
+        return self._id(folder_path)
+
+    def list_files(self, folder_id=None):
+        folder_path = self._path(folder_id)
+        if not os.path.isdir(folder_path):
+            return []
+        files = []
+        for name in sorted(os.listdir(folder_path)):
+            path = os.path.join(folder_path, name)
+            if name.endswith(".part"):
+                continue
+            if os.path.isdir(path):
+                files.append(
+                    {
+                        "id": self._id(path),
+                        "name": name,
+                        "mimeType": "application/vnd.google-apps.folder",
+                    }
+                )
+                continue
+            files.append(
+                {
+                    "id": self._id(path),
+                    "name": name,
+                    "mimeType": MIME_TYPES.get(
+                        os.path.splitext(name)[1], "application/octet-stream"
+                    ),
+                    "md5Checksum": _file_md5(path),
+                    "size": str(os.path.getsize(path)),
+                }
+            )
+        return files
+
+    def download(self, file_name, local_dir=LOCAL_PDF_DIR, retries=3):
+        return self.download_file({"id": file_name, "name": file_name}, local_dir)
+
+    def download_file(self, file, local_dir=LOCAL_PDF_DIR, retries=3):
+        file_name = file["name"]
+        source_path = self._path(file["id"])
+        if not os.path.isfile(source_path):
+            print(f"⚠️ File {file_name} not found in {self.root}.")
+            return None
+        file_path = os.path.join(local_dir, file_name)
+        os.makedirs(local_dir, exist_ok=True)
+        shutil.copyfile(source_path, f"{file_path}.part")
+        os.replace(f"{file_path}.part", file_path)
+        print(f"✅ Copied {file_name} to {file_path}")
+        return file_path
+
+    def start_page_token(self):
+        return str(time.time_ns())
+
+    def list_changes(self, page_token):
+        new_page_token = self.start_page_token()
+        changes = []
+        for folder_path, _, names in os.walk(self.root):
+            folder_id = self._id(folder_path)
+            for name in sorted(names):
+                path = os.path.join(folder_path, name)
+                if name.endswith(".part") or os.stat(path).st_mtime_ns < int(
+                    page_token
+                ):
+                    continue
+                file = {
+                    "id": self._id(path),
+                    "name": name,
+                    "mimeType": MIME_TYPES.get(
+                        os.path.splitext(name)[1], "application/octet-stream"
+                    ),
+                    "md5Checksum": _file_md5(path),
+                    "size": str(os.path.getsize(path)),
+                    "parents": [folder_id],
+                    "trashed": False,
+                }
+                changes.append({"fileId": file["id"], "removed": False, "file": file})
+        return changes, new_page_token
+
+    def upload(self, file_path, folder_name=None, parent_folder_id=None, retries=3):
+        if not os.path.exists(file_path) or os.path.getsize(file_path) == 0:
+            print(f"⚠️ Skipping upload: {file_path} does not exist or is empty.")
+            return None
+        folder_path = self._path(parent_folder_id)
+        if folder_name:
+            folder_path = self._path(
+                self.get_or_create_folder(folder_name, parent_folder_id)
+            )
+        os.makedirs(folder_path, exist_ok=True)
+        target_path = os.path.join(folder_path, os.path.basename(file_path))
+        tmp_path = f"{target_path}.{threading.get_ident()}.part"
+        shutil.copyfile(file_path, tmp_path)
+        os.replace(tmp_path, target_path)
+        print(f"✅ Stored {os.path.basename(file_path)} in {folder_path}")
+        return self._id(target_path)
+
+
+_storage = None
+
+
+def set_storage_backend(name):
+    """Selects the storage backend ("drive" or "local") for this process."""
+    global _storage
+    if name not in STORAGE_BACKENDS:
+        raise ValueError(f"❌ Unknown storage backend: {name}")
+    _storage = LocalStorage() if name == "local" else DriveStorage()
+    return _storage
+
+
+def get_storage():
+    """Returns the active storage backend (STORAGE_BACKEND by default)."""
+    return _storage or set_storage_backend(STORAGE_BACKEND)
+
+
+def parse_upload_policy(value):
+    """Returns the set of stages an upload policy string selects.
+
+    ``value`` is "all", "none" or a comma-separated list of UPLOAD_STAGES
+    ("final" alone uploads only the merged PDF).
+    """
+    if value == "all":
+        return frozenset(UPLOAD_STAGES)
+    if value == "none":
+        return frozenset()
+    stages = frozenset(stage.strip() for stage in value.split(",") if stage.strip())
+    unknown = stages - set(UPLOAD_STAGES)
+    if unknown:
+        raise ValueError(f"❌ Unknown upload stages: {', '.join(sorted(unknown))}")
+    return stages
+
+
+_upload_stages = parse_upload_policy(UPLOAD_POLICY)
+_upload_bundle = UPLOAD_BUNDLE
+
+
+def set_upload_policy(policy, bundle=None):
+    """Selects which stages upload (see parse_upload_policy) and whether
+    intermediate stages are bundled into one archive each."""
+    global _upload_stages, _upload_bundle
+    _upload_stages = parse_upload_policy(policy)
+    if bundle is not None:
+        _upload_bundle = bundle
+    return _upload_stages
+
+
+def uploads_stage(stage):
+    """True if the upload policy uploads ``stage``'s outputs."""
+    return stage in _upload_stages
+
+
+def add_storage_argument(parser):
+    """Adds the shared --storage and upload policy options to a stage's parser."""
+    parser.add_argument(
+        "--storage",
+        choices=STORAGE_BACKENDS,
+        default=STORAGE_BACKEND,
+        help="Where inputs are read from and outputs uploaded to.",
+    )
+    parser.add_argument(
+        "--upload",
+        default=UPLOAD_POLICY,
+        help="Stages to upload: final, all, none or a comma-separated list "
+        f"of {', '.join(UPLOAD_STAGES)} (default: {UPLOAD_POLICY}).",
+    )
+    parser.add_argument(
+        "--bundle-uploads",
+        action="store_true",
+        default=UPLOAD_BUNDLE,
+        help="Upload each intermediate stage as one zip instead of page by page.",
+    )
+
+
+def apply_storage_arguments(args):
+    """Applies the options added by add_storage_argument. Returns the storage."""
+    set_upload_policy(args.upload, args.bundle_uploads)
+    return set_storage_backend(args.storage)
+
+
+def get_or_create_folder(folder_name, parent_folder_id=None):
+    """Returns the ID of a folder in the active storage, creating it if needed.
+
+    No parent means the backend's root folder.
+    """
+    return get_storage().get_or_create_folder(folder_name, parent_folder_id)
+
+
+def list_files(folder_id=None):
+    """Lists the files in a folder of the active storage (the root by default)."""
+    return get_storage().list_files(folder_id)
+
+
+def download_from_drive(file_name, local_dir=LOCAL_PDF_DIR, retries=3):
+    """Downloads a file from the active storage. Returns the local path, or None."""
+    storage = get_storage()
+    with instrument.span("download", "storage", file=file_name) as info:
+        file_path = storage.download(file_name, local_dir, retries)
+        info["ok"] = file_path is not None
+        return file_path
+
+
+def download_file(file, local_dir=LOCAL_PDF_DIR, retries=3):
+    """Downloads a file from list_files/changes metadata, without a name query."""
+    storage = get_storage()
+    with instrument.span("download", "storage", file=file["name"]) as info:
+        file_path = storage.download_file(file, local_dir, retries)
+        info["ok"] = file_path is not None
+        return file_path
+
+
+def download_many(file_names, local_dir=LOCAL_PDF_DIR, workers=4, retries=3):
+    """Downloads several files in parallel. Returns {file_name: local path or None}."""
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        paths = pool.map(
+            lambda name: download_from_drive(name, local_dir, retries), file_names
+        )
+        return dict(zip(file_names, paths))
+
+
+def upload_to_drive(file_path, folder_name=None, parent_folder_id=None, retries=3):
+    """Uploads a file to the active storage inside a specified folder.
+
+    ``folder_name`` is created under ``parent_folder_id`` (the backend's root
+    folder by default) if needed.
+
+    Returns the new file's ID, or the existing one if the folder already
+    holds an identical file.
+    """
+    return _traced_upload(
+        get_storage(), file_path, folder_name, parent_folder_id, retries
+    )[0]
+
+
+# Remote folder contents: (backend, folder_id) -> {name: (md5, file_id)}
+_remote_files = {}
+_remote_lock = threading.Lock()
+_remote_locks = {}
+
+
+def _remote_index(storage, folder_id):
+    """Lists ``folder_id`` once per process and returns its name -> (md5, id) map.
+
+    Later uploads to the folder are added to the map, so it stays current
+    for the rest of the run without listing the folder again.
+    """
+    key = (storage.name, folder_id)
+    with _remote_lock:
+        key_lock = _remote_locks.setdefault(key, threading.Lock())
+    with key_lock:
+        if key not in _remote_files:
+            _remote_files[key] = {
+                f["name"]: (f.get("md5Checksum"), f["id"])
+                for f in storage.list_files(folder_id)
+            }
+        return _remote_files[key]
+
+
+def _existing_upload(storage, file_path, folder_name, parent_folder_id):
+    """Returns (existing_file_id, folder_id) for a file already in the target folder.
+
+    The file ID is None if the folder has no file of that name and md5.
+    """
+    folder_id = parent_folder_id or storage.root_folder_id
+    if folder_name:
+        folder_id = storage.get_or_create_folder(folder_name, parent_folder_id)
+    if not os.path.exists(file_path):
+        return None, folder_id
+    md5, file_id = _remote_index(storage, folder_id).get(
+        os.path.basename(file_path), (None, None)
+    )
+    if md5 and md5 == _file_md5(file_path):
+        return file_id, folder_id
+    return None, folder_id
+
+
+def _traced_upload(storage, file_path, folder_name, parent_folder_id, retries):
+    """Uploads one file unless the target folder already has it.
+
+    Returns (file_id, reused), where ``reused`` is True if the upload was
+    skipped because an identical file was found.
+    """
+    file_name = os.path.basename(file_path)
+    with instrument.span(
+        "upload", "storage", file=file_name, folder=folder_name
+    ) as info:
+        folder_id = None
+        if UPLOAD_DEDUPE:
+            file_id, folder_id = _existing_upload(
+                storage, file_path, folder_name, parent_folder_id
+            )
+            if file_id:
+                print(f"♻️ {file_name} is already in {folder_name or 'root'}, skipping")
+                info["ok"] = info["reused"] = True
+                return file_id, True
+        file_id = storage.upload(file_path, folder_name, parent_folder_id, retries)
+        info["ok"] = file_id is not None
+        if file_id and os.path.exists(file_path):
+            info["bytes_uploaded"] = os.path.getsize(file_path)
+            if UPLOAD_DEDUPE:
+                with _remote_lock:
+                    index = _remote_files.get((storage.name, folder_id))
+                    if index is not None:
+                        index[file_name] = (_file_md5(file_path), file_id)
+        return file_id, False
+
+
+def bundle_files(file_paths, archive_path):
+    """Packs files into a zip, stored uncompressed (pages are PNGs already).
+
+    Entries are sorted and carry a fixed timestamp, so the same pages always
+    give the same archive bytes and an unchanged stage is not uploaded twice.
+    """
+    with zipfile.ZipFile(archive_path, "w", zipfile.ZIP_STORED) as archive:
+        for file_path in sorted(file_paths, key=os.path.basename):
+            entry = zipfile.ZipInfo(os.path.basename(file_path), (1980, 1, 1, 0, 0, 0))
+            with open(file_path, "rb") as source, archive.open(entry, "w") as target:
+                shutil.copyfileobj(source, target, 1024 * 1024)
+    return archive_path
+
+
+class DriveUploader:
+    """Uploads files to the active storage from a pool of worker threads.
+
+    ``submit`` puts work on a bounded queue (blocking once ``queue_size``
+    files are waiting) and returns immediately; ``flush`` waits for
+    everything submitted so far. Folder IDs come from the shared folder
+    cache, and each worker thread uploads through its own authorized HTTP
+    client. The threads start with the first upload, so an uploader that
+    never uploads (e.g. its stage is disabled) costs nothing. Use as a
+    context manager, or call ``close`` to get the report.
+
+    ``stage`` (one of UPLOAD_STAGES) ties the uploader to the upload policy:
+    submissions are dropped when the policy leaves the stage out, and with
+    bundling on they are collected and sent as one zip per folder on
+    ``close``.
+    """
+
+    def __init__(
+        self,
+        workers=UPLOAD_WORKERS,
+        queue_size=32,
+        retries=3,
+        storage=None,
+        stage=None,
+        bundle=None,
+    ):
+        self.storage = storage or get_storage()
+        self.retries = retries
+        self.stage = stage
+        self.enabled = stage is None or uploads_stage(stage)
+        self.bundle = stage not in (None, "final") and (
+            _upload_bundle if bundle is None else bundle
+        )
+        self.uploaded = []
+        self.reused = []
+        self.failed = []
+        self.skipped = 0
+        self._bundles = {}
+        self.workers = workers
+        self._queue = queue.Queue(maxsize=queue_size)
+        self._lock = threading.Lock()
+        self._threads = []  # Started by the first upload (see _start)
+
+    def _start(self):
+        """Starts the worker threads, unless they are running already."""
+        if not self._threads:
+            self._threads = [
+                threading.Thread(target=self._worker, daemon=True)
+                for _ in range(self.workers)
+            ]
+            for thread in self._threads:
+                thread.start()
+
+    def submit(self, file_path, folder_name=None, parent_folder_id=None):
+        """Queues a file for upload into ``folder_name`` under ``parent_folder_id``
+        (the root folder by default)."""
+        if not self.enabled:
+            self.skipped += 1
+            return
+        if self.bundle:
+            self._bundles.setdefault((parent_folder_id, folder_name), []).append(
+                file_path
+            )
+            return
+        self._start()
+        self._queue.put((file_path, parent_folder_id, folder_name))
+
+    def flush(self):
+        """Blocks until every submitted file has been uploaded or has failed."""
+        self._queue.join()
+
+    def _upload_bundles(self):
+        """Zips each folder's collected files and uploads the archives."""
+        if not self._bundles:
+            return
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            for (parent_folder_id, folder_name), file_paths in self._bundles.items():
+                archive_name = f"{folder_name or self.stage}.zip"
+                archive_path = bundle_files(
+                    [p for p in file_paths if os.path.exists(p)],
+                    os.path.join(tmp_dir, archive_name),
+                )
+                print(f"🗜️ Bundled {len(file_paths)} files into {archive_name}")
+                self._start()
+                self._queue.put((archive_path, parent_folder_id, folder_name))
+            self.flush()
+        self._bundles = {}
+
+    def close(self):
+        """Flushes, stops the worker threads and returns the upload report."""
+        self.flush()
+        self._upload_bundles()
+        for _ in self._threads:
+            self._queue.put(None)
+        for thread in self._threads:
+            thread.join()
+        return self.report()
+
+    def report(self):
+        """Returns (and prints) aggregated success/failure counts."""
+        with self._lock:
+            report = {
+                "uploaded": list(self.uploaded),
+                "reused": list(self.reused),
+                "failed": list(self.failed),
+                "skipped": self.skipped,
+            }
+        if not self.enabled:
+            print(
+                f"⏭️ Upload policy skips the {self.stage} stage "
+                f"({self.skipped} files not uploaded)."
+            )
+            return report
+        print(
+            f"📤 Uploaded {len(report['uploaded'])} files, "
+            f"{len(report['reused'])} already stored, {len(report['failed'])} failed."
+        )
+        for file_path in report["failed"]:
+            print(f"❌ Failed to upload: {file_path}")
+        if self.storage.name != "drive":
+            return report
+        stats = get_folder_cache_stats()
+        print(
+            f"📁 Folder cache: {stats.get('hits', 0)} hits, "
+            f"{stats.get('misses', 0)} misses, "
+            f"{stats.get('invalidations', 0)} invalidations"
+        )
+        return report
+
+    def _worker(self):
+        while True:
+            item = self._queue.get()
+            try:
+                if item is None:
+                    return
+                file_path, parent_folder_id, folder_name = item
+                try:
+                    file_id, reused = _traced_upload(
+                        self.storage,
+                        file_path,
+                        folder_name,
+                        parent_folder_id,
+                        self.retries,
+                    )
+                except Exception as error:
+                    print(f"❌ Upload of {file_path} crashed: {error}")
+                    file_id, reused = None, False
+                with self._lock:
+                    if reused:
+                        self.reused.append((file_path, file_id))
+                    elif file_id:
+                        self.uploaded.append((file_path, file_id))
+                    else:
+                        self.failed.append(file_path)
+            finally:
+                self._queue.task_done()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
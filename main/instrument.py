@@ -0,0 +1,228 @@
+"""Shared timing and resource instrumentation for the pipeline stages.
+
+Set TRACE_FILE to record one span per page and stage. Each span records
+wall and CPU time, peak RSS, bytes read and written, and the Drive API
+calls made inside it. Every script (and every worker process) appends to
+the same file, so a whole run.sh invocation ends up in one trace.
+
+    TRACE_FILE=trace.jsonl bash run.sh      # one JSON object per span
+    TRACE_FILE=trace.json bash run.sh       # Chrome trace (chrome://tracing)
+
+TRACE_PROFILE_TOP=N additionally runs cProfile on page spans and keeps the
+N slowest per stage (per process) in TRACE_PROFILE_DIR, for `snakeviz` or
+`python -m pstats`. Without TRACE_FILE everything here is a no-op.
+"""
+
+import atexit
+import cProfile
+import fcntl
+import heapq
+import itertools
+import json
+import os
+import re
+import resource
+import threading
+import time
+from collections import defaultdict
+from contextlib import contextmanager
+
+TRACE_FILE = os.getenv("TRACE_FILE")
+TRACE_FORMAT = os.getenv(
+    "TRACE_FORMAT", "chrome" if (TRACE_FILE or "").endswith(".json") else "jsonl"
+)
+PROFILE_TOP = int(os.getenv("TRACE_PROFILE_TOP", "0"))
+PROFILE_DIR = os.getenv("TRACE_PROFILE_DIR", "traces/profiles")
+
+_local = threading.local()
+_lock = threading.Lock()
+_seq = itertools.count()
+_profiles = defaultdict(list)  # stage -> min-heap of (wall, seq, path)
+call_stats = defaultdict(lambda: {"calls": 0, "seconds": 0.0, "errors": 0})
+stage_totals = defaultdict(
+    lambda: {"spans": 0, "wall_s": 0.0, "slowest_s": 0.0, "slowest_page": None}
+)
+
+
+def enabled():
+    return bool(TRACE_FILE)
+
+
+def page_number(file_name):
+    """Trailing page number of a page file name ("..._page_12.png" -> 12).
+
+    Falls back to the name without its extension.
+    """
+    stem = os.path.splitext(os.path.basename(file_name))[0]
+    match = re.search(r"(\d+)$", stem)
+    return int(match.group(1)) if match else stem
+
+
+def _io_counters():
+    """Process-wide bytes read/written so far (Linux), or None."""
+    try:
+        with open("/proc/self/io") as f:
+            fields = dict(line.split(": ") for line in f.read().splitlines())
+        return int(fields["rchar"]), int(fields["wchar"])
+    except (OSError, KeyError, ValueError):
+        return None
+
+
+def _peak_rss_mb():
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def _write_event(event):
+    """Appends one event to TRACE_FILE, safely across threads and processes."""
+    if TRACE_FORMAT == "chrome":
+        # Chrome's JSON Array Format allows the closing bracket to be missing,
+        # so every process can keep appending to the same file.
+        event = {
+            "name": event["name"],
+            "cat": event["stage"],
+            "ph": "X",
+            "ts": int(event["ts"] * 1e6),
+            "dur": int(event["wall_s"] * 1e6),
+            "pid": event["pid"],
+            "tid": event["tid"],
+            "args": {
+                k: v for k, v in event.items() if k not in ("name", "ts", "pid", "tid")
+            },
+        }
+        line = json.dumps(event) + ",\n"
+    else:
+        line = json.dumps(event) + "\n"
+    with open(TRACE_FILE, "a") as f:
+        fcntl.flock(f, fcntl.LOCK_EX)
+        if TRACE_FORMAT == "chrome" and f.tell() == 0:
+            f.write("[\n")
+        f.write(line)
+
+
+def _keep_profile(stage, page, wall, profile):
+    """Dumps ``profile`` if it is among the PROFILE_TOP slowest for ``stage``."""
+    with _lock:
+        heap = _profiles[stage]
+        if len(heap) >= PROFILE_TOP and wall <= heap[0][0]:
+            return
+        os.makedirs(PROFILE_DIR, exist_ok=True)
+        path = os.path.join(PROFILE_DIR, f"{stage}_page_{page}_{os.getpid()}.prof")
+        profile.dump_stats(path)
+        heapq.heappush(heap, (wall, next(_seq), path))
+        if len(heap) > PROFILE_TOP:
+            _, _, evicted = heapq.heappop(heap)
+            if evicted != path and os.path.exists(evicted):
+                os.remove(evicted)
+
+
+@contextmanager
+def span(name, stage, page=None, **attrs):
+    """Times a unit of work and records it in the trace.
+
+    Yields a dict; anything the caller adds to it (e.g. ``bytes_written``)
+    is stored with the span. CPU time and I/O counters are process-wide.
+    """
+    info = dict(attrs)
+    if not enabled():
+        yield info
+        return
+
+    stack = getattr(_local, "stack", None)
+    if stack is None:
+        stack = _local.stack = []
+    info["drive_calls"] = 0
+    info["drive_s"] = 0.0
+    stack.append(info)
+
+    profile = None
+    if PROFILE_TOP and page is not None and not getattr(_local, "profiling", False):
+        profile = cProfile.Profile()
+        _local.profiling = True
+        profile.enable()
+
+    io_before = _io_counters()
+    ts = time.time()
+    wall_start = time.perf_counter()
+    cpu_start = time.process_time()
+    try:
+        yield info
+    except Exception as e:
+        info["error"] = repr(e)
+        raise
+    finally:
+        wall = time.perf_counter() - wall_start
+        cpu = time.process_time() - cpu_start
+        if profile:
+            profile.disable()
+            _local.profiling = False
+        stack.pop()
+        io_after = _io_counters()
+
+        event = {
+            "name": name,
+            "stage": stage,
+            "page": page,
+            "ts": ts,
+            "wall_s": round(wall, 6),
+            "cpu_s": round(cpu, 6),
+            "peak_rss_mb": round(_peak_rss_mb(), 1),
+            "pid": os.getpid(),
+            "tid": threading.get_ident(),
+        }
+        if io_before and io_after:
+            event["read_bytes"] = io_after[0] - io_before[0]
+            event["write_bytes"] = io_after[1] - io_before[1]
+        event.update(info)
+        _write_event(event)
+
+        with _lock:
+            totals = stage_totals[stage]
+            totals["spans"] += 1
+            totals["wall_s"] += wall
+            if wall > totals["slowest_s"]:
+                totals["slowest_s"] = wall
+                totals["slowest_page"] = page
+        if profile:
+            _keep_profile(stage, page, wall, profile)
+
+
+def record_call(service, route, seconds, status=None):
+    """Records one external API call (e.g. a Drive request) and its latency.
+
+    The call is also charged to every span open on the calling thread.
+    """
+    if not enabled():
+        return
+    key = f"{service} {route}"
+    with _lock:
+        stats = call_stats[key]
+        stats["calls"] += 1
+        stats["seconds"] += seconds
+        if status is not None and status >= 400:
+            stats["errors"] += 1
+    for info in getattr(_local, "stack", []):
+        info["drive_calls"] += 1
+        info["drive_s"] = round(info["drive_s"] + seconds, 6)
+
+
+def report():
+    """Prints per-stage totals and API call latencies for this process."""
+    if not enabled() or not (stage_totals or call_stats):
+        return
+    print(f"📊 Trace written to {TRACE_FILE}")
+    for stage, totals in sorted(stage_totals.items()):
+        slowest_page = totals["slowest_page"]
+        print(
+            f"⏱️ {stage}: {totals['spans']} spans, {totals['wall_s']:.1f}s total, "
+            f"slowest {totals['slowest_s']:.2f}s"
+            + (f" (page {slowest_page})" if slowest_page is not None else "")
+        )
+    for key, stats in sorted(call_stats.items()):
+        average_ms = stats["seconds"] / stats["calls"] * 1000
+        print(
+            f"🌐 {key}: {stats['calls']} calls, {average_ms:.0f} ms avg, "
+            f"{stats['errors']} errors"
+        )
+
+
+atexit.register(report)
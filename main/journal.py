@@ -0,0 +1,127 @@
+"""Append-only record of finished page work, so a killed run can resume.
+
+Every stage appends one JSON line when a page's output is complete::
+
+    {"stage": "ocr", "page": 12, "key": "<cache key>", "output": "...", "sha256": "..."}
+
+``key`` is the stage's page cache key (source hash plus parameters) and
+``sha256`` the hash of the output as written. With --resume (or RESUME=1) a
+stage skips a page only if its latest record has the same key and the
+output on disk still has the recorded hash, so a changed source, changed
+parameters or a damaged file are all redone. Outputs are written through
+``atomic_output`` so a run killed mid-write never leaves a half-written
+file under the final name. A torn last line (the process died while
+appending) is ignored when the journal is read.
+"""
+
+import fcntl
+import json
+import os
+import time
+from contextlib import contextmanager
+
+from page_cache import hash_file
+
+JOURNAL_PATH = os.getenv("JOURNAL_PATH", os.path.join("main/pdfs", "journal.jsonl"))
+RESUME = os.getenv("RESUME", "0") == "1"
+
+# Temporary files live in a hidden subfolder of the output folder, so they
+# are on the same filesystem (os.replace is atomic) and never match the
+# stages' *.png / *.pdf listings.
+PARTIAL_FOLDER = ".partial"
+
+
+@contextmanager
+def atomic_output(path):
+    """Yields a temporary path to write ``path``'s content to.
+
+    The file is renamed into place only when the block finishes without an
+    exception; otherwise it is removed. The temporary name keeps the
+    extension, so writers that pick a format from it (cv2.imwrite) work.
+    """
+    folder, name = os.path.split(path)
+    partial_folder = os.path.join(folder or ".", PARTIAL_FOLDER)
+    os.makedirs(partial_folder, exist_ok=True)
+    tmp_path = os.path.join(partial_folder, f"{os.getpid()}_{name}")
+    try:
+        yield tmp_path
+        os.replace(tmp_path, path)
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+
+
+class Journal:
+    """Per-page, per-stage completion records backed by a JSONL file."""
+
+    def __init__(self, path=JOURNAL_PATH, resume=RESUME):
+        self.path = path
+        self.resume = resume
+        self.entries = {}  # (stage, page) -> latest record
+        self.resumed = 0
+        if os.path.exists(path):
+            self._read()
+
+    def _read(self):
+        with open(self.path) as f:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    continue  # Torn write from a killed run
+                self.entries[(record["stage"], record["page"])] = record
+
+    def done(self, stage, page, key=None):
+        """True if resuming and ``page`` already finished ``stage`` with ``key``.
+
+        The recorded output must still exist with its recorded hash.
+        """
+        if not self.resume:
+            return False
+        record = self.entries.get((stage, page))
+        if not record or record.get("key") != key:
+            return False
+        output = record["output"]
+        if not os.path.exists(output) or hash_file(output) != record["sha256"]:
+            return False
+        self.resumed += 1
+        return True
+
+    def record(self, stage, page, output, key=None):
+        """Appends a completion record for ``output`` (already in place)."""
+        record = {
+            "stage": stage,
+            "page": page,
+            "key": key,
+            "output": output,
+            "sha256": hash_file(output),
+            "ts": time.time(),
+        }
+        self.entries[(stage, page)] = record
+        folder = os.path.dirname(self.path)
+        if folder:
+            os.makedirs(folder, exist_ok=True)
+        with open(self.path, "a+b") as f:
+            fcntl.flock(f, fcntl.LOCK_EX)  # Stages may append from several processes
+            if f.seek(0, os.SEEK_END):
+                f.seek(-1, os.SEEK_END)
+                if f.read(1) != b"\n":
+                    f.write(b"\n")  # Start after a torn line, don't extend it
+            f.write((json.dumps(record) + "\n").encode())
+            f.flush()
+            os.fsync(f.fileno())
+
+    def report(self, stage):
+        """Prints how many pages were skipped because they were already done."""
+        if self.resume:
+            print(f"📓 Resumed {stage}: {self.resumed} pages already done")
+
+
+def add_resume_argument(parser):
+    """Adds the shared --resume option to a stage's argument parser."""
+    parser.add_argument(
+        "--resume",
+        action="store_true",
+        default=RESUME,
+        help=f"Skip pages {JOURNAL_PATH} records as done with the same inputs.",
+    )
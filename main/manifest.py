@@ -0,0 +1,168 @@
+"""Per-run record of where each page's output lives.
+
+Stages that produce OCR output record every page here so combine_ocr_pdf.py
+can assemble the final document in page order without parsing file names.
+The manifest is JSON, stored next to the run's outputs::
+
+    {
+      "source": "main/pdfs/demo.pdf",
+      "pages": {
+        "1": {"pdf": "pdfs_output/final_output_page_1.pdf", "index": 0},
+        "2": {"blank": true, "width": 595.0, "height": 842.0},
+        ...
+      }
+    }
+
+``pdf`` is relative to the manifest's folder and ``index`` is the page's
+0-based position inside that PDF, so batch outputs (one PDF for many pages)
+and per-page outputs are described the same way. Blank pages, detected when
+the PDF is split, have no output at all; the later stages skip them and the
+merge inserts an empty page of the recorded size (in points). Born-digital
+pages (``"kind": "text"``) point straight at the source PDF and are copied
+into the merged document without being rasterized or OCRed.
+
+A page whose stage failed keeps the annotations split_pdf.py gave it but
+has neither ``pdf`` nor ``blank``; ``missing_pages`` reports it (and any
+page up to the source's ``page_count`` without an entry), and
+combine_ocr_pdf.py refuses to merge until it has an output.
+
+A run split with ``--shard i/N`` writes one manifest per shard
+(``shard_manifest_path``) that also records ``"shard": [i, N]``;
+combine_ocr_pdf.py --shards N checks the shards cover every page exactly
+once and merges them.
+"""
+
+import json
+import os
+
+MANIFEST_PATH = os.path.join("main/pdfs", "manifest.json")
+
+
+def shard_manifest_path(index, count, path=MANIFEST_PATH):
+    """Manifest path for shard ``index`` of ``count`` (manifest.shard-2-of-4.json)."""
+    root, ext = os.path.splitext(path)
+    return f"{root}.shard-{index}-of-{count}{ext}"
+
+
+class Manifest:
+    """Page number -> output location mapping, saved atomically."""
+
+    def __init__(
+        self, path=MANIFEST_PATH, source=None, pages=None, shard=None, page_count=None
+    ):
+        self.path = path
+        self.source = source
+        self.pages = pages or {}
+        self.shard = tuple(shard) if shard else None  # (index, count)
+        self.page_count = page_count
+
+    @classmethod
+    def load(cls, path=MANIFEST_PATH):
+        """Reads a manifest, or returns an empty one if it does not exist."""
+        if not os.path.exists(path):
+            return cls(path)
+        with open(path) as f:
+            data = json.load(f)
+        pages = {int(number): info for number, info in data.get("pages", {}).items()}
+        return cls(
+            path,
+            data.get("source"),
+            pages,
+            data.get("shard"),
+            data.get("page_count"),
+        )
+
+    @property
+    def folder(self):
+        return os.path.dirname(self.path) or "."
+
+    def set_page(self, page_number, pdf_path, index=0, **info):
+        """Records that ``page_number`` is page ``index`` of ``pdf_path``."""
+        self.pages[page_number] = {
+            **self.pages.get(page_number, {}),
+            **info,
+            "pdf": os.path.relpath(pdf_path, self.folder),
+            "index": index,
+        }
+        self.pages[page_number].pop("blank", None)
+
+    def annotate(self, page_number, **info):
+        """Adds ``info`` to a page's entry without changing its output."""
+        self.pages.setdefault(page_number, {}).update(info)
+
+    def set_blank(self, page_number, width, height, **info):
+        """Records that ``page_number`` is blank and ``width`` x ``height`` points."""
+        self.pages[page_number] = {
+            **self.pages.get(page_number, {}),
+            **info,
+            "blank": True,
+            "width": width,
+            "height": height,
+        }
+
+    def is_blank(self, page_number):
+        return self.pages.get(page_number, {}).get("blank", False)
+
+    def page_dpi(self, page_number, default=None):
+        """The resolution split_pdf.py rendered ``page_number`` at."""
+        return self.pages.get(page_number, {}).get("dpi") or default
+
+    def is_passthrough(self, page_number):
+        """True for born-digital pages that are copied from the source PDF."""
+        return self.pages.get(page_number, {}).get("kind") == "text"
+
+    def skips_image_stages(self, page_number):
+        """True for pages the image and OCR stages must leave alone."""
+        return self.is_blank(page_number) or self.is_passthrough(page_number)
+
+    def blank_pages(self):
+        """Returns the numbers of the pages marked blank."""
+        return sorted(n for n, info in self.pages.items() if info.get("blank"))
+
+    def page_pdf(self, page_number):
+        """Returns the path of the PDF holding ``page_number``."""
+        return os.path.join(self.folder, self.pages[page_number]["pdf"])
+
+    def has_output(self, page_number):
+        """True if ``page_number`` is blank or has an output PDF."""
+        info = self.pages.get(page_number, {})
+        return bool(info.get("blank")) or "pdf" in info
+
+    def missing_pages(self):
+        """Returns the numbers of the pages without an output, in order.
+
+        These are pages with an entry but neither a PDF nor ``blank`` (a
+        stage failed on them), and pages up to ``page_count`` with no entry.
+        """
+        numbers = set(self.pages) | set(range(1, (self.page_count or 0) + 1))
+        return sorted(n for n in numbers if not self.has_output(n))
+
+    def ordered(self):
+        """Yields (page_number, pdf_path, index) in page order.
+
+        Blank pages are yielded with a ``pdf_path`` and ``index`` of None.
+        Raises ValueError on a page without an output rather than skipping
+        it, which would shift every later page (see missing_pages).
+        """
+        for page_number in sorted(self.pages):
+            info = self.pages[page_number]
+            if info.get("blank"):
+                yield page_number, None, None
+            elif "pdf" in info:
+                yield page_number, self.page_pdf(page_number), info.get("index", 0)
+            else:
+                raise ValueError(f"Page {page_number} has no output")
+
+    def save(self):
+        """Writes the manifest through a temporary file and an atomic rename."""
+        os.makedirs(self.folder, exist_ok=True)
+        data = {"source": self.source}
+        if self.shard:
+            data["shard"] = list(self.shard)
+        if self.page_count:
+            data["page_count"] = self.page_count
+        data["pages"] = {str(n): self.pages[n] for n in sorted(self.pages)}
+        tmp_path = f"{self.path}.{os.getpid()}.tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(data, f, indent=2)
+        os.replace(tmp_path, self.path)
@@ -0,0 +1,336 @@
+import argparse
+import io
+import os
+import shutil
+import subprocess
+import tempfile
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+import fitz  # PyMuPDF
+import instrument
+from journal import Journal, add_resume_argument, atomic_output
+from manifest import MANIFEST_PATH, Manifest
+from page_cache import PageCache, hash_bytes, hash_file
+from PIL import Image
+
+# Define input and output folders (same as ocr.sh)
+pdf_folder = "main/pdfs"
+input_folder = os.path.join(pdf_folder, "text_enhanced_images_600dpi")
+output_folder = os.path.join(pdf_folder, "pdfs_output")
+batch_output_pdf = os.path.join(output_folder, "ocr_batch.pdf")
+
+# OCR settings
+OCR_LANGS = "eng+hin"
+OCR_DPI = 600
+OCR_MODES = ("batch", "pages")
+
+# OCRmyPDF --optimize level. 1 is lossless and turns 1-bit page images into
+# JBIG2 when jbig2enc is installed (the workflow builds it).
+OCR_OPTIMIZE = int(os.getenv("OCR_OPTIMIZE", "1"))
+
+IMAGE_EXTENSIONS = (".png", ".jpg", ".jpeg")
+
+
+def ocr_cache_params(langs=OCR_LANGS):
+    """The OCRmyPDF settings that change its output (part of the cache key)."""
+    return {"langs": langs, "clean": True, "optimize": OCR_OPTIMIZE}
+
+
+def extract_page_number(filename):
+    """Returns the trailing page number of a file name (inf if there is none)."""
+    stem = os.path.splitext(filename)[0]
+    try:
+        return int(stem.split("_")[-1])
+    except ValueError:
+        return float("inf")
+
+
+def run_ocrmypdf(input_file, output_pdf, langs=OCR_LANGS, image_dpi=None, jobs=1):
+    """Runs OCRmyPDF once. Returns True on success.
+
+    Uses the ocrmypdf Python API when it is importable in this interpreter and
+    falls back to the ``ocrmypdf`` command otherwise (e.g. when it was only
+    installed from apt).
+    """
+    try:
+        import ocrmypdf
+    except ImportError:
+        command = ["ocrmypdf", "-l", langs, "--jobs", str(jobs), "--clean"]
+        command += ["--optimize", str(OCR_OPTIMIZE)]
+        if image_dpi:
+            command += ["--image-dpi", str(image_dpi)]
+        result = subprocess.run(command + [input_file, output_pdf])
+        return result.returncode == 0
+
+    exit_code = ocrmypdf.ocr(
+        input_file,
+        output_pdf,
+        language=langs.split("+"),
+        image_dpi=image_dpi,
+        clean=True,
+        optimize=OCR_OPTIMIZE,
+        jobs=jobs,
+        progress_bar=False,
+    )
+    return exit_code == ocrmypdf.ExitCode.ok
+
+
+def ocr_page(image_path, output_pdf, langs=OCR_LANGS, image_dpi=OCR_DPI):
+    """OCRs a single page image. Returns (image_path, success, seconds)."""
+    start = time.perf_counter()
+    with instrument.span("ocr", "ocr", instrument.page_number(image_path)) as info:
+        try:
+            # Only a finished PDF is renamed to output_pdf
+            with atomic_output(output_pdf) as tmp_pdf:
+                success = run_ocrmypdf(image_path, tmp_pdf, langs, image_dpi, jobs=1)
+                if not success:
+                    raise RuntimeError("OCRmyPDF reported an error")
+        except Exception as e:
+            print(f"⚠️ ERROR: OCR failed for {image_path}. Reason: {e}")
+            success = False
+        info["ok"] = success
+    return image_path, success, time.perf_counter() - start
+
+
+def ccitt_g4(image):
+    """Encodes a 1-bit PIL image as a CCITT Group 4 stream.
+
+    Returns (data, black_is_1) for a PDF /CCITTFaxDecode image.
+    """
+    buffer = io.BytesIO()
+    # One strip, so the TIFF's image data is a single G4 stream
+    image.save(
+        buffer, format="TIFF", compression="group4", tiffinfo={278: image.height}
+    )
+    tiff = Image.open(io.BytesIO(buffer.getvalue()))
+    offset, length = tiff.tag_v2[273][0], tiff.tag_v2[279][0]
+    black_is_1 = tiff.tag_v2.get(262) == 1  # PhotometricInterpretation
+    return buffer.getvalue()[offset : offset + length], black_is_1
+
+
+def insert_bilevel_image(page, rect, image):
+    """Embeds a 1-bit PIL image on ``page`` as CCITT G4.
+
+    PyMuPDF re-encodes images with Flate, which is about twice the size of G4
+    on text pages, so a placeholder image is inserted and its stream swapped
+    for the G4 data.
+    """
+    data, black_is_1 = ccitt_g4(image)
+    placeholder = fitz.Pixmap(fitz.csGRAY, fitz.IRect(0, 0, 1, 1), False)
+    xref = page.insert_image(rect, pixmap=placeholder)
+    doc = page.parent
+    doc.update_stream(xref, data, compress=False)
+    for key, value in (
+        ("Width", str(image.width)),
+        ("Height", str(image.height)),
+        ("BitsPerComponent", "1"),
+        ("ColorSpace", "/DeviceGray"),
+        ("Filter", "/CCITTFaxDecode"),
+        (
+            "DecodeParms",
+            f"<< /K -1 /Columns {image.width} /Rows {image.height} "
+            f"/BlackIs1 {'true' if black_is_1 else 'false'} >>",
+        ),
+    ):
+        doc.xref_set_key(xref, key, value)
+
+
+def assemble_images_pdf(image_paths, output_pdf, image_dpi=OCR_DPI):
+    """Packs page images into one image-only PDF, one page per image.
+
+    Each page is sized so its image renders at ``image_dpi`` (one value, or
+    one per image), which is the resolution OCRmyPDF then infers for it.
+    1-bit images are stored as CCITT G4, others as they are.
+    """
+    if isinstance(image_dpi, int):
+        image_dpi = [image_dpi] * len(image_paths)
+    doc = fitz.open()
+    for image_path, page_dpi in zip(image_paths, image_dpi):
+        with Image.open(image_path) as image:
+            scale = 72 / page_dpi
+            page = doc.new_page(width=image.width * scale, height=image.height * scale)
+            if image.mode == "1":
+                insert_bilevel_image(page, page.rect, image)
+            else:
+                page.insert_image(page.rect, filename=image_path)
+    doc.save(output_pdf, deflate=True)
+    doc.close()
+
+
+def ocr_batch(image_paths, output_pdf, langs=OCR_LANGS, image_dpi=OCR_DPI, jobs=None):
+    """OCRs all pages in a single OCRmyPDF run spread over ``jobs`` cores.
+
+    ``image_dpi`` is one resolution for all pages or a list with one per
+    page. Returns True on success.
+    """
+    jobs = jobs or os.cpu_count() or 1
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        assembled_pdf = os.path.join(tmp_dir, "pages.pdf")
+        with instrument.span("assemble", "ocr", pages=len(image_paths)):
+            assemble_images_pdf(image_paths, assembled_pdf, image_dpi)
+        ocr_pdf = os.path.join(tmp_dir, "ocr.pdf")
+        with instrument.span(
+            "ocr_batch", "ocr", pages=len(image_paths), jobs=jobs
+        ) as info:
+            info["ok"] = run_ocrmypdf(assembled_pdf, ocr_pdf, langs, jobs=jobs)
+        if info["ok"]:
+            with atomic_output(output_pdf) as tmp_pdf:
+                shutil.move(ocr_pdf, tmp_pdf)
+        return info["ok"]
+
+
+def ocr_pages_parallel(jobs, workers, max_in_flight=None):
+    """OCRs (image_path, output_pdf) jobs over a process pool.
+
+    Yields (image_path, success, seconds) in submission order, keeping at most
+    ``max_in_flight`` pages queued so memory stays bounded.
+    """
+    max_in_flight = max_in_flight or workers * 2
+    pending = deque()
+    jobs = iter(jobs)
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        while True:
+            while len(pending) < max_in_flight:
+                job = next(jobs, None)
+                if job is None:
+                    break
+                pending.append(pool.submit(ocr_page, *job))
+
+            if not pending:
+                break
+            yield pending.popleft().result()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="OCR enhanced page images.")
+    parser.add_argument(
+        "--mode",
+        choices=OCR_MODES,
+        default="batch",
+        help="batch: one multi-page OCRmyPDF run; pages: one PDF per page.",
+    )
+    parser.add_argument(
+        "--jobs",
+        type=int,
+        default=os.cpu_count() or 1,
+        help="Cores for the batch run, or worker processes in pages mode.",
+    )
+    parser.add_argument("--langs", default=OCR_LANGS, help="Tesseract languages.")
+    parser.add_argument(
+        "--dpi",
+        type=int,
+        default=OCR_DPI,
+        help="Image DPI for pages the manifest has no resolution for.",
+    )
+    add_resume_argument(parser)
+    args = parser.parse_args()
+
+    os.makedirs(output_folder, exist_ok=True)
+    manifest = Manifest.load(MANIFEST_PATH)
+    image_files = sorted(
+        [
+            f
+            for f in os.listdir(input_folder)
+            if f.lower().endswith(IMAGE_EXTENSIONS)
+            and not manifest.skips_image_stages(extract_page_number(f))
+        ],
+        key=extract_page_number,
+    )
+    if not image_files:
+        print("⚠️ No images found in input directory.")
+        raise SystemExit(0)
+
+    # Page numbers come from the file names, so skipped blank pages leave
+    # gaps; files without a number are numbered by position instead
+    page_numbers = [extract_page_number(f) for f in image_files]
+    if float("inf") in page_numbers:
+        page_numbers = list(range(1, len(image_files) + 1))
+
+    image_paths = [os.path.join(input_folder, f) for f in image_files]
+    page_dpis = [manifest.page_dpi(n, args.dpi) for n in page_numbers]
+    page_cache = PageCache()
+    journal = Journal(resume=args.resume)
+    ocr_params = ocr_cache_params(args.langs)
+    start = time.perf_counter()
+
+    if args.mode == "batch":
+        print(f"📄 OCRing {len(image_paths)} pages in one run ({args.jobs} jobs)...")
+        batch_hash = hash_bytes("".join(hash_file(p) for p in image_paths).encode())
+        cache_key = page_cache.key(
+            "ocr_batch", batch_hash, {**ocr_params, "image_dpi": page_dpis}
+        )
+        if journal.done("ocr_batch", None, cache_key):
+            print("📓 This batch was already OCRed, resuming past it")
+            ok = True
+        elif page_cache.get(cache_key, batch_output_pdf):
+            print("🗃️ Reused cached OCR output for this batch")
+            journal.record("ocr_batch", None, batch_output_pdf, cache_key)
+            ok = True
+        else:
+            ok = ocr_batch(
+                image_paths, batch_output_pdf, args.langs, page_dpis, args.jobs
+            )
+            if ok:
+                page_cache.put(cache_key, batch_output_pdf)
+                journal.record("ocr_batch", None, batch_output_pdf, cache_key)
+        elapsed = time.perf_counter() - start
+        if not ok:
+            print("❌ OCR batch failed.")
+            raise SystemExit(1)
+        for index, page_number in enumerate(page_numbers):
+            manifest.set_page(page_number, batch_output_pdf, index=index)
+        # OCRmyPDF works on the pages in parallel inside one run, so only
+        # the run is timed; the per-page figure is an average
+        print(
+            f"✅ OCRed {len(image_paths)} pages in {elapsed:.1f}s "
+            f"(amortized {elapsed / len(image_paths):.2f}s per page; use "
+            f"--mode pages for per-page timings) -> {batch_output_pdf}"
+        )
+    else:
+        print(f"📄 OCRing {len(image_paths)} pages with {args.jobs} workers...")
+        jobs, cache_keys, image_pages = [], {}, {}
+        for page_number, image_path, page_dpi in zip(
+            page_numbers, image_paths, page_dpis
+        ):
+            image_pages[image_path] = page_number
+            filename = os.path.splitext(os.path.basename(image_path))[0]
+            output_pdf = os.path.join(output_folder, f"{filename}.pdf")
+            cache_keys[image_path] = (
+                page_cache.key(
+                    "ocr",
+                    hash_file(image_path),
+                    {**ocr_params, "image_dpi": page_dpi},
+                ),
+                output_pdf,
+            )
+            if journal.done("ocr", page_number, cache_keys[image_path][0]):
+                manifest.set_page(page_number, output_pdf)
+            elif page_cache.get(cache_keys[image_path][0], output_pdf):
+                manifest.set_page(page_number, output_pdf)
+                journal.record(
+                    "ocr", page_number, output_pdf, cache_keys[image_path][0]
+                )
+                print(f"🗃️ Reused cached OCR output for {image_path}")
+            else:
+                jobs.append((image_path, output_pdf, args.langs, page_dpi))
+
+        failed = []
+        for image_path, ok, seconds in ocr_pages_parallel(jobs, args.jobs):
+            if ok:
+                cache_key, output_pdf = cache_keys[image_path]
+                page_cache.put(cache_key, output_pdf)
+                manifest.set_page(image_pages[image_path], output_pdf)
+                journal.record("ocr", image_pages[image_path], output_pdf, cache_key)
+                print(f"✅ OCRed {image_path} in {seconds:.1f}s")
+            else:
+                failed.append(image_path)
+        if failed:
+            print(f"❌ {len(failed)} pages failed: {failed}")
+        print(f"⏱️ OCR finished in {time.perf_counter() - start:.1f}s")
+        journal.report("ocr")
+
+    manifest.save()
+    page_cache.report()
+    print("🎉 All images have been processed.")
@@ -0,0 +1,219 @@
+"""Shared-memory page rasters that worker processes use without copying.
+
+A PageBufferPool owns a fixed number of equally sized
+multiprocessing.shared_memory slots. The rasterizer writes a page into a
+slot once (see split_pdf.iter_pages' ``allocate``), and a worker process
+turns the small, picklable PageHandle back into a NumPy view of the same
+memory, so a 100 MB page is never pickled or re-encoded between stages.
+
+Slots are reference counted across processes. ``acquire`` hands out a slot
+with one reference and blocks while every slot is in use, which bounds the
+memory the page rasters take to ``slots * slot_bytes``. ``retain`` adds a
+reference and ``release`` drops one; the slot returns to the pool when the
+count reaches zero. The process that acquired a slot may pass its
+reference on with the handle (the receiver then releases it).
+
+    with PageBufferPool(slots=4, slot_bytes=nbytes) as pool:
+        executor = ProcessPoolExecutor(initializer=pool.attach_worker)
+        ...
+"""
+
+import logging
+import multiprocessing
+from multiprocessing import resource_tracker, shared_memory
+
+import numpy as np
+
+_worker_pool = None
+
+# Segments closed while arrays may still view them stay mapped (but
+# unlinked) until the process exits
+_still_mapped = []
+
+
+class PageHandle:
+    """Picklable reference to a page stored in a PageBufferPool slot."""
+
+    __slots__ = ("slot", "shape", "dtype")
+
+    def __init__(self, slot, shape, dtype):
+        self.slot = slot
+        self.shape = tuple(shape)
+        self.dtype = np.dtype(dtype).str
+
+    def __getstate__(self):
+        return self.slot, self.shape, self.dtype
+
+    def __setstate__(self, state):
+        self.slot, self.shape, self.dtype = state
+
+    @property
+    def nbytes(self):
+        return int(np.prod(self.shape)) * np.dtype(self.dtype).itemsize
+
+    def __repr__(self):
+        return f"PageHandle(slot={self.slot}, shape={self.shape}, dtype={self.dtype})"
+
+
+def _attach(name):
+    """Opens an existing segment without handing it to this process's
+    resource tracker (only the creating pool may unlink it)."""
+    segment = shared_memory.SharedMemory(name=name)
+    try:
+        resource_tracker.unregister(segment._name, "shared_memory")
+    except Exception:
+        pass
+    return segment
+
+
+class PageBufferPool:
+    """Fixed-size pool of shared-memory page slots with cross-process refcounts."""
+
+    def __init__(self, slots, slot_bytes):
+        self.slots = slots
+        self.slot_bytes = slot_bytes
+        self._owner = True
+        self._segments = [
+            shared_memory.SharedMemory(create=True, size=max(slot_bytes, 1))
+            for _ in range(slots)
+        ]
+        self._refcount_segment = shared_memory.SharedMemory(
+            create=True, size=slots * np.dtype(np.int32).itemsize
+        )
+        self._refcounts = np.ndarray(
+            (slots,), np.int32, buffer=self._refcount_segment.buf
+        )
+        self._refcounts[:] = 0
+        self._lock = multiprocessing.Lock()
+        self._free = multiprocessing.Semaphore(slots)
+        self._addresses = None
+
+    def __getstate__(self):
+        # Only sent to worker processes at start-up (see attach_worker)
+        return {
+            "slots": self.slots,
+            "slot_bytes": self.slot_bytes,
+            "names": [segment.name for segment in self._segments],
+            "refcounts": self._refcount_segment.name,
+            "lock": self._lock,
+            "free": self._free,
+        }
+
+    def __setstate__(self, state):
+        self.slots = state["slots"]
+        self.slot_bytes = state["slot_bytes"]
+        self._owner = False
+        self._segments = [_attach(name) for name in state["names"]]
+        self._refcount_segment = _attach(state["refcounts"])
+        self._refcounts = np.ndarray(
+            (self.slots,), np.int32, buffer=self._refcount_segment.buf
+        )
+        self._lock = state["lock"]
+        self._free = state["free"]
+        self._addresses = None
+
+    def attach_worker(self):
+        """ProcessPoolExecutor initializer: makes this the worker's ``worker_pool()``."""
+        global _worker_pool
+        _worker_pool = self
+
+    def acquire(self, shape, dtype=np.uint8, timeout=None):
+        """Reserves a free slot for an array of ``shape`` (refcount 1).
+
+        Blocks until a slot is released. Raises ValueError if the array
+        does not fit a slot and TimeoutError if ``timeout`` expires.
+        """
+        handle = PageHandle(-1, shape, dtype)
+        if handle.nbytes > self.slot_bytes:
+            raise ValueError(
+                f"Page of {handle.nbytes} bytes does not fit a "
+                f"{self.slot_bytes}-byte slot"
+            )
+        if not self._free.acquire(timeout=timeout):
+            raise TimeoutError("No free page buffer")
+        with self._lock:
+            handle.slot = int(np.flatnonzero(self._refcounts == 0)[0])
+            self._refcounts[handle.slot] = 1
+        return handle
+
+    def allocate(self, shape, dtype=np.uint8):
+        """Like ``acquire``, but returns the view (``handle_for`` gives the handle)."""
+        return self.view(self.acquire(shape, dtype))
+
+    def view(self, handle):
+        """Returns the NumPy array stored in ``handle``'s slot (no copy)."""
+        return np.ndarray(
+            handle.shape, handle.dtype, buffer=self._segments[handle.slot].buf
+        )
+
+    def handle_for(self, array):
+        """Returns the handle of an array obtained from ``allocate``/``view``."""
+        if self._addresses is None:
+            self._addresses = [
+                np.frombuffer(segment.buf, np.uint8).ctypes.data
+                for segment in self._segments
+            ]
+        address = array.__array_interface__["data"][0]
+        return PageHandle(self._addresses.index(address), array.shape, array.dtype)
+
+    def retain(self, handle):
+        """Adds a reference to ``handle``'s slot."""
+        with self._lock:
+            if self._refcounts[handle.slot] <= 0:
+                raise ValueError(f"{handle} is not in use")
+            self._refcounts[handle.slot] += 1
+
+    def release(self, handle):
+        """Drops a reference; the slot is free again once none are left."""
+        with self._lock:
+            if self._refcounts[handle.slot] <= 0:
+                raise ValueError(f"{handle} was already released")
+            self._refcounts[handle.slot] -= 1
+            freed = self._refcounts[handle.slot] == 0
+        if freed:
+            self._free.release()
+
+    def in_use(self):
+        """Returns the number of slots currently holding a page."""
+        with self._lock:
+            return int(np.count_nonzero(self._refcounts))
+
+    def close(self):
+        """Detaches from the slots; the creating process also frees them.
+
+        Slots that still hold a page (a run that stopped mid-page) may still
+        be viewed by arrays, and unmapping them would leave those arrays
+        pointing at freed memory. They are unlinked but stay mapped until the
+        process exits, as are segments whose buffer is still exported.
+        """
+        in_use = set(np.flatnonzero(self._refcounts).tolist())
+        self._refcounts = None
+        for slot, segment in enumerate(self._segments + [self._refcount_segment]):
+            if slot not in in_use:
+                try:
+                    segment.close()
+                except BufferError:
+                    in_use.add(slot)
+            if slot in in_use:
+                _still_mapped.append(segment)
+            if self._owner:
+                segment.unlink()
+        self._segments = []
+        if in_use:
+            logging.warning(
+                f"⚠️ {len(in_use)} page buffers were still in use when the pool "
+                "closed; they stay mapped until the process exits"
+            )
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def worker_pool():
+    """The pool handed to this worker process by ``attach_worker``."""
+    if _worker_pool is None:
+        raise RuntimeError("No page buffer pool attached to this process")
+    return _worker_pool
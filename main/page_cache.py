@@ -0,0 +1,219 @@
+"""Content-addressed cache of per-page stage outputs.
+
+Entries are keyed by the hash of a page's source bytes plus the stage
+parameters, so unchanged pages are never reprocessed across runs. The cache
+lives in PAGE_CACHE_DIR and is trimmed to PAGE_CACHE_MAX_BYTES by evicting
+the least recently used entries.
+
+The stages use it as::
+
+    cache = PageCache()
+    key = cache.key("ocr", hash_file(image_path), {"langs": OCR_LANGS})
+    if not cache.get(key, pdf_path):  # Copies the output on a hit
+        ...  # Produce pdf_path
+        cache.put(key, pdf_path)
+    cache.report()
+"""
+
+import hashlib
+import json
+import os
+import re
+import shutil
+from collections import Counter
+
+CACHE_DIR = os.getenv(
+    "PAGE_CACHE_DIR", os.path.expanduser("~/.cache/pdf-automation/pages")
+)
+CACHE_MAX_BYTES = int(os.getenv("PAGE_CACHE_MAX_BYTES", str(5 * 1024**3)))
+CACHE_DISABLED = os.getenv("PAGE_CACHE", "1") == "0"
+
+
+def hash_bytes(data):
+    """Returns the SHA-256 hex digest of ``data``."""
+    return hashlib.sha256(data).hexdigest()
+
+
+def hash_file(file_path):
+    """Returns the SHA-256 hex digest of a file, read in chunks."""
+    digest = hashlib.sha256()
+    with open(file_path, "rb") as f:
+        for block in iter(lambda: f.read(1024 * 1024), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+# Indirect references ("12 0 R") and the keys that lead out of a page's
+# own resources (back to the page or the page tree)
+_PDF_REF = re.compile(r"(\d+) \d+ R")
+_PDF_BACK_REF = re.compile(r"/(?:P|Parent)\s+\d+ \d+ R")
+
+
+def _hash_pdf_value(doc, text, digest, seen):
+    """Hashes a PDF object's text and, recursively, the objects it references.
+
+    Object numbers are left out of the hash, so a document saved with its
+    objects renumbered gives the same hashes.
+    """
+    text = _PDF_BACK_REF.sub("", text)
+    digest.update(_PDF_REF.sub("R", text).encode())
+    for xref in _PDF_REF.findall(text):
+        _hash_pdf_xref(doc, int(xref), digest, seen)
+
+
+def _hash_pdf_xref(doc, xref, digest, seen):
+    if xref in seen:
+        return
+    seen.add(xref)
+    _hash_pdf_value(doc, doc.xref_object(xref, compressed=True), digest, seen)
+    if doc.xref_is_stream(xref):
+        digest.update(doc.xref_stream_raw(xref) or b"")
+
+
+def _page_resources(doc, page):
+    """The page's /Resources value, following inheritance from the page tree."""
+    xref = page.xref
+    while xref:
+        kind, value = doc.xref_get_key(xref, "Resources")
+        if kind != "null":
+            return value
+        kind, parent = doc.xref_get_key(xref, "Parent")
+        xref = int(parent.split()[0]) if kind == "xref" else 0
+    return ""
+
+
+def pdf_page_hashes(pdf_path):
+    """Returns one hash per page, covering everything that feeds its rendering.
+
+    That is the page's size and rotation, its content streams, every object
+    its resources reach (images, fonts and form XObjects, recursively) and
+    the appearance streams of its annotations. Only these bytes are hashed,
+    so appending pages to a document leaves the hashes of existing pages
+    unchanged.
+    """
+    import fitz  # PyMuPDF
+
+    hashes = []
+    with fitz.open(pdf_path) as doc:
+        for page in doc:
+            digest = hashlib.sha256()
+            seen = set()
+            digest.update(repr((tuple(page.rect), page.rotation)).encode())
+            digest.update(page.read_contents())
+            _hash_pdf_value(doc, _page_resources(doc, page), digest, seen)
+            for annot_xref, _, _ in page.annot_xrefs():
+                kind, appearance = doc.xref_get_key(annot_xref, "AP")
+                if kind == "null":
+                    continue  # Nothing drawn (e.g. a link)
+                for key in ("Rect", "F", "AS"):
+                    digest.update(repr(doc.xref_get_key(annot_xref, key)).encode())
+                _hash_pdf_value(doc, appearance, digest, seen)
+            hashes.append(digest.hexdigest())
+    return hashes
+
+
+class PageCache:
+    """A size-bounded LRU store of stage outputs on the local filesystem."""
+
+    def __init__(self, root=CACHE_DIR, max_bytes=CACHE_MAX_BYTES):
+        self.root = root
+        self.max_bytes = max_bytes
+        self.counters = Counter()
+        self._size = None
+
+    def key(self, stage, source_hash, params=None):
+        """Builds the cache key for a stage output."""
+        payload = json.dumps(
+            {"stage": stage, "source": source_hash, "params": params or {}},
+            sort_keys=True,
+        )
+        return hash_bytes(payload.encode())
+
+    def _path(self, key):
+        return os.path.join(self.root, key[:2], key)
+
+    def get(self, key, dest_path):
+        """Copies a cached output to ``dest_path``. Returns True on a hit."""
+        if CACHE_DISABLED:
+            return False
+        entry = self._path(key)
+        if not os.path.exists(entry):
+            self.counters["misses"] += 1
+            return False
+        # Copy through a temporary name so dest_path is never half-written
+        tmp_path = f"{dest_path}.{os.getpid()}.tmp"
+        shutil.copyfile(entry, tmp_path)
+        os.replace(tmp_path, dest_path)
+        os.utime(entry)  # Mark as recently used
+        self.counters["hits"] += 1
+        return True
+
+    def put(self, key, src_path):
+        """Stores a stage output and evicts old entries if over budget."""
+        if CACHE_DISABLED:
+            return
+        entry = self._path(key)
+        os.makedirs(os.path.dirname(entry), exist_ok=True)
+        tmp_path = f"{entry}.{os.getpid()}.tmp"
+        shutil.copyfile(src_path, tmp_path)
+        os.replace(tmp_path, entry)
+        self.counters["stores"] += 1
+        if self._size is None:
+            self._size = sum(size for _, size, _ in self._entries())
+        else:
+            self._size += os.path.getsize(entry)
+        if self._size > self.max_bytes:
+            self.evict()
+
+    def _entries(self):
+        """Yields (path, size, last_used) for every cache entry."""
+        if not os.path.isdir(self.root):
+            return
+        for shard in os.listdir(self.root):
+            shard_dir = os.path.join(self.root, shard)
+            if not os.path.isdir(shard_dir):
+                continue
+            for name in os.listdir(shard_dir):
+                if name.endswith(".tmp"):
+                    continue
+                path = os.path.join(shard_dir, name)
+                try:
+                    stat = os.stat(path)
+                except FileNotFoundError:
+                    continue  # Evicted by another process
+                yield path, stat.st_size, stat.st_mtime
+
+    def evict(self):
+        """Removes least recently used entries until the cache fits its budget."""
+        entries = sorted(self._entries(), key=lambda entry: entry[2])
+        total = sum(size for _, size, _ in entries)
+        for path, size, _ in entries:
+            if total <= self.max_bytes:
+                break
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            total -= size
+            self.counters["evictions"] += 1
+        self._size = total
+
+    def stats(self):
+        """Returns counters for this process plus the cache's current size."""
+        entries = list(self._entries())
+        return {
+            **{k: self.counters[k] for k in ("hits", "misses", "stores", "evictions")},
+            "entries": len(entries),
+            "bytes": sum(size for _, size, _ in entries),
+            "max_bytes": self.max_bytes,
+        }
+
+    def report(self, label="Page cache"):
+        """Prints a one-line stats summary."""
+        stats = self.stats()
+        print(
+            f"🗃️ {label}: {stats['hits']} hits, {stats['misses']} misses, "
+            f"{stats['stores']} stored, {stats['evictions']} evicted "
+            f"({stats['entries']} entries, {stats['bytes'] / 1024**2:.1f} MiB)"
+        )
+        return stats
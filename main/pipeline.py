@@ -0,0 +1,426 @@
+import argparse
+import os
+import tempfile
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import ExitStack, closing
+
+import cv2
+import instrument
+from journal import Journal, add_resume_argument
+from manifest import MANIFEST_PATH, Manifest, shard_manifest_path
+from ocr import OCR_LANGS, ocr_cache_params, ocr_page
+from page_buffers import PageBufferPool, worker_pool
+from page_cache import PageCache, pdf_page_hashes
+from remove_watermark import WATERMARK_BANDS, remove_watermark
+from split_pdf import (
+    RASTER_BACKENDS,
+    RESOLUTION_MAX_DPI,
+    RESOLUTION_MIN_DPI,
+    RESOLUTION_TARGET_XHEIGHT,
+    count_pages,
+    iter_pages,
+    parse_dpi,
+    parse_shard,
+    plan_pages,
+    raster_nbytes,
+    shard_pages,
+)
+from text_enhancement import (
+    ENHANCE_OUTPUT,
+    ENHANCE_PROFILE,
+    PROFILE_CHOICES,
+    enhance_page,
+    estimate_noise,
+    profile_cache_params,
+    save_enhanced,
+    select_profile,
+)
+
+# Define input and output folders
+pdf_folder = "main/pdfs"
+source_pdf = os.path.join(pdf_folder, "demo.pdf")
+ocr_output_folder = os.path.join(pdf_folder, "pdfs_output")
+
+# Optional debug output, mirroring the folders of the standalone stages
+debug_folders = {
+    "converted": os.path.join(pdf_folder, "converted_images_600dpi"),
+    "watermark_removed": os.path.join(pdf_folder, "Watermark_removed_images_600dpi"),
+    "enhanced": os.path.join(pdf_folder, "text_enhanced_images_600dpi"),
+}
+
+
+def save_debug_image(stage, image_name, img):
+    """Writes an intermediate page image when debug output is enabled."""
+    folder = debug_folders[stage]
+    os.makedirs(folder, exist_ok=True)
+    cv2.imwrite(os.path.join(folder, image_name), img)
+
+
+def process_page(
+    page_number, img, work_dir, keep_intermediates=False, profile=None, dpi=None
+):
+    """Runs one rasterized page through the image stages in memory.
+
+    The page is de-watermarked and enhanced as ndarrays, and only the
+    enhanced page is encoded (to a PNG in ``work_dir``) for OCR. ``img`` may
+    be a BGR or an already-grayscale raster rendered at ``dpi``, and
+    ``profile`` is an enhancement profile (see
+    text_enhancement.PROFILE_CHOICES). Returns the PNG's path.
+    """
+    image_name = f"final_output_page_{page_number}.png"
+    if keep_intermediates:
+        save_debug_image("converted", image_name, img)
+
+    # "auto" judges the page's noise before watermark removal erases most of it
+    noise = None
+    if (profile or ENHANCE_PROFILE) == "auto":
+        noise = estimate_noise(
+            img if img.ndim == 2 else cv2.cvtColor(img, cv2.COLOR_BGR2GRAY)
+        )
+
+    # Remove watermark in place
+    with instrument.span("watermark", "watermark", page_number) as info:
+        info["changed_pixels"] = remove_watermark(img)
+    if keep_intermediates:
+        save_debug_image("watermark_removed", image_name, img)
+
+    # Enhance text on the grayscale page
+    with instrument.span("enhance", "enhance", page_number) as info:
+        gray = img if img.ndim == 2 else cv2.cvtColor(img, cv2.COLOR_BGR2GRAY)
+        del img
+        info["profile"], params = select_profile(gray, profile, dpi, noise)
+        enhanced = enhance_page(gray, params)
+        del gray
+    if keep_intermediates:
+        save_debug_image("enhanced", image_name, enhanced)
+
+    ocr_input = os.path.join(work_dir, image_name)
+    with instrument.span("encode", "enhance", page_number) as info:
+        info["bytes_written"] = save_enhanced(ocr_input, enhanced, compression=1)
+    return ocr_input
+
+
+def process_shared_page(handle, page_number, work_dir, **kwargs):
+    """process_page for an image worker, on a page in the shared buffer pool.
+
+    The page is used in place through ``handle`` (nothing is copied or
+    pickled) and its reference is released when done, successful or not.
+    Returns the OCR input's path and the seconds spent.
+    """
+    pool = worker_pool()
+    try:
+        start = time.perf_counter()
+        ocr_input = process_page(page_number, pool.view(handle), work_dir, **kwargs)
+        return ocr_input, time.perf_counter() - start
+    finally:
+        pool.release(handle)
+
+
+def output_pdf_path(page_number):
+    """Per-page OCR output, named for combine_ocr_pdf.py."""
+    return os.path.join(ocr_output_folder, f"final_output_page_{page_number}.pdf")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Rasterize, clean, enhance and OCR a PDF page by page in memory."
+    )
+    parser.add_argument("--pdf", default=source_pdf, help="Source PDF to process.")
+    parser.add_argument(
+        "--dpi",
+        type=parse_dpi,
+        default="auto",
+        help="Rendering DPI, or auto to pick one per page from its text size.",
+    )
+    parser.add_argument(
+        "--backend",
+        choices=RASTER_BACKENDS,
+        default="pymupdf",
+        help="Rasterization backend.",
+    )
+    parser.add_argument(
+        "--grayscale",
+        action="store_true",
+        help="Rasterize straight to grayscale (watermark bands are intersected).",
+    )
+    parser.add_argument(
+        "--keep-intermediates",
+        action="store_true",
+        help="Also write each stage's page images to disk for debugging.",
+    )
+    parser.add_argument(
+        "--profile",
+        choices=PROFILE_CHOICES,
+        default=ENHANCE_PROFILE,
+        help="Enhancement profile (auto: fast on clean pages, quality on noisy).",
+    )
+    parser.add_argument(
+        "--rasterize-all",
+        action="store_true",
+        help="Process born-digital pages too instead of copying them as they are.",
+    )
+    parser.add_argument(
+        "--keep-blank",
+        action="store_true",
+        help="Process blank pages too instead of skipping them.",
+    )
+    parser.add_argument(
+        "--ocr-workers",
+        type=int,
+        default=os.cpu_count() or 1,
+        help="Pages OCRed in parallel while later pages are being prepared.",
+    )
+    parser.add_argument(
+        "--image-workers",
+        type=int,
+        default=1,
+        help="Processes cleaning and enhancing pages; above 1, rendered pages "
+        "are handed to them through shared memory instead of being copied.",
+    )
+    parser.add_argument(
+        "--page-buffers",
+        type=int,
+        help="Shared page buffers with --image-workers, bounding the memory "
+        "rendered pages take (default: twice the image workers).",
+    )
+    parser.add_argument(
+        "--shard",
+        type=parse_shard,
+        metavar="i/N",
+        help="Process only the i-th of N page ranges and write a shard "
+        "manifest (merge with combine_ocr_pdf.py --shards N).",
+    )
+    add_resume_argument(parser)
+    args = parser.parse_args()
+
+    os.makedirs(ocr_output_folder, exist_ok=True)
+    total_pages = count_pages(args.pdf)
+    pages = shard_pages(total_pages, args.shard)
+    if args.shard:
+        print(
+            f"📄 Streaming pages {pages.start}-{pages.stop - 1} of {total_pages} "
+            f"from {args.pdf} (shard {args.shard[0]}/{args.shard[1]})..."
+        )
+    else:
+        print(f"📄 Streaming {total_pages} pages from {args.pdf}...")
+
+    # Any parameter that changes a page's final PDF is part of its cache key
+    page_cache = PageCache()
+    pipeline_params = {
+        "dpi": args.dpi,
+        "resolution": (
+            [RESOLUTION_TARGET_XHEIGHT, RESOLUTION_MIN_DPI, RESOLUTION_MAX_DPI]
+            if args.dpi == "auto"
+            else None
+        ),
+        "backend": args.backend,
+        "grayscale": args.grayscale,
+        "bands": WATERMARK_BANDS,
+        "enhance": profile_cache_params(args.profile),
+        "enhance_output": ENHANCE_OUTPUT,
+        "ocr": ocr_cache_params(OCR_LANGS),
+    }
+    if args.shard:
+        manifest = Manifest(
+            shard_manifest_path(*args.shard),
+            source=args.pdf,
+            shard=args.shard,
+            page_count=total_pages,
+        )
+    else:
+        manifest = Manifest(MANIFEST_PATH, source=args.pdf, page_count=total_pages)
+    journal = Journal(resume=args.resume)
+
+    # Born-digital pages are copied from the source by the merge, and blank
+    # pages become empty pages there; neither is rendered here
+    page_dpis = plan_pages(
+        manifest, args.pdf, args.dpi, args.rasterize_all, args.keep_blank, pages
+    )
+
+    cache_keys = {}
+    pages_to_process = []
+    for page_number, page_hash in enumerate(pdf_page_hashes(args.pdf), start=1):
+        if page_number not in page_dpis:
+            continue
+        cache_keys[page_number] = page_cache.key("pipeline", page_hash, pipeline_params)
+        if journal.done("pipeline", page_number, cache_keys[page_number]):
+            manifest.set_page(page_number, output_pdf_path(page_number))
+        elif page_cache.get(cache_keys[page_number], output_pdf_path(page_number)):
+            manifest.set_page(page_number, output_pdf_path(page_number))
+            journal.record(
+                "pipeline",
+                page_number,
+                output_pdf_path(page_number),
+                cache_keys[page_number],
+            )
+            print(f"🗃️ Page {page_number} restored from cache")
+        else:
+            pages_to_process.append(page_number)
+
+    # Image stages run here page by page (or on image workers, see below);
+    # OCR runs on a pool so the next pages are rendered and enhanced while
+    # earlier ones are being OCRed.
+    failed = []
+    pending = deque()
+    prepared = deque()
+    max_in_flight = args.ocr_workers * 2
+    page_options = {
+        "keep_intermediates": args.keep_intermediates,
+        "profile": args.profile,
+    }
+
+    def submit_ocr(page_number, ocr_input):
+        future = ocr_pool.submit(
+            ocr_page,
+            ocr_input,
+            output_pdf_path(page_number),
+            OCR_LANGS,
+            page_dpis[page_number],
+        )
+        pending.append((future, page_number))
+        while len(pending) >= max_in_flight:
+            finish_page(*pending.popleft())
+
+    def finish_prepare(future, page_number):
+        try:
+            ocr_input, seconds = future.result()
+        except Exception as e:
+            print(f"⚠️ ERROR: Could not process Page {page_number}. Reason: {e}")
+            failed.append(page_number)
+            return
+        print(f"🧼 Page {page_number} cleaned and enhanced in {seconds:.1f}s")
+        submit_ocr(page_number, ocr_input)
+
+    def render_failed(page_number, e):
+        print(f"⚠️ ERROR: Could not render Page {page_number}. Reason: {e}")
+        failed.append(page_number)
+
+    def finish_page(future, page_number):
+        try:
+            image_path, ok, seconds = future.result()
+        except Exception as e:
+            # The OCR worker died (its page image goes with work_dir)
+            print(f"⚠️ ERROR: Could not OCR Page {page_number}. Reason: {e}")
+            failed.append(page_number)
+            return
+        os.remove(image_path)
+        if ok:
+            page_cache.put(cache_keys[page_number], output_pdf_path(page_number))
+            manifest.set_page(page_number, output_pdf_path(page_number))
+            journal.record(
+                "pipeline",
+                page_number,
+                output_pdf_path(page_number),
+                cache_keys[page_number],
+            )
+            print(f"✅ Page {page_number} OCRed in {seconds:.1f}s")
+        else:
+            failed.append(page_number)
+
+    start = time.perf_counter()
+    with ExitStack() as stack:
+        # Saved last, however the run ends, so finished pages are recorded
+        stack.callback(manifest.save)
+        work_dir = stack.enter_context(tempfile.TemporaryDirectory())
+        page_buffers = image_pool = None
+        if args.image_workers > 1 and pages_to_process:
+            # Pages are rendered straight into shared memory, and image
+            # workers get a handle to them; the pool closes last
+            page_buffers = stack.enter_context(
+                PageBufferPool(
+                    args.page_buffers or args.image_workers * 2,
+                    raster_nbytes(
+                        args.pdf, page_dpis, args.grayscale, pages_to_process
+                    ),
+                )
+            )
+            image_pool = stack.enter_context(
+                ProcessPoolExecutor(
+                    max_workers=args.image_workers,
+                    initializer=page_buffers.attach_worker,
+                )
+            )
+            print(
+                f"🧠 {page_buffers.slots} shared page buffers of "
+                f"{page_buffers.slot_bytes / 1024**2:.0f} MB for "
+                f"{args.image_workers} image workers"
+            )
+        ocr_pool = stack.enter_context(
+            ProcessPoolExecutor(max_workers=args.ocr_workers)
+        )
+        # Closed before the buffer pool, so the generator's last page (a view
+        # into a slot) is gone when the pool unmaps its slots
+        pages = stack.enter_context(
+            closing(
+                iter_pages(
+                    args.pdf,
+                    args.backend,
+                    page_dpis,
+                    args.grayscale,
+                    pages_to_process,
+                    allocate=page_buffers.allocate if page_buffers else None,
+                    on_error=render_failed,
+                )
+            )
+        )
+        for page_number, img in pages:
+            if page_buffers:
+                # The page's reference goes to the worker with its handle
+                handle = page_buffers.handle_for(img)
+                del img
+                try:
+                    future = image_pool.submit(
+                        process_shared_page,
+                        handle,
+                        page_number,
+                        work_dir,
+                        dpi=page_dpis[page_number],
+                        **page_options,
+                    )
+                except Exception:
+                    page_buffers.release(handle)
+                    raise
+                prepared.append((future, page_number))
+                # OCR is submitted in page order as pages come back
+                while prepared and (
+                    prepared[0][0].done() or len(prepared) >= page_buffers.slots
+                ):
+                    finish_prepare(*prepared.popleft())
+                continue
+
+            try:
+                page_start = time.perf_counter()
+                ocr_input = process_page(
+                    page_number,
+                    img,
+                    work_dir,
+                    dpi=page_dpis[page_number],
+                    **page_options,
+                )
+                print(
+                    f"🧼 Page {page_number} cleaned and enhanced in "
+                    f"{time.perf_counter() - page_start:.1f}s"
+                )
+            except Exception as e:
+                print(f"⚠️ ERROR: Could not process Page {page_number}. Reason: {e}")
+                failed.append(page_number)
+                continue
+            finally:
+                del img
+            submit_ocr(page_number, ocr_input)
+
+        while prepared:
+            finish_prepare(*prepared.popleft())
+        while pending:
+            finish_page(*pending.popleft())
+
+    print(
+        f"⏱️ Processed {len(pages_to_process)} pages in {time.perf_counter() - start:.1f}s"
+    )
+    if failed:
+        print(f"❌ {len(failed)} pages failed: {failed}")
+    page_cache.report()
+    journal.report("pipeline")
+    print("🎉 Streaming pipeline complete!")
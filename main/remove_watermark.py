@@ -1,9 +1,19 @@
+import argparse
 import os
 
 import cv2
+import instrument
 import numpy as np
 from drive_utils import get_or_create_folder  # ✅ Use correct function name
-from drive_utils import upload_to_drive
+from drive_utils import (
+    DriveUploader,
+    add_storage_argument,
+    apply_storage_arguments,
+    uploads_stage,
+)
+from journal import Journal, add_resume_argument, atomic_output
+from manifest import MANIFEST_PATH, Manifest
+from page_cache import PageCache, hash_file
 from skimage import io
 
 # Define input and output folders
@@ -11,9 +21,8 @@ pdf_folder = "main/pdfs"
 input_folder = os.path.join(pdf_folder, "converted_images_600dpi")
 output_folder = os.path.join(pdf_folder, "Watermark_removed_images_600dpi")
 
-# Create the output folder if it doesn't exist
-os.makedirs(output_folder, exist_ok=True)
-print(f"📂 Created output directory: {output_folder}")
+# Per-channel [low, high] bands, in image channel order (BGR for cv2.imread)
+WATERMARK_BANDS = ((210, 255), (210, 255), (210, 255))
 
 
 # Pixel selection function (Detects watermark pixels)
@@ -22,9 +31,46 @@ def select_watermark_pixel(r, g, b):
     return 210 <= r <= 255 and 210 <= g <= 255 and 210 <= b <= 255
 
 
+def _cv_writable(imgs):
+    """True if OpenCV can use ``imgs`` as an output in place (rows may be
+    strided, but each row's pixels must be packed)."""
+    packed = imgs.itemsize
+    for size, stride in zip(reversed(imgs.shape[1:]), reversed(imgs.strides[1:])):
+        if stride != packed:
+            return False
+        packed *= size
+    return True
+
+
 # Image processing function (Removes watermark)
-def remove_watermark(imgs):
-    """Convert watermark pixels to pure white (255,255,255)."""
+def remove_watermark(imgs, bands=WATERMARK_BANDS):
+    """Convert watermark pixels to pure white (255,255,255) in place.
+
+    Builds a single-channel mask with cv2.inRange and whitens the masked
+    pixels directly in the input buffer, so no full-frame copy is made.
+    Returns the number of pixels that fell inside every channel band.
+
+    Grayscale (2-D) pages are matched against the intersection of the bands,
+    i.e. the gray levels a pixel with equal channels would need to match.
+    """
+    if imgs.ndim == 2:
+        lower = (max(band[0] for band in bands),)
+        upper = (min(band[1] for band in bands),)
+    else:
+        lower = tuple(band[0] for band in bands)
+        upper = tuple(band[1] for band in bands)
+    mask = cv2.inRange(imgs, lower, upper)
+    changed_pixels = cv2.countNonZero(mask)
+    if _cv_writable(imgs):
+        cv2.bitwise_or(imgs, (255, 255, 255, 255), dst=imgs, mask=mask)  # Pure white
+    else:
+        imgs[mask.view(bool)] = 255  # Views OpenCV can't write to, e.g. img[:, ::2]
+    print(f"✅ Modified {changed_pixels} watermark pixels.")
+    return changed_pixels
+
+
+def remove_watermark_per_pixel(imgs):
+    """Reference per-pixel implementation, kept for parity checks."""
     height, width, _ = imgs.shape
     changed_pixels = 0
     for i in range(height):
@@ -38,42 +84,96 @@ def remove_watermark(imgs):
     return imgs
 
 
-# Process each image from the input folder
-image_files = sorted(
-    [f for f in os.listdir(input_folder) if f.endswith((".png", ".jpg", ".jpeg"))]
-)
-
-if image_files:
-    print(f"📷 Found {len(image_files)} images in: {input_folder}")
-
-    # Create a subfolder in Google Drive for cleaned images
-    watermark_removed_folder_id = get_or_create_folder(  # ✅ Use correct function
-        "Watermark_Removed_Images", parent_folder_id=os.getenv("GDRIVE_FOLDER_ID")
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Remove watermarks from page images.")
+    add_storage_argument(parser)
+    add_resume_argument(parser)
+    args = parser.parse_args()
+    apply_storage_arguments(args)
+
+    # Create the output folder if it doesn't exist
+    os.makedirs(output_folder, exist_ok=True)
+    print(f"📂 Created output directory: {output_folder}")
+
+    # Process each image from the input folder, except pages split_pdf.py
+    # marked blank or born-digital
+    manifest = Manifest.load(MANIFEST_PATH)
+    image_files = sorted(
+        [
+            f
+            for f in os.listdir(input_folder)
+            if f.endswith((".png", ".jpg", ".jpeg"))
+            and not manifest.skips_image_stages(instrument.page_number(f))
+        ]
     )
 
-    # Process each image to remove watermark
-    for image_file in image_files:
-        input_image_path = os.path.join(input_folder, image_file)
-
-        # Read the image
-        img = cv2.imread(input_image_path)
-        if img is None:
-            print(f"⚠️ Failed to load: {input_image_path}")
-            continue
-
-        # Remove watermark
-        img_np = remove_watermark(img)
-
-        # Save cleaned image
-        cleaned_image_path = os.path.join(output_folder, image_file)
-        io.imsave(cleaned_image_path, img_np)
-        print(f"✅ Processed & saved: {cleaned_image_path}")
-
-        # Upload to Google Drive
-        upload_to_drive(
-            cleaned_image_path, parent_folder_id=watermark_removed_folder_id
-        )
+    if image_files:
+        print(f"📷 Found {len(image_files)} images in: {input_folder}")
+
+        # Create a subfolder in Google Drive for cleaned images (only if the
+        # upload policy includes this stage)
+        watermark_removed_folder_id = None
+        if uploads_stage("watermark"):
+            watermark_removed_folder_id = get_or_create_folder(
+                "Watermark_Removed_Images",
+                parent_folder_id=os.getenv("GDRIVE_FOLDER_ID"),
+            )
+
+        # Process each image to remove watermark
+        page_cache = PageCache()
+        journal = Journal(resume=args.resume)
+        with DriveUploader(stage="watermark") as uploader:
+            for image_file in image_files:
+                input_image_path = os.path.join(input_folder, image_file)
+                cleaned_image_path = os.path.join(output_folder, image_file)
+
+                # Reuse the cleaned page if this exact input was seen before
+                cache_key = page_cache.key(
+                    "watermark",
+                    hash_file(input_image_path),
+                    {"bands": WATERMARK_BANDS},
+                )
+                page_number = instrument.page_number(image_file)
+                if journal.done("watermark", page_number, cache_key):
+                    uploader.submit(
+                        cleaned_image_path, parent_folder_id=watermark_removed_folder_id
+                    )
+                    continue
+                if page_cache.get(cache_key, cleaned_image_path):
+                    print(f"🗃️ Reused cached cleaned image: {cleaned_image_path}")
+                    journal.record(
+                        "watermark", page_number, cleaned_image_path, cache_key
+                    )
+                    uploader.submit(
+                        cleaned_image_path, parent_folder_id=watermark_removed_folder_id
+                    )
+                    continue
+
+                with instrument.span("watermark", "watermark", page_number) as info:
+                    # Read the image
+                    img = cv2.imread(input_image_path)
+                    if img is None:
+                        print(f"⚠️ Failed to load: {input_image_path}")
+                        continue
+
+                    # Remove watermark
+                    info["changed_pixels"] = remove_watermark(img)
+
+                    # Save cleaned image
+                    with atomic_output(cleaned_image_path) as tmp_path:
+                        io.imsave(tmp_path, img)
+                    info["bytes_written"] = os.path.getsize(cleaned_image_path)
+                page_cache.put(cache_key, cleaned_image_path)
+                journal.record("watermark", page_number, cleaned_image_path, cache_key)
+                print(f"✅ Processed & saved: {cleaned_image_path}")
+
+                # Queue upload to Google Drive
+                uploader.submit(
+                    cleaned_image_path, parent_folder_id=watermark_removed_folder_id
+                )
 
-    print(f"🎉 Watermark removal complete! Images uploaded to Google Drive.")
-else:
-    print(f"⚠️ No images found in: {input_folder}")
+        page_cache.report()
+        journal.report("watermark")
+        print(f"🎉 Watermark removal complete!")
+    else:
+        print(f"⚠️ No images found in: {input_folder}")
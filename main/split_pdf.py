@@ -32,57 +32,626 @@
 #
 # print("🎉 PDF converted and uploaded systematically to Drive!")
 
+import argparse
 import gc
+import math
 import os
 import time
 
-from drive_utils import upload_to_drive
+import cv2
+import fitz  # PyMuPDF
+import instrument
+import numpy as np
+from drive_utils import DriveUploader, add_storage_argument, apply_storage_arguments
+from journal import Journal, add_resume_argument, atomic_output
+from manifest import MANIFEST_PATH, Manifest
+from page_cache import PageCache, pdf_page_hashes
 from pdf2image import convert_from_path
-from pdf2image.pdf2image import pdfinfo_from_path
 
 # Define input and output folders
 pdf_folder = "main/pdfs"
 final_output_pdf = os.path.join(pdf_folder, "demo.pdf")
 output_folder = os.path.join(pdf_folder, "converted_images_600dpi")
-os.makedirs(output_folder, exist_ok=True)
-
-# Get total number of pages
-total_pages = pdfinfo_from_path(final_output_pdf)["Pages"]
 
 # Define Google Drive folder for structured uploads
 drive_folder_name = "Converted_Images_600DPI"
 
-# Process and upload each page one at a time
-for page_number in range(1, total_pages + 1):
+# Available rasterization backends
+RASTER_BACKENDS = ("pymupdf", "pdf2image")
+
+# Page classification from the PDF's own content. A page is "text" (born
+# digital) when it has at least TEXT_MIN_CHARS of readable text and images
+# cover less than TEXT_MAX_IMAGE_COVERAGE of it, "scanned" when it has
+# (almost) no usable text, and "mixed" otherwise. Text pages are copied into
+# the final PDF as they are; the others go through the image stages.
+PAGE_KINDS = ("text", "scanned", "mixed")
+TEXT_MIN_CHARS = int(os.getenv("TEXT_MIN_CHARS", "50"))
+TEXT_MAX_IMAGE_COVERAGE = float(os.getenv("TEXT_MAX_IMAGE_COVERAGE", "0.3"))
+TEXT_MAX_GARBLED = 0.1  # Share of U+FFFD characters in a broken text layer
+
+# Adaptive resolution (--dpi auto). Each scanned page is rendered at the
+# smallest DPI, in steps of RESOLUTION_STEP, that makes its dominant x-height
+# at least RESOLUTION_TARGET_XHEIGHT pixels tall (Tesseract does best at
+# roughly 20 px and up), within [RESOLUTION_MIN_DPI, RESOLUTION_MAX_DPI].
+# Pages without measurable text get RESOLUTION_MAX_DPI.
+DEFAULT_DPI = 600
+RESOLUTION_PROBE_DPI = 100
+RESOLUTION_STEP = 50
+RESOLUTION_TARGET_XHEIGHT = int(os.getenv("RESOLUTION_TARGET_XHEIGHT", "20"))
+RESOLUTION_MIN_DPI = int(os.getenv("RESOLUTION_MIN_DPI", "200"))
+RESOLUTION_MAX_DPI = int(os.getenv("RESOLUTION_MAX_DPI", str(DEFAULT_DPI)))
+
+# Blank page detection on a low-resolution grayscale probe render. A page is
+# blank when its paper (median gray level) is light, almost none of it is
+# ink (pixels more than BLANK_INK_CONTRAST gray levels darker or lighter
+# than the paper) and its gray levels barely vary. The outer BLANK_MARGIN of
+# each side is ignored so scanner edges do not count as ink.
+BLANK_PROBE_DPI = 50
+BLANK_MARGIN = 0.05
+BLANK_INK_CONTRAST = 80
+BLANK_MIN_PAPER = 160
+BLANK_MAX_INK = float(os.getenv("BLANK_MAX_INK", "0.0005"))
+BLANK_MAX_STD = float(os.getenv("BLANK_MAX_STD", "20"))
+
+
+def count_pages(pdf_path):
+    """Returns the number of pages in a PDF."""
+    with fitz.open(pdf_path) as doc:
+        return doc.page_count
+
+
+def raster_nbytes(pdf_path, dpi=600, grayscale=False, pages=None):
+    """Largest raster (in bytes) iter_pages produces for ``pages`` at ``dpi``."""
+    channels = 1 if grayscale else 3
+    largest = 0
+    with fitz.open(pdf_path) as doc:
+        if pages is None:
+            pages = range(1, doc.page_count + 1)
+        for page_number in pages:
+            zoom = _page_dpi(dpi, page_number) / 72
+            rect = doc[page_number - 1].rect
+            # Rounded up (plus a pixel) so rendering never overflows a buffer
+            width = math.ceil(rect.width * zoom) + 1
+            height = math.ceil(rect.height * zoom) + 1
+            largest = max(largest, width * height * channels)
+    return largest
+
+
+def parse_shard(value):
+    """argparse type for --shard: "i/N" -> (i, N), with 1 <= i <= N."""
     try:
-        images = convert_from_path(
-            final_output_pdf, dpi=600, first_page=page_number, last_page=page_number
-        )
-        image = images[0]  # Process only 1 page at a time
+        index, count = (int(part) for part in value.split("/"))
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"expected i/N, got {value!r}")
+    if not 1 <= index <= count:
+        raise argparse.ArgumentTypeError(f"shard {index} is not in 1..{count}")
+    return index, count
+
+
+def shard_pages(page_count, shard=None):
+    """Returns the page numbers shard ``(i, N)`` covers (all pages for None).
+
+    Shards are contiguous ranges whose sizes differ by at most one page, so
+    every page belongs to exactly one shard.
+    """
+    if shard is None:
+        return range(1, page_count + 1)
+    index, count = shard
+    first = (index - 1) * page_count // count + 1
+    last = index * page_count // count
+    return range(first, last + 1)
+
+
+def parse_dpi(value):
+    """argparse type for --dpi: a number, or "auto" for the resolution planner."""
+    return value if value == "auto" else int(value)
+
+
+def _page_dpi(dpi, page_number):
+    """``dpi`` is one DPI for all pages or a {page_number: dpi} dict."""
+    return dpi[page_number] if isinstance(dpi, dict) else dpi
+
 
-        image_name = f"final_output_page_{page_number}.png"
-        image_path = os.path.join(output_folder, image_name)
+def _page_array(allocate, shape):
+    """A new uint8 array of ``shape``, from ``allocate`` if one is given."""
+    if allocate is None:
+        return np.empty(shape, np.uint8)
+    return allocate(shape, np.uint8)
 
-        # Save the image
-        image.save(image_path, "PNG")
-        print(f"✅ Page {page_number} saved as {image_name}")
 
-        # Prevent duplicate uploads
-        if not os.path.exists(image_path):
-            time.sleep(5)  # Small delay before upload
-            upload_to_drive(image_path, folder_name=drive_folder_name)
-            print(f"📤 Uploaded '{image_name}' to Google Drive")
+def iter_pages_pymupdf(
+    pdf_path, dpi=600, grayscale=False, pages=None, allocate=None, on_error=None
+):
+    """Opens the PDF once and yields (page_number, ndarray) for each page.
+
+    Colour pages come back as BGR like cv2.imread; grayscale pages are
+    rendered directly in MuPDF's gray colorspace. ``allocate(shape, dtype)``,
+    if given, provides the arrays pages are written to (e.g. a
+    page_buffers.PageBufferPool's shared memory). A page that fails to
+    render is passed to ``on_error(page_number, error)`` and skipped; without
+    ``on_error`` the error ends the iteration.
+    """
+    colorspace = fitz.csGRAY if grayscale else fitz.csRGB
+    with fitz.open(pdf_path) as doc:
+        if pages is None:
+            pages = range(1, doc.page_count + 1)
+        for page_number in pages:
+            with instrument.span("rasterize", "split", page_number, backend="pymupdf"):
+                try:
+                    pix = doc[page_number - 1].get_pixmap(
+                        dpi=_page_dpi(dpi, page_number),
+                        colorspace=colorspace,
+                        alpha=False,
+                    )
+                except Exception as e:
+                    if on_error is None:
+                        raise
+                    on_error(page_number, e)
+                    continue
+                samples = np.frombuffer(pix.samples_mv, dtype=np.uint8).reshape(
+                    pix.height, pix.width, pix.n
+                )
+                if grayscale:
+                    img = _page_array(allocate, samples.shape[:2])
+                    np.copyto(img, samples[:, :, 0])
+                else:
+                    img = _page_array(allocate, samples.shape)
+                    cv2.cvtColor(samples, cv2.COLOR_RGB2BGR, dst=img)
+                del samples, pix
+            yield page_number, img
+
+
+def iter_pages_pdf2image(
+    pdf_path, dpi=600, grayscale=False, pages=None, allocate=None, on_error=None
+):
+    """Yields (page_number, ndarray) using one poppler call per page.
+
+    Pages that fail to render go to ``on_error`` as in iter_pages_pymupdf.
+    """
+    if pages is None:
+        pages = range(1, count_pages(pdf_path) + 1)
+    for page_number in pages:
+        with instrument.span("rasterize", "split", page_number, backend="pdf2image"):
+            try:
+                image = convert_from_path(
+                    pdf_path,
+                    dpi=_page_dpi(dpi, page_number),
+                    first_page=page_number,
+                    last_page=page_number,
+                    grayscale=grayscale,
+                )[0]
+            except Exception as e:
+                if on_error is None:
+                    raise
+                on_error(page_number, e)
+                continue
+            samples = np.asarray(image)
+            img = _page_array(allocate, samples.shape)
+            if grayscale:
+                np.copyto(img, samples)
+            else:
+                cv2.cvtColor(samples, cv2.COLOR_RGB2BGR, dst=img)
+            del samples, image
+        yield page_number, img
+
+
+def iter_pages(
+    pdf_path,
+    backend="pymupdf",
+    dpi=600,
+    grayscale=False,
+    pages=None,
+    allocate=None,
+    on_error=None,
+):
+    """Yields (page_number, ndarray) for the requested pages with the chosen backend.
+
+    ``dpi`` may also be a {page_number: dpi} dict, e.g. from plan_resolution,
+    ``allocate(shape, dtype)`` supplies the output arrays, and
+    ``on_error(page_number, error)`` is told about pages that fail to render
+    so the rest still come through.
+    """
+    if backend == "pymupdf":
+        return iter_pages_pymupdf(pdf_path, dpi, grayscale, pages, allocate, on_error)
+    if backend == "pdf2image":
+        return iter_pages_pdf2image(pdf_path, dpi, grayscale, pages, allocate, on_error)
+    raise ValueError(f"Unknown rasterization backend: {backend}")
+
+
+def classify_page(page):
+    """Classifies a PyMuPDF page. Returns (kind, info), kind in PAGE_KINDS.
+
+    Only visible text counts: the invisible layer OCRmyPDF puts over a scan
+    is not a reason to skip the image stages.
+    """
+    chars = garbled = 0
+    for block in page.get_text("rawdict")["blocks"]:
+        for line in block.get("lines", ()):
+            for text_span in line["spans"]:
+                if text_span.get("alpha", 255) == 0:
+                    continue
+                for char in text_span["chars"]:
+                    if not char["c"].isspace():
+                        chars += 1
+                        garbled += char["c"] == "\ufffd"
+    page_area = abs(page.rect) or 1
+    image_area = sum(
+        abs(fitz.Rect(image["bbox"]) & page.rect) for image in page.get_image_info()
+    )
+    image_coverage = min(1.0, image_area / page_area)
+    readable = chars - garbled
+    info = {"chars": readable, "image_coverage": round(image_coverage, 3)}
+
+    if readable < TEXT_MIN_CHARS or garbled > chars * TEXT_MAX_GARBLED:
+        return "scanned", info
+    if image_coverage < TEXT_MAX_IMAGE_COVERAGE:
+        return "text", info
+    return "mixed", info
+
+
+def classify_pages(pdf_path, pages=None):
+    """Yields (page_number, kind, info) for ``pages`` (default: all), see
+    classify_page."""
+    with fitz.open(pdf_path) as doc:
+        if pages is None:
+            pages = range(1, doc.page_count + 1)
+        for page_number in pages:
+            with instrument.span("classify", "split", page_number) as info:
+                kind, page_info = classify_page(doc[page_number - 1])
+                info["kind"] = kind
+            yield page_number, kind, page_info
+
+
+def record_page_kinds(manifest, pdf_path, pages=None):
+    """Classifies ``pages`` (default: all) and records them in ``manifest``.
+
+    Text pages are pointed at their page of the source PDF, so the merge
+    copies them with their vector content and no later stage touches them.
+    Returns {kind: [page numbers]}.
+    """
+    pages_by_kind = {kind: [] for kind in PAGE_KINDS}
+    for page_number, kind, page_info in classify_pages(pdf_path, pages):
+        pages_by_kind[kind].append(page_number)
+        if kind == "text":
+            manifest.set_page(page_number, pdf_path, page_number - 1, kind=kind)
         else:
-            print(f"⚠️ Skipping duplicate upload for '{image_name}'")
+            manifest.annotate(page_number, kind=kind, **page_info)
+    return pages_by_kind
+
+
+def blank_stats(gray):
+    """Returns (ink_ratio, std, paper) of a grayscale probe, ignoring its margins.
+
+    Ink is anything far from the paper's gray level in either direction, so
+    light print on a dark page counts as well as dark print on a light one.
+    """
+    height, width = gray.shape
+    dy, dx = int(height * BLANK_MARGIN), int(width * BLANK_MARGIN)
+    inner = gray[dy : height - dy, dx : width - dx]
+    paper = np.median(inner)
+    ink = cv2.absdiff(inner, np.full_like(inner, paper)) > BLANK_INK_CONTRAST
+    ink_ratio = np.count_nonzero(ink) / inner.size
+    return float(ink_ratio), float(inner.std()), float(paper)
+
+
+def is_blank(ink_ratio, std, paper=255):
+    """True when a probe's blank_stats describe an empty page.
+
+    Dark pages are never blank: they would be replaced by a white page.
+    """
+    return (
+        paper >= BLANK_MIN_PAPER and ink_ratio <= BLANK_MAX_INK and std <= BLANK_MAX_STD
+    )
+
+
+def probe_blank_pages(pdf_path, pages=None, dpi=BLANK_PROBE_DPI):
+    """Finds blank pages from cheap low-DPI renders.
+
+    Yields (page_number, info) for every blank page, where ``info`` holds the
+    page size in points and the probe's ink ratio and standard deviation.
+    """
+    with fitz.open(pdf_path) as doc:
+        if pages is None:
+            pages = range(1, doc.page_count + 1)
+        for page_number in pages:
+            page = doc[page_number - 1]
+            with instrument.span("blank_probe", "split", page_number) as info:
+                try:
+                    pix = page.get_pixmap(dpi=dpi, colorspace=fitz.csGRAY, alpha=False)
+                except Exception:
+                    # Not known to be blank; the render proper reports it
+                    continue
+                gray = np.frombuffer(pix.samples, dtype=np.uint8).reshape(
+                    pix.height, pix.stride
+                )[:, : pix.width]
+                ink_ratio, std, paper = blank_stats(gray)
+                info["blank"] = is_blank(ink_ratio, std, paper)
+            if info["blank"]:
+                yield page_number, {
+                    "width": round(page.rect.width, 2),
+                    "height": round(page.rect.height, 2),
+                    "ink": round(ink_ratio, 6),
+                    "std": round(std, 2),
+                }
+
+
+def estimate_x_height(gray, dpi):
+    """Estimates the dominant x-height of a grayscale render, in points.
+
+    Glyphs are taken as the connected components of the Otsu-binarized page;
+    the most common component height is the x-height because most lowercase
+    letters have no ascender or descender. Specks, rules and pictures are
+    left out. Returns None when the page has too few glyphs to tell.
+    """
+    _, binary = cv2.threshold(gray, 0, 255, cv2.THRESH_BINARY_INV + cv2.THRESH_OTSU)
+    _, _, stats, _ = cv2.connectedComponentsWithStats(binary, connectivity=8)
+    heights = stats[1:, cv2.CC_STAT_HEIGHT]
+    glyphs = (
+        (heights >= 3)
+        & (heights <= gray.shape[0] // 20)
+        & (stats[1:, cv2.CC_STAT_AREA] >= 6)
+        & (stats[1:, cv2.CC_STAT_WIDTH] <= heights * 20)
+    )
+    if np.count_nonzero(glyphs) < 20:
+        return None
+    return int(np.bincount(heights[glyphs]).argmax()) * 72 / dpi
+
+
+def choose_dpi(x_height_pt):
+    """Smallest DPI step giving RESOLUTION_TARGET_XHEIGHT pixels of x-height."""
+    if not x_height_pt:
+        return RESOLUTION_MAX_DPI
+    dpi = RESOLUTION_TARGET_XHEIGHT * 72 / x_height_pt
+    dpi = math.ceil(dpi / RESOLUTION_STEP) * RESOLUTION_STEP
+    return max(RESOLUTION_MIN_DPI, min(RESOLUTION_MAX_DPI, dpi))
+
+
+def plan_resolution(pdf_path, pages=None, dpi=RESOLUTION_PROBE_DPI):
+    """Picks a rendering DPI per page from a low-resolution probe render.
+
+    Yields (page_number, chosen_dpi, x_height_pt); x_height_pt is None when
+    no text was found.
+    """
+    with fitz.open(pdf_path) as doc:
+        if pages is None:
+            pages = range(1, doc.page_count + 1)
+        for page_number in pages:
+            with instrument.span("resolution_probe", "split", page_number) as info:
+                try:
+                    pix = doc[page_number - 1].get_pixmap(
+                        dpi=dpi, colorspace=fitz.csGRAY, alpha=False
+                    )
+                except Exception:
+                    # Planned like a page without text; the render proper
+                    # reports the error
+                    x_height_pt = None
+                else:
+                    gray = np.frombuffer(pix.samples, dtype=np.uint8).reshape(
+                        pix.height, pix.stride
+                    )[:, : pix.width]
+                    x_height_pt = estimate_x_height(gray, dpi)
+                info["dpi"] = choose_dpi(x_height_pt)
+            yield page_number, info["dpi"], x_height_pt
+
+
+def record_resolution(manifest, pdf_path, pages):
+    """Plans each page's DPI and records the decision in ``manifest``.
+
+    Returns {page_number: dpi} for iter_pages.
+    """
+    page_dpis = {}
+    for page_number, dpi, x_height_pt in plan_resolution(pdf_path, pages):
+        page_dpis[page_number] = dpi
+        manifest.annotate(
+            page_number,
+            dpi=dpi,
+            x_height_pt=round(x_height_pt, 2) if x_height_pt else None,
+        )
+    return page_dpis
+
+
+def plan_pages(
+    manifest,
+    pdf_path,
+    dpi="auto",
+    rasterize_all=False,
+    keep_blank=False,
+    pages=None,
+):
+    """Runs the cheap pre-passes and records their decisions in ``manifest``.
+
+    Born-digital pages are pointed at the source PDF (unless
+    ``rasterize_all``), blank pages are marked (unless ``keep_blank``), and
+    every remaining page gets a DPI: ``dpi`` itself, or the planner's choice
+    when it is "auto". Only ``pages`` (default: all, see shard_pages) are
+    looked at. Returns {page_number: dpi} for the pages the image stages
+    have to process.
+    """
+    if pages is None:
+        pages = range(1, count_pages(pdf_path) + 1)
+    image_pages = list(pages)
+    if not rasterize_all:
+        pages_by_kind = record_page_kinds(manifest, pdf_path, pages)
+        print(
+            "🔎 Page kinds: "
+            + ", ".join(f"{len(v)} {kind}" for kind, v in pages_by_kind.items())
+        )
+        image_pages = pages_by_kind["scanned"] + pages_by_kind["mixed"]
+    if not keep_blank:
+        for page_number, blank_info in probe_blank_pages(pdf_path, image_pages):
+            manifest.set_blank(page_number, **blank_info)
+        if manifest.blank_pages():
+            print(f"⬜ Skipping blank pages: {manifest.blank_pages()}")
+
+    pages = [
+        page_number
+        for page_number in pages
+        if not manifest.skips_image_stages(page_number)
+    ]
+    if dpi != "auto":
+        for page_number in pages:
+            manifest.annotate(page_number, dpi=dpi)
+        return {page_number: dpi for page_number in pages}
+
+    page_dpis = record_resolution(manifest, pdf_path, pages)
+    if page_dpis:
+        counts = {
+            d: list(page_dpis.values()).count(d) for d in sorted(page_dpis.values())
+        }
+        print(
+            "📐 Render DPI: "
+            + ", ".join(f"{n} pages at {d}" for d, n in counts.items())
+        )
+    return page_dpis
+
+
+def benchmark_backends(pdf_path, dpi=600, grayscale=False, max_pages=5):
+    """Times every backend on the first pages of a PDF and prints pages/sec."""
+    pages = range(1, min(max_pages, count_pages(pdf_path)) + 1)
+    timings = {}
+    for backend in RASTER_BACKENDS:
+        start = time.perf_counter()
+        try:
+            for _ in iter_pages(pdf_path, backend, dpi, grayscale, pages):
+                pass
+        except Exception as e:
+            print(f"⚠️ {backend} failed: {e}")
+            continue
+        elapsed = time.perf_counter() - start
+        timings[backend] = elapsed
+        print(
+            f"⏱️ {backend}: {len(pages)} pages in {elapsed:.2f}s "
+            f"({len(pages) / elapsed:.2f} pages/sec)"
+        )
+    return timings
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Rasterize PDF pages to PNG.")
+    parser.add_argument("--pdf", default=final_output_pdf, help="Source PDF.")
+    parser.add_argument(
+        "--dpi",
+        type=parse_dpi,
+        default="auto",
+        help="Rendering DPI, or auto to pick one per page from its text size.",
+    )
+    parser.add_argument(
+        "--backend",
+        choices=RASTER_BACKENDS,
+        default="pymupdf",
+        help="Rasterization backend.",
+    )
+    parser.add_argument(
+        "--grayscale", action="store_true", help="Render pages in grayscale."
+    )
+    parser.add_argument(
+        "--benchmark",
+        type=int,
+        metavar="PAGES",
+        help="Time every backend on the first PAGES pages and exit.",
+    )
+    parser.add_argument(
+        "--keep-blank",
+        action="store_true",
+        help="Render blank pages too instead of marking them in the manifest.",
+    )
+    parser.add_argument(
+        "--rasterize-all",
+        action="store_true",
+        help="Render born-digital pages too instead of copying them as they are.",
+    )
+    add_storage_argument(parser)
+    add_resume_argument(parser)
+    args = parser.parse_args()
+    apply_storage_arguments(args)
+
+    if args.benchmark:
+        dpi = DEFAULT_DPI if args.dpi == "auto" else args.dpi
+        benchmark_backends(args.pdf, dpi, args.grayscale, args.benchmark)
+        raise SystemExit(0)
+
+    os.makedirs(output_folder, exist_ok=True)
+
+    # Mark born-digital and blank pages so no later stage renders, cleans or
+    # OCRs them, and choose each remaining page's resolution
+    manifest = Manifest(
+        MANIFEST_PATH, source=args.pdf, page_count=count_pages(args.pdf)
+    )
+    page_dpis = plan_pages(
+        manifest, args.pdf, args.dpi, args.rasterize_all, args.keep_blank
+    )
+    manifest.save()
+    for page_number in manifest.pages:
+        stale_image = os.path.join(
+            output_folder, f"final_output_page_{page_number}.png"
+        )
+        if manifest.skips_image_stages(page_number) and os.path.exists(stale_image):
+            os.remove(stale_image)
+
+    # Restore unchanged pages from the page cache, render only the rest
+    page_cache = PageCache()
+    journal = Journal(resume=args.resume)
+    raster_params = {"backend": args.backend, "grayscale": args.grayscale}
+    cache_keys = {}
+    pages_to_render = []
+    with DriveUploader(stage="split") as uploader:
+        for page_number, page_hash in enumerate(pdf_page_hashes(args.pdf), start=1):
+            if page_number not in page_dpis:
+                continue
+            cache_keys[page_number] = page_cache.key(
+                "split", page_hash, {**raster_params, "dpi": page_dpis[page_number]}
+            )
+            image_path = os.path.join(
+                output_folder, f"final_output_page_{page_number}.png"
+            )
+            if journal.done("split", page_number, cache_keys[page_number]):
+                uploader.submit(image_path, folder_name=drive_folder_name)
+            elif page_cache.get(cache_keys[page_number], image_path):
+                print(f"🗃️ Page {page_number} restored from cache")
+                journal.record(
+                    "split", page_number, image_path, cache_keys[page_number]
+                )
+                uploader.submit(image_path, folder_name=drive_folder_name)
+            else:
+                pages_to_render.append(page_number)
+
+        def render_failed(page_number, e):
+            print(f"⚠️ ERROR: Could not process Page {page_number}. Reason: {e}")
+
+        # Process and upload each page one at a time
+        for page_number, image in iter_pages(
+            args.pdf,
+            args.backend,
+            page_dpis,
+            args.grayscale,
+            pages_to_render,
+            on_error=render_failed,
+        ):
+            try:
+                image_name = f"final_output_page_{page_number}.png"
+                image_path = os.path.join(output_folder, image_name)
+
+                # Save the image
+                with instrument.span("save", "split", page_number) as info:
+                    with atomic_output(image_path) as tmp_path:
+                        cv2.imwrite(tmp_path, image)
+                    info["bytes_written"] = os.path.getsize(image_path)
+                page_cache.put(cache_keys[page_number], image_path)
+                journal.record(
+                    "split", page_number, image_path, cache_keys[page_number]
+                )
+                print(f"✅ Page {page_number} saved as {image_name}")
 
-        # Free memory immediately
-        del image
-        gc.collect()
+                # Queue the upload (if the upload policy includes this stage)
+                uploader.submit(image_path, folder_name=drive_folder_name)
 
-        # Prevent GitHub Actions timeout issues
-        time.sleep(10)
+                # Free memory immediately
+                del image
+                gc.collect()
 
-    except Exception as e:
-        print(f"⚠️ ERROR: Could not process Page {page_number}. Reason: {e}")
+            except Exception as e:
+                print(f"⚠️ ERROR: Could not process Page {page_number}. Reason: {e}")
 
-print("🎉 PDF converted and uploaded systematically to Drive!")
+    page_cache.report()
+    journal.report("split")
+    print("🎉 PDF converted and uploaded systematically to Drive!")
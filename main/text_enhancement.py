@@ -1,11 +1,26 @@
-import gc
+import argparse
+import json
 import logging
+import math
 import os
 import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
 
 import cv2
+import instrument
 import numpy as np
-from drive_utils import get_or_create_folder, upload_to_drive
+from drive_utils import (
+    DriveUploader,
+    add_storage_argument,
+    apply_storage_arguments,
+    get_or_create_folder,
+    upload_to_drive,
+    uploads_stage,
+)
+from journal import Journal, add_resume_argument, atomic_output
+from manifest import MANIFEST_PATH, Manifest
+from page_cache import PageCache, hash_file
 
 # Configure logging
 logging.basicConfig(
@@ -15,78 +30,633 @@ logging.basicConfig(
 # Path setup
 pdf_folder = "main/pdfs"
 input_folder = os.path.join(pdf_folder, "Watermark_removed_images_600dpi")
+# Pages before watermark removal, where "auto" measures their noise
+source_folder = os.path.join(pdf_folder, "converted_images_600dpi")
 output_folder = os.path.join(pdf_folder, "text_enhanced_images_600dpi")
 
-# Ensure output folder exists
-os.makedirs(output_folder, exist_ok=True)
+# Google Drive folder for enhanced images
+drive_folder_name = "Text_Enhanced_Images_600dpi"
 
-# Create a folder in Google Drive for enhanced images
-enhanced_images_folder_id = get_or_create_folder(
-    "Text_Enhanced_Images_600dpi", parent_folder_id=os.getenv("GDRIVE_FOLDER_ID")
-)
+# Enhancement parameters (also part of the page cache key)
+ENHANCE_PARAMS = {
+    "gamma": 0.6,
+    "nlm_h": 10,
+    "nlm_template_window": 11,
+    "nlm_search_window": 25,
+    "clahe_clip_limit": 4.0,
+    "clahe_tile_grid": 16,
+    "sharpen_sigma": 3.0,
+    "sharpen_weights": (2.2, -1.2),
+    "threshold_block_size": 43,
+    "threshold_c": 8,
+    "morph_kernel": 3,
+    "close_iterations": 3,
+    "dilate_iterations": 1,
+    "median_ksize": 5,
+}
 
+# Resolution ENHANCE_PARAMS are tuned for; pages rendered at another DPI get
+# proportionally scaled kernels (see scale_params)
+ENHANCE_BASE_DPI = 600
 
-def enhance_image(image_file, retries=3, delay=2):
-    """Enhances text in the image, retries on failure, and uploads if successful."""
-    input_image_path = os.path.join(input_folder, image_file)
-    output_path = os.path.join(output_folder, image_file)
+# Enhancement profiles. "quality" is the full chain; "fast" runs NLM at half
+# resolution with smaller windows, about 10x cheaper. On 300 dpi synthetic
+# scans it agrees with "quality" on 98.7-99.0% of pixels (86-89% ink IoU) up
+# to a scan noise of sigma 12, but only on 92% (56% ink IoU) at sigma 20
+# (measured with benchmark.py --profiles --noise). "auto" picks per page (see
+# select_profile).
+ENHANCE_PROFILES = {
+    "quality": ENHANCE_PARAMS,
+    "fast": {
+        **ENHANCE_PARAMS,
+        "nlm_scale": 0.5,
+        "nlm_template_window": 7,
+        "nlm_search_window": 11,
+    },
+}
+PROFILE_CHOICES = (*ENHANCE_PROFILES, "auto")
+ENHANCE_PROFILE = os.getenv("ENHANCE_PROFILE", "quality")
 
-    for attempt in range(1, retries + 1):
-        img = cv2.imread(input_image_path, cv2.IMREAD_GRAYSCALE)
-        if img is None:
-            logging.warning(f"❌ Failed to load image: {input_image_path}")
-            return False  # Skip this image
+# "auto" uses the fast profile on pages whose estimated noise (standard
+# deviation in gray levels of the page before watermark removal, see
+# estimate_noise) is below this. The estimate is about 6 at scan noise sigma
+# 12 and 11 at sigma 20, where "fast" stops keeping up.
+NOISE_THRESHOLD = float(os.getenv("ENHANCE_NOISE_THRESHOLD", "8.0"))
 
-        logging.info(f"🖼️ Processing Image ({attempt}/{retries}): {image_file}")
+# Enhanced pages are strictly black and white. "bilevel" stores them as
+# packed 1-bit PNGs, which OCRmyPDF keeps 1-bit (JBIG2 when jbig2enc is
+# installed); "gray" writes 8-bit PNGs as older runs did.
+OUTPUT_FORMATS = ("bilevel", "gray")
+ENHANCE_OUTPUT = os.getenv("ENHANCE_OUTPUT", "bilevel")
+
+# Peak working memory for enhancement. Pages whose full-frame chain would
+# need more are processed in horizontal bands (see enhance_array_tiled).
+ENHANCE_MEMORY_BUDGET = int(os.getenv("ENHANCE_MEMORY_BUDGET", str(1024**3)))
+
+# Peak bytes per pixel of the full-frame chain: the source and output, about
+# seven uint8 intermediates, and NLM's padded copy (measured ~10 on A4 pages).
+BYTES_PER_PIXEL = 10
+
+# Page-sized buffers the banded chain keeps for its whole run: the source,
+# the denoised page and the output. Bands get what the budget leaves.
+TILED_FRAME_BYTES_PER_PIXEL = 3
+
+# This process's page cache, created on first use (see get_page_cache) rather
+# than whenever pipeline.py or benchmark.py import this module
+_page_cache = None
+
+
+def get_page_cache():
+    """Returns the enhance stage's PageCache, created on first use."""
+    global _page_cache
+    if _page_cache is None:
+        _page_cache = PageCache()
+    return _page_cache
+
+
+def gamma_table(gamma):
+    """Returns the uint8 lookup table for gamma correction."""
+    return (((np.arange(0, 256) / 255.0) ** (1.0 / gamma)) * 255).astype("uint8")
+
+
+def denoise(img, params, dst=None):
+    """Non-local means denoising, optionally on a downscaled copy.
+
+    With ``nlm_scale`` below 1 the page is shrunk (INTER_AREA, which also
+    averages out some noise), denoised, and scaled back up, at roughly
+    ``nlm_scale``² of the full-resolution cost.
+    """
+    p = params
+    nlm = {
+        "h": p["nlm_h"],
+        "templateWindowSize": p["nlm_template_window"],
+        "searchWindowSize": p["nlm_search_window"],
+    }
+    scale = p.get("nlm_scale", 1.0)
+    if scale == 1.0:
+        return cv2.fastNlMeansDenoising(img, dst=dst, **nlm)
+
+    # Pad to whole pixel blocks so both resizes use exactly ``step`` and
+    # every output pixel depends only on nearby rows (which keeps banded
+    # denoising in enhance_array_tiled consistent with the full frame)
+    step = round(1 / scale)
+    height, width = img.shape
+    padded = cv2.copyMakeBorder(
+        img, 0, -height % step, 0, -width % step, cv2.BORDER_REFLECT_101
+    )
+    small = cv2.resize(
+        padded,
+        (padded.shape[1] // step, padded.shape[0] // step),
+        interpolation=cv2.INTER_AREA,
+    )
+    small = cv2.fastNlMeansDenoising(small, **nlm)
+    large = cv2.resize(
+        small, (padded.shape[1], padded.shape[0]), interpolation=cv2.INTER_LINEAR
+    )
+    if dst is None:
+        return large[:height, :width].copy()
+    dst[...] = large[:height, :width]
+    return dst
+
+
+def estimate_noise(img):
+    """Estimates a page's noise as a standard deviation in gray levels.
+
+    The kernel below cancels flat areas and linear gradients, so on a
+    document its response is mostly noise; taking the median over every
+    other pixel ignores the comparatively few pixels on text edges. Takes a
+    few milliseconds even on 600 dpi pages.
+
+    Measure pages before remove_watermark: whitening the light background
+    also erases its noise, and a page with scanner noise of 20 gray levels
+    reads as 0 afterwards.
+    """
+    kernel = np.array([[1, -2, 1], [-2, 4, -2], [1, -2, 1]], dtype=np.float32)
+    response = cv2.filter2D(img, cv2.CV_16S, kernel)[::2, ::2]
+    # The kernel scales Gaussian noise by 6; 0.6745 turns a MAD into a sigma
+    return float(np.median(np.abs(response))) / (0.6745 * 6)
+
+
+def _odd(value, minimum):
+    """Rounds ``value`` to an odd kernel size of at least ``minimum``."""
+    return max(minimum, int(round(value)) // 2 * 2 + 1)
+
+
+def scale_params(params, dpi):
+    """Scales the spatial parameters of ``params`` from ENHANCE_BASE_DPI to ``dpi``.
+
+    Window and kernel sizes, the blur sigma and the closing and dilation
+    iterations follow the resolution (iterations never drop below one, so at
+    the default single dilation only pages above 600 dpi get more);
+    intensity parameters and the CLAHE grid (a tile count) stay the same.
+    """
+    if not dpi or dpi == ENHANCE_BASE_DPI:
+        return params
+    p = params
+    factor = dpi / ENHANCE_BASE_DPI
+    return {
+        **p,
+        "nlm_template_window": _odd(p["nlm_template_window"] * factor, 3),
+        "nlm_search_window": _odd(p["nlm_search_window"] * factor, 5),
+        "sharpen_sigma": round(p["sharpen_sigma"] * factor, 2),
+        "threshold_block_size": _odd(p["threshold_block_size"] * factor, 3),
+        "close_iterations": max(1, round(p["close_iterations"] * factor)),
+        "dilate_iterations": max(1, round(p["dilate_iterations"] * factor)),
+        "median_ksize": _odd(p["median_ksize"] * factor, 3),
+    }
+
+
+def select_profile(img, profile=None, dpi=None, noise=None):
+    """Resolves ``profile`` for one page. Returns (profile_name, params).
+
+    "auto" picks "fast" for clean pages and "quality" for pages whose
+    estimated noise reaches NOISE_THRESHOLD. ``noise`` is the page's
+    estimate_noise from before watermark removal; without it the noise is
+    estimated on ``img``. The parameters are scaled to the page's ``dpi``
+    when it is known.
+    """
+    profile = profile or ENHANCE_PROFILE
+    if profile == "auto":
+        if noise is None:
+            noise = estimate_noise(img)
+        profile = "fast" if noise < NOISE_THRESHOLD else "quality"
+    return profile, scale_params(ENHANCE_PROFILES[profile], dpi)
+
+
+def profile_cache_params(profile=None, dpi=None):
+    """Everything that decides a page's output under ``profile``, for cache keys."""
+    profile = profile or ENHANCE_PROFILE
+    if profile == "auto":
+        params = {"auto": NOISE_THRESHOLD, **ENHANCE_PROFILES}
+    else:
+        params = ENHANCE_PROFILES[profile]
+    if dpi and dpi != ENHANCE_BASE_DPI:
+        params = {**params, "dpi": dpi}
+    return params
+
+
+class Enhancer:
+    """The enhancement chain with its parameters compiled once.
+
+    The gamma LUT, the CLAHE object and the structuring element are built in
+    the constructor. Intermediate images live in buffers that OpenCV writes
+    into through ``dst=``, so a stream of same-sized pages causes no large
+    allocations in this code (NLM still allocates its own scratch space).
+    Create one per worker process or thread; an Enhancer is not thread-safe.
+
+    The saving is a fixed cost per page, so it matters most where NLM is
+    cheap: on the benchmark pages (benchmark.py --buffers, 300 dpi) a page
+    takes 3% less time than enhance_array with "quality" and 12% less with
+    "fast", with identical output.
+    """
+
+    def __init__(self, params=ENHANCE_PARAMS):
+        p = self.params = params
+        self.table = gamma_table(p["gamma"])
+        grid = p["clahe_tile_grid"]
+        self.clahe = cv2.createCLAHE(
+            clipLimit=p["clahe_clip_limit"], tileGridSize=(grid, grid)
+        )
+        ksize = p["morph_kernel"]
+        self.kernel = cv2.getStructuringElement(cv2.MORPH_ELLIPSE, (ksize, ksize))
+        self._shape = None
+        self._buffers = ()
+
+    def _reserve(self, shape):
+        """(Re)allocates the three work buffers when the page size changes."""
+        if shape != self._shape:
+            self._buffers = tuple(np.empty(shape, dtype=np.uint8) for _ in range(3))
+            self._shape = shape
+        return self._buffers
+
+    def enhance(self, img, out=None):
+        """Enhances a grayscale page into ``out`` and returns it.
+
+        Without ``out`` the result is written to an internal buffer that the
+        next call overwrites, so copy it if it has to outlive that call.
+        Produces the same pixels as enhance_array.
+        """
+        p = self.params
+        a, b, c = self._reserve(img.shape)
+        if out is None:
+            out = c
+
+        cv2.LUT(img, self.table, dst=a)
+        denoise(a, p, dst=b)
+        self.clahe.apply(b, dst=c)
+
+        # Sharpening (b and a are free again)
+        cv2.GaussianBlur(c, (0, 0), p["sharpen_sigma"], dst=a)
+        alpha, beta = p["sharpen_weights"]
+        cv2.addWeighted(c, alpha, a, beta, 0, dst=b)
+
+        cv2.adaptiveThreshold(
+            b,
+            255,
+            cv2.ADAPTIVE_THRESH_MEAN_C,
+            cv2.THRESH_BINARY_INV,
+            blockSize=p["threshold_block_size"],
+            C=p["threshold_c"],
+            dst=a,
+        )
+        cv2.morphologyEx(
+            a, cv2.MORPH_CLOSE, self.kernel, dst=b, iterations=p["close_iterations"]
+        )
+        cv2.dilate(b, self.kernel, dst=a, iterations=p["dilate_iterations"])
+        cv2.medianBlur(a, p["median_ksize"], dst=b)
+        return cv2.bitwise_not(b, dst=out)
+
+
+_enhancers = {}
+
+
+def get_enhancer(params=ENHANCE_PARAMS):
+    """Returns this process's Enhancer for ``params``, creating it once."""
+    key = json.dumps(params, sort_keys=True)
+    if key not in _enhancers:
+        _enhancers[key] = Enhancer(params)
+    return _enhancers[key]
+
+
+def enhance_array(img, params=ENHANCE_PARAMS):
+    """Runs the text enhancement chain on a grayscale page and returns the result."""
+    p = params
+
+    # Gamma correction
+    gamma = p["gamma"]
+    inv_gamma = 1.0 / gamma
+    table = np.array(
+        [((i / 255.0) ** inv_gamma) * 255 for i in np.arange(0, 256)]
+    ).astype("uint8")
+    gamma_corrected = cv2.LUT(img, table)
+
+    # Advanced denoising
+    denoised = denoise(gamma_corrected, p)
+
+    # CLAHE
+    grid = p["clahe_tile_grid"]
+    clahe = cv2.createCLAHE(clipLimit=p["clahe_clip_limit"], tileGridSize=(grid, grid))
+    clahe_img = clahe.apply(denoised)
+
+    # Sharpening
+    gaussian_blur = cv2.GaussianBlur(clahe_img, (0, 0), p["sharpen_sigma"])
+    alpha, beta = p["sharpen_weights"]
+    sharpened = cv2.addWeighted(clahe_img, alpha, gaussian_blur, beta, 0)
+
+    # Adaptive thresholding
+    binary = cv2.adaptiveThreshold(
+        sharpened,
+        255,
+        cv2.ADAPTIVE_THRESH_MEAN_C,
+        cv2.THRESH_BINARY_INV,
+        blockSize=p["threshold_block_size"],
+        C=p["threshold_c"],
+    )
+
+    # Morphological operations
+    ksize = p["morph_kernel"]
+    kernel = cv2.getStructuringElement(cv2.MORPH_ELLIPSE, (ksize, ksize))
+    thickened = cv2.morphologyEx(
+        binary, cv2.MORPH_CLOSE, kernel, iterations=p["close_iterations"]
+    )
+    thickened = cv2.dilate(thickened, kernel, iterations=p["dilate_iterations"])
+
+    # Final noise removal and inversion
+    final_img = cv2.medianBlur(thickened, p["median_ksize"])
+    return cv2.bitwise_not(final_img)
+
+
+def _kernel_radii(params):
+    """Returns (nlm_radius, post_radius): the context each part of the chain reads.
+
+    ``nlm_radius`` covers the NLM template and search windows, in full
+    resolution rows when NLM runs downscaled, plus the resampling kernels.
+    ``post_radius``
+    covers everything after CLAHE: the Gaussian (OpenCV picks a 3-sigma
+    kernel for uint8), the adaptive block, the closing and dilation, and the
+    median filter.
+    """
+    p = params
+    nlm_radius = p["nlm_template_window"] // 2 + p["nlm_search_window"] // 2
+    scale = p.get("nlm_scale", 1.0)
+    if scale != 1.0:
+        nlm_radius = math.ceil((nlm_radius + 1) / scale) + 1
+    gaussian_radius = (int(round(p["sharpen_sigma"] * 3 * 2 + 1)) | 1) // 2
+    morph_radius = p["morph_kernel"] // 2
+    post_radius = (
+        gaussian_radius
+        + p["threshold_block_size"] // 2
+        + morph_radius * (2 * p["close_iterations"] + p["dilate_iterations"])
+        + p["median_ksize"] // 2
+    )
+    return nlm_radius, post_radius
+
+
+def _clahe_padding(height, width, grid):
+    """Rows/columns OpenCV's CLAHE appends (BORDER_REFLECT_101) before tiling.
+
+    OpenCV pads both axes as soon as either one is not a multiple of the
+    grid, so a divisible axis then gains a whole extra tile.
+    """
+    if height % grid == 0 and width % grid == 0:
+        return 0, 0
+    return grid - height % grid, grid - width % grid
 
-        try:
-            # Gamma correction
-            gamma = 0.6
-            inv_gamma = 1.0 / gamma
-            table = np.array(
-                [((i / 255.0) ** inv_gamma) * 255 for i in np.arange(0, 256)]
-            ).astype("uint8")
-            gamma_corrected = cv2.LUT(img, table)
-
-            # Advanced denoising
-            denoised = cv2.fastNlMeansDenoising(
-                gamma_corrected, h=10, templateWindowSize=11, searchWindowSize=25
-            )
 
-            # CLAHE
-            clahe = cv2.createCLAHE(clipLimit=4.0, tileGridSize=(16, 16))
-            clahe_img = clahe.apply(denoised)
-
-            # Sharpening
-            gaussian_blur = cv2.GaussianBlur(clahe_img, (0, 0), 3.0)
-            sharpened = cv2.addWeighted(clahe_img, 2.2, gaussian_blur, -1.2, 0)
-
-            # Adaptive thresholding
-            binary = cv2.adaptiveThreshold(
-                sharpened,
-                255,
-                cv2.ADAPTIVE_THRESH_MEAN_C,
-                cv2.THRESH_BINARY_INV,
-                blockSize=43,
-                C=8,
+def _post_clahe(clahe_img, params):
+    """Sharpening, thresholding, morphology and inversion (as in enhance_array)."""
+    p = params
+    gaussian_blur = cv2.GaussianBlur(clahe_img, (0, 0), p["sharpen_sigma"])
+    alpha, beta = p["sharpen_weights"]
+    sharpened = cv2.addWeighted(clahe_img, alpha, gaussian_blur, beta, 0)
+    del gaussian_blur
+    binary = cv2.adaptiveThreshold(
+        sharpened,
+        255,
+        cv2.ADAPTIVE_THRESH_MEAN_C,
+        cv2.THRESH_BINARY_INV,
+        blockSize=p["threshold_block_size"],
+        C=p["threshold_c"],
+    )
+    del sharpened
+    ksize = p["morph_kernel"]
+    kernel = cv2.getStructuringElement(cv2.MORPH_ELLIPSE, (ksize, ksize))
+    thickened = cv2.morphologyEx(
+        binary, cv2.MORPH_CLOSE, kernel, iterations=p["close_iterations"]
+    )
+    del binary
+    thickened = cv2.dilate(thickened, kernel, iterations=p["dilate_iterations"])
+    final_img = cv2.medianBlur(thickened, p["median_ksize"])
+    return cv2.bitwise_not(final_img)
+
+
+def enhance_array_tiled(img, params=ENHANCE_PARAMS, memory_budget=None):
+    """Runs enhance_array in full-width horizontal bands to bound peak memory.
+
+    Pass 1 denoises the page in bands. Each band reads an extra NLM radius
+    of rows and writes only its own rows, into a single page-sized buffer.
+    Pass 2 runs CLAHE and the rest of the chain per band. Each band is
+    widened by the post-CLAHE radius, then snapped outwards to the full
+    page's CLAHE tile rows, plus one more tile row because CLAHE
+    interpolates between neighbouring tiles. The page's own CLAHE padding
+    is reproduced, so every band sees the same tile histograms as the full
+    frame.
+
+    The output is seam-free and matches enhance_array up to CLAHE's float
+    rounding. OpenCV interpolates between tiles from a row's position in the
+    image it is given, so a band can round a few pixels one level apart,
+    which thresholding turns into isolated flipped pixels: at least 99.9% of
+    pixels are identical (99.96% on a page with a strong background
+    gradient), with at most a couple of dozen different pixels in any row.
+
+    Peak memory is the three page-sized buffers (the source, the denoised
+    page and the output, TILED_FRAME_BYTES_PER_PIXEL) plus the band
+    intermediates, which get whatever is left of ``memory_budget``
+    (ENHANCE_MEMORY_BUDGET by default). Bands never shrink below one CLAHE
+    tile row, so a page whose three buffers alone nearly fill the budget
+    needs up to ``3 * pixels + tile_rows * width * BYTES_PER_PIXEL`` bytes.
+    """
+    p = params
+    memory_budget = memory_budget or ENHANCE_MEMORY_BUDGET
+    height, width = img.shape
+    grid = p["clahe_tile_grid"]
+    pad_rows, pad_cols = _clahe_padding(height, width, grid)
+    padded_height = height + pad_rows
+    tile_height = padded_height // grid
+    nlm_radius, post_radius = _kernel_radii(p)
+    step = round(1 / p.get("nlm_scale", 1.0))
+    row_bytes = (width + pad_cols) * BYTES_PER_PIXEL
+    frame_bytes = img.size * TILED_FRAME_BYTES_PER_PIXEL
+    band_rows = max(tile_height, (memory_budget - frame_bytes) // row_bytes)
+    if frame_bytes + band_rows * row_bytes > memory_budget:
+        logging.warning(
+            f"{width}x{height} page needs about "
+            f"{(frame_bytes + band_rows * row_bytes) / 1024**2:.0f} MiB in bands, "
+            f"over the {memory_budget / 1024**2:.0f} MiB enhancement budget"
+        )
+
+    # Pass 1: gamma correction and denoising
+    table = gamma_table(p["gamma"])
+    denoised = np.empty_like(img)
+    for start in range(0, height, band_rows):
+        end = min(start + band_rows, height)
+        # Downscaled denoising needs bands aligned to the scale's pixel blocks
+        source_start = max(0, start - nlm_radius) // step * step
+        source_end = min(height, end + nlm_radius)
+        gamma_corrected = cv2.LUT(img[source_start:source_end], table)
+        denoised[start:end] = denoise(gamma_corrected, p)[
+            start - source_start : end - source_start
+        ]
+        del gamma_corrected
+
+    # Pass 2: CLAHE and the post-CLAHE filters, with overlapping context
+    output = np.empty_like(img)
+    core_rows = max(tile_height, band_rows - 2 * (post_radius + 2 * tile_height))
+    for core_start in range(0, height, core_rows):
+        core_end = min(core_start + core_rows, height)
+
+        # Rows of CLAHE output the post-CLAHE filters read
+        post_start = max(0, core_start - post_radius)
+        post_end = min(height, core_end + post_radius)
+
+        # Whole CLAHE tile rows (in padded coordinates) plus one on each side
+        tile_start = max(0, (post_start // tile_height - 1) * tile_height)
+        tile_end = min(padded_height, (-(-post_end // tile_height) + 1) * tile_height)
+
+        # Reproduce the full page's CLAHE padding so the tiles line up
+        if tile_end > height:
+            # Reflected bottom rows come from up to ``pad_rows`` rows above
+            source_start = min(tile_start, height - 1 - pad_rows)
+            extended = cv2.copyMakeBorder(
+                denoised[source_start:],
+                0,
+                tile_end - height,
+                0,
+                pad_cols,
+                cv2.BORDER_REFLECT_101,
+            )[tile_start - source_start :]
+        else:
+            extended = cv2.copyMakeBorder(
+                denoised[tile_start:tile_end],
+                0,
+                0,
+                0,
+                pad_cols,
+                cv2.BORDER_REFLECT_101,
             )
+        clahe = cv2.createCLAHE(
+            clipLimit=p["clahe_clip_limit"],
+            tileGridSize=(grid, (tile_end - tile_start) // tile_height),
+        )
+        clahe_img = clahe.apply(extended)[
+            post_start - tile_start : post_end - tile_start, :width
+        ]
+        del extended
+
+        band = _post_clahe(np.ascontiguousarray(clahe_img), p)
+        output[core_start:core_end] = band[
+            core_start - post_start : core_end - post_start
+        ]
+        del clahe_img, band
+    return output
+
+
+def needs_tiling(img, memory_budget=None):
+    """True when the full-frame chain would exceed the memory budget.
+
+    The banded chain then keeps its peak within the budget as long as the
+    page's TILED_FRAME_BYTES_PER_PIXEL buffers leave room for one band.
+    """
+    return img.size * BYTES_PER_PIXEL > (memory_budget or ENHANCE_MEMORY_BUDGET)
+
+
+def enhance_page(img, params=ENHANCE_PARAMS, memory_budget=None):
+    """Enhances a page full-frame, or in bands if it would exceed the budget.
+
+    Full-frame results come from this process's Enhancer and are only valid
+    until its next call.
+    """
+    if needs_tiling(img, memory_budget):
+        return enhance_array_tiled(img, params, memory_budget)
+    return get_enhancer(params).enhance(img)
+
+
+def save_enhanced(path, img, output_format=None, compression=8):
+    """Writes an enhanced page as PNG in ENHANCE_OUTPUT format. Returns its size."""
+    params = [cv2.IMWRITE_PNG_COMPRESSION, compression]
+    if (output_format or ENHANCE_OUTPUT) == "bilevel":
+        params += [cv2.IMWRITE_PNG_BILEVEL, 1]
+    cv2.imwrite(path, img, params)
+    return os.path.getsize(path)
+
+
+def source_noise(image_file):
+    """estimate_noise of ``image_file`` before watermark removal (from
+    split_pdf.py's output), or None if that page is not there."""
+    img = cv2.imread(os.path.join(source_folder, image_file), cv2.IMREAD_GRAYSCALE)
+    if img is None:
+        logging.warning(
+            f"⚠️ {image_file} is not in {source_folder}; measuring its noise "
+            "after watermark removal, which underestimates it"
+        )
+        return None
+    return estimate_noise(img)
+
+
+def enhance_cache_key(image_file, profile=None, dpi=None):
+    """Page cache and journal key for enhancing ``image_file`` (None if missing)."""
+    input_image_path = os.path.join(input_folder, image_file)
+    if not os.path.exists(input_image_path):
+        return None
+    return get_page_cache().key(
+        "enhance",
+        hash_file(input_image_path),
+        {**profile_cache_params(profile, dpi), "output": ENHANCE_OUTPUT},
+    )
+
+
+def enhance_image(
+    image_file,
+    retries=3,
+    delay=2,
+    upload=True,
+    profile=None,
+    dpi=None,
+    memory_budget=None,
+):
+    """Enhances text in the image, retries on failure, and uploads if successful.
+
+    ``profile`` is one of PROFILE_CHOICES (ENHANCE_PROFILE by default) and
+    ``dpi`` the page's rendering resolution (ENHANCE_BASE_DPI if unknown).
+    """
+    input_image_path = os.path.join(input_folder, image_file)
+    output_path = os.path.join(output_folder, image_file)
 
-            # Morphological operations
-            kernel = cv2.getStructuringElement(cv2.MORPH_ELLIPSE, (3, 3))
-            thickened = cv2.morphologyEx(binary, cv2.MORPH_CLOSE, kernel, iterations=3)
-            thickened = cv2.dilate(thickened, kernel, iterations=1)
+    # Skip the work entirely if this exact page was enhanced before
+    cache_key = enhance_cache_key(image_file, profile, dpi)
+    if cache_key:
+        if get_page_cache().get(cache_key, output_path):
+            logging.info(f"🗃️ Cache hit, reusing enhanced image: {image_file}")
+            if upload and uploads_stage("enhance"):
+                upload_to_drive(output_path, folder_name=drive_folder_name)
+            return True
 
-            # Final noise removal and inversion
-            final_img = cv2.medianBlur(thickened, 5)
-            final_img = cv2.bitwise_not(final_img)
+    img = cv2.imread(input_image_path, cv2.IMREAD_GRAYSCALE)
+    if img is None:
+        logging.warning(f"❌ Failed to load image: {input_image_path}")
+        return False  # Skip this image
 
-            # Save processed image
-            cv2.imwrite(output_path, final_img, [cv2.IMWRITE_PNG_COMPRESSION, 8])
+    noise = source_noise(image_file) if (profile or ENHANCE_PROFILE) == "auto" else None
+    profile, params = select_profile(img, profile, dpi, noise)
+    for attempt in range(1, retries + 1):
+        logging.info(
+            f"🖼️ Processing Image ({attempt}/{retries}, {profile}): {image_file}"
+        )
 
-            logging.info(f"✅ Saved Enhanced Image: {image_file}")
+        try:
+            with instrument.span(
+                "enhance",
+                "enhance",
+                instrument.page_number(image_file),
+                attempt=attempt,
+                profile=profile,
+            ) as info:
+                info["tiled"] = needs_tiling(img, memory_budget)
+                final_img = enhance_page(img, params, memory_budget)
+
+                # Save processed image (renamed into place once complete)
+                with atomic_output(output_path) as tmp_path:
+                    info["bytes_written"] = save_enhanced(tmp_path, final_img)
+            get_page_cache().put(cache_key, output_path)
+
+            logging.info(
+                f"✅ Saved Enhanced Image: {image_file} "
+                f"({info['bytes_written'] / 1024:.0f} KB, {ENHANCE_OUTPUT})"
+            )
 
             # Upload to Google Drive
-            upload_to_drive(output_path, folder_name="Text_Enhanced_Images_600dpi")
+            if upload and uploads_stage("enhance"):
+                upload_to_drive(output_path, folder_name=drive_folder_name)
 
             return True  # Success
 
@@ -96,46 +666,211 @@ def enhance_image(image_file, retries=3, delay=2):
             )
             time.sleep(delay)  # Wait before retrying
 
-        finally:
-            # Memory cleanup
-            del (
-                img,
-                gamma_corrected,
-                denoised,
-                clahe_img,
-                sharpened,
-                binary,
-                thickened,
-                final_img,
-            )
-            gc.collect()
-
     logging.error(f"❌ Skipping {image_file} after {retries} failed attempts.")
     return False  # Skip this image after multiple failures
 
 
+def _init_worker(cv_threads):
+    """Limits OpenCV's internal thread pool inside each worker process."""
+    cv2.setNumThreads(cv_threads)
+
+
+def _enhance_in_worker(image_file, profile=None, dpi=None, memory_budget=None):
+    """Worker entry point: enhances and saves one page, leaving uploads to the parent.
+
+    Also returns this page's cache counters so the parent can report them.
+    """
+    counters = get_page_cache().counters
+    before = counters.copy()
+    success = enhance_image(
+        image_file, upload=False, profile=profile, dpi=dpi, memory_budget=memory_budget
+    )
+    return image_file, success, counters - before
+
+
+def enhance_images_parallel(
+    image_files,
+    workers,
+    max_in_flight=None,
+    uploader=None,
+    profile=None,
+    dpis=None,
+    on_success=None,
+    memory_budget=None,
+):
+    """Enhances pages over a process pool and queues uploads in input order.
+
+    At most ``max_in_flight`` pages are submitted at once so memory stays
+    bounded, and results are consumed in submission order so the output
+    sequence is deterministic. Finished pages are handed to ``uploader`` (a
+    DriveUploader) so Drive latency never holds back the compute workers.
+    ``dpis`` maps file names to the resolution their page was rendered at,
+    and ``on_success`` (if given) is called with each finished file name.
+    ``memory_budget`` is passed to every worker (see enhance_page).
+    """
+    max_in_flight = max_in_flight or workers * 2
+    cv_threads = max(1, (os.cpu_count() or 1) // workers)
+    logging.info(
+        f"⚙️ Using {workers} workers ({cv_threads} OpenCV threads each), "
+        f"up to {max_in_flight} pages in flight"
+    )
+
+    results = []
+    pending = deque()
+    files = iter(image_files)
+    with ProcessPoolExecutor(
+        max_workers=workers, initializer=_init_worker, initargs=(cv_threads,)
+    ) as pool:
+        while True:
+            while len(pending) < max_in_flight:
+                image_file = next(files, None)
+                if image_file is None:
+                    break
+                pending.append(
+                    pool.submit(
+                        _enhance_in_worker,
+                        image_file,
+                        profile,
+                        (dpis or {}).get(image_file),
+                        memory_budget,
+                    )
+                )
+
+            if not pending:
+                break
+
+            image_file, success, cache_counters = pending.popleft().result()
+            get_page_cache().counters.update(cache_counters)
+            results.append((image_file, success))
+            if success and on_success:
+                on_success(image_file)
+            if success and uploader:
+                output_path = os.path.join(output_folder, image_file)
+                uploader.submit(output_path, folder_name=drive_folder_name)
+
+    return results
+
+
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Enhance text in page images.")
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=1,
+        help="Number of worker processes (1 = process pages one by one).",
+    )
+    parser.add_argument(
+        "--max-in-flight",
+        type=int,
+        default=None,
+        help="Maximum pages queued to the pool at once (default: 2 x workers).",
+    )
+    parser.add_argument(
+        "--memory-budget",
+        type=int,
+        metavar="MB",
+        help="Enhance pages needing more than this in bands "
+        f"(default: {ENHANCE_MEMORY_BUDGET // 1024**2} MB).",
+    )
+    parser.add_argument(
+        "--profile",
+        choices=PROFILE_CHOICES,
+        default=ENHANCE_PROFILE,
+        help="quality: full NLM denoising; fast: downscaled NLM; "
+        "auto: fast on clean pages, quality on noisy ones.",
+    )
+    add_storage_argument(parser)
+    add_resume_argument(parser)
+    args = parser.parse_args()
+    apply_storage_arguments(args)
+    memory_budget = args.memory_budget * 1024**2 if args.memory_budget else None
+    os.makedirs(output_folder, exist_ok=True)
+
+    # Pages split_pdf.py marked blank or born-digital are not enhanced
+    manifest = Manifest.load(MANIFEST_PATH)
     image_files = sorted(
         [
             f
             for f in os.listdir(input_folder)
             if f.lower().endswith((".png", ".jpg", ".jpeg"))
+            and not manifest.skips_image_stages(instrument.page_number(f))
         ]
     )
+    dpis = {f: manifest.page_dpi(instrument.page_number(f)) for f in image_files}
+
+    # Pages the journal has as enhanced from the same input are not redone
+    journal = Journal(resume=args.resume)
+    cache_keys = {f: enhance_cache_key(f, args.profile, dpis[f]) for f in image_files}
+    finished = [
+        f
+        for f in image_files
+        if journal.done("enhance", instrument.page_number(f), cache_keys[f])
+    ]
+
+    def record_enhanced(image_file):
+        journal.record(
+            "enhance",
+            instrument.page_number(image_file),
+            os.path.join(output_folder, image_file),
+            cache_keys[image_file],
+        )
 
     if image_files:
-        logging.info(f"📂 Found {len(image_files)} images. Processing one by one...")
+        # Create a folder in Google Drive for enhanced images (only if the
+        # upload policy includes this stage)
+        if uploads_stage("enhance"):
+            get_or_create_folder(
+                drive_folder_name, parent_folder_id=os.getenv("GDRIVE_FOLDER_ID")
+            )
 
-        for image in image_files:
-            success = enhance_image(image)
+        with DriveUploader(stage="enhance") as uploader:
+            for image in finished:
+                uploader.submit(
+                    os.path.join(output_folder, image), folder_name=drive_folder_name
+                )
+            image_files = [f for f in image_files if f not in finished]
+            if args.workers > 1:
+                logging.info(
+                    f"📂 Found {len(image_files)} images. Processing in parallel..."
+                )
+                results = enhance_images_parallel(
+                    image_files,
+                    args.workers,
+                    args.max_in_flight,
+                    uploader,
+                    args.profile,
+                    dpis,
+                    record_enhanced,
+                    memory_budget,
+                )
+                for image, success in results:
+                    if not success:
+                        logging.warning(f"⚠️ Skipped {image} after retries.")
+            else:
+                logging.info(
+                    f"📂 Found {len(image_files)} images. Processing one by one..."
+                )
 
-            if not success:
-                logging.warning(f"⚠️ Skipped {image} after retries.")
+                for image in image_files:
+                    success = enhance_image(
+                        image,
+                        upload=False,
+                        profile=args.profile,
+                        dpi=dpis[image],
+                        memory_budget=memory_budget,
+                    )
 
-            time.sleep(1)  # Small delay before processing the next image
+                    if success:
+                        record_enhanced(image)
+                        uploader.submit(
+                            os.path.join(output_folder, image),
+                            folder_name=drive_folder_name,
+                        )
+                    else:
+                        logging.warning(f"⚠️ Skipped {image} after retries.")
 
-        logging.info(
-            f"🎉 Enhancement complete! Results saved to {output_folder} and uploaded."
-        )
+        get_page_cache().report()
+        journal.report("enhance")
+        logging.info(f"🎉 Enhancement complete! Results saved to {output_folder}.")
     else:
         logging.warning("⚠️ No images found in input directory.")
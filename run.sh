@@ -3,6 +3,13 @@
 # Exit script on error
 set -e
 
+# `bash run.sh --resume` continues a run that was killed part-way: every
+# stage skips the pages main/pdfs/journal.jsonl records as done
+if [ "$1" == "--resume" ]; then
+    export RESUME=1
+    echo "📓 Resuming from the page journal..."
+fi
+
 echo "🚀 Starting PDF Sync and Processing Workflow..."
 
 # Step 1: Activate virtual environment (if you use one)
@@ -12,30 +19,51 @@ echo "🚀 Starting PDF Sync and Processing Workflow..."
 echo "📦 Installing dependencies..."
 pip install -r requirements.txt
 
-# Step 3: Download PDFs from Google Drive
-echo "📥 Downloading PDFs from Google Drive..."
-python main/drive_to_github.py
-
-# Step 4: Split PDFs
-echo "✂️📄✂️ Splitting PDFs..."
-python main/split_pdf.py
-
-
-# Step 5: Remove Watermark 
-echo "🧼 Removing Watermark From Images..."
-python main/remove_watermark.py
-
-# Step 6: Text Enhancement
-echo "🔍 Enhancing text in images..."
-python main/text_enhancement.py
-
-# Step 7: Doing Ocr 
-echo "Ocr ... "
-bash main/ocr.sh
-
-# Step 8: Combine Ocr Done Pdf's
- echo "Combining Ocr Done Pdfs"
- python main/combine_ocr_pdf.py
+if [ "$DISCOVER" == "1" ]; then
+    # Steps 3-8 for every PDF discovery.py queued (new or changed in the
+    # Drive folder since the last run); each leaves the queue once merged
+    echo "📥 Downloading new and changed PDFs from Google Drive..."
+    python main/drive_to_github.py --discover
+
+    while IFS=$'\t' read -r file_id pdf_name <&3; do
+        echo "✂️📄✂️ Processing $pdf_name..."
+        python main/pipeline.py --pdf "main/pdfs/$pdf_name"
+        python main/combine_ocr_pdf.py --output "main/pdfs/pdfs_output/${pdf_name%.*}_ocr.pdf"
+        python main/discovery.py done "$file_id"
+    done 3< <(python main/discovery.py pending)
+else
+    # Step 3: Download PDFs from Google Drive
+    echo "📥 Downloading PDFs from Google Drive..."
+    python main/drive_to_github.py
+
+    # Steps 4-7: Split, remove watermark, enhance and OCR each page in memory
+    # (the standalone split_pdf.py / remove_watermark.py / text_enhancement.py /
+    # ocr.sh stages are still available for debugging a single step)
+    echo "✂️📄✂️ Splitting, cleaning, enhancing and OCRing pages..."
+    if [ "${SHARDS:-1}" -gt 1 ]; then
+        # SHARDS=N splits the book into N page ranges processed side by side
+        # (the same --shard i/N works across the machines of a job matrix)
+        workers=$(( ($(nproc) + SHARDS - 1) / SHARDS ))
+        pids=()
+        for i in $(seq 1 "$SHARDS"); do
+            python main/pipeline.py --shard "$i/$SHARDS" --ocr-workers "$workers" &
+            pids+=($!)
+        done
+        for pid in "${pids[@]}"; do
+            wait "$pid"
+        done
+
+        # Step 8: Merge the shards in page order, failing if any page is missing
+        echo "Combining Ocr Done Pdfs"
+        python main/combine_ocr_pdf.py --shards "$SHARDS"
+    else
+        python main/pipeline.py
+
+        # Step 8: Combine Ocr Done Pdf's
+        echo "Combining Ocr Done Pdfs"
+        python main/combine_ocr_pdf.py
+    fi
+fi
 
 
 # Step 11: Delete processed PDFs from the repo
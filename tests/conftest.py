@@ -0,0 +1,43 @@
+import os
+import sys
+import threading
+from collections import Counter
+
+import pytest
+
+# The scripts in main/ import each other as top-level modules
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), os.pardir, "main"))
+
+
+def reset_drive_state(monkeypatch):
+    """Gives drive_utils empty per-process caches, as in a new run."""
+    import drive_utils
+
+    monkeypatch.setattr(drive_utils, "_thread_local", threading.local())
+    monkeypatch.setattr(drive_utils, "_folder_cache", {})
+    monkeypatch.setattr(drive_utils, "_folder_cache_loaded", True)
+    monkeypatch.setattr(drive_utils, "_folder_locks", {})
+    monkeypatch.setattr(drive_utils, "folder_cache_stats", Counter())
+    monkeypatch.setattr(drive_utils, "_remote_files", {})
+    monkeypatch.setattr(drive_utils, "_remote_locks", {})
+
+
+@pytest.fixture
+def fake_drive(monkeypatch):
+    """A FakeDriveServer that drive_utils' Drive backend talks to."""
+    import drive_utils
+    from fake_drive import FakeDriveServer
+
+    with FakeDriveServer() as server:
+        env = server.environ()
+        monkeypatch.setattr(
+            drive_utils, "SERVICE_ACCOUNT_JSON", env["GDRIVE_SERVICE_ACCOUNT"]
+        )
+        monkeypatch.setattr(drive_utils, "FOLDER_ID", env["GDRIVE_FOLDER_ID"])
+        monkeypatch.setattr(drive_utils, "API_ROOT", env["GDRIVE_API_ROOT"])
+        monkeypatch.setattr(drive_utils, "FOLDER_CACHE_FILE", None)
+        monkeypatch.setattr(drive_utils, "_creds", None)
+        monkeypatch.setattr(drive_utils, "_service", None)
+        monkeypatch.setattr(drive_utils, "_storage", drive_utils.DriveStorage())
+        reset_drive_state(monkeypatch)
+        yield server
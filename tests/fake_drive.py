@@ -0,0 +1,441 @@
+"""A small in-process fake of the Google Drive v3 HTTP API.
+
+Used by the tests to exercise drive_utils (uploads, folder lookups,
+downloads, the changes feed) without real credentials. Point the pipeline
+at it with::
+
+    python tests/fake_drive.py --port 8765
+
+which prints the environment variables to export. Needs the packages in
+requirements-test.txt.
+"""
+
+import argparse
+import email
+import hashlib
+import itertools
+import json
+import re
+import threading
+import time
+from collections import Counter
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+FOLDER_MIME_TYPE = "application/vnd.google-apps.folder"
+ROOT_FOLDER_ID = "fake-root-folder"
+
+
+def fake_service_account_info(token_uri):
+    """Returns service-account JSON whose token endpoint is the fake server."""
+    from cryptography.hazmat.primitives import serialization
+    from cryptography.hazmat.primitives.asymmetric import rsa
+
+    key = rsa.generate_private_key(public_exponent=65537, key_size=2048)
+    private_key = key.private_bytes(
+        serialization.Encoding.PEM,
+        serialization.PrivateFormat.PKCS8,
+        serialization.NoEncryption(),
+    ).decode()
+    return {
+        "type": "service_account",
+        "project_id": "fake-project",
+        "private_key_id": "fake-key",
+        "private_key": private_key,
+        "client_email": "fake@fake-project.iam.gserviceaccount.com",
+        "client_id": "0",
+        "token_uri": token_uri,
+    }
+
+
+class FakeDrive:
+    """Thread-safe in-memory file store with Drive-like metadata."""
+
+    def __init__(self):
+        self.files = {
+            ROOT_FOLDER_ID: {
+                "id": ROOT_FOLDER_ID,
+                "name": "root",
+                "mimeType": FOLDER_MIME_TYPE,
+                "parents": [],
+            }
+        }
+        self.contents = {}
+        self.changes = []  # Change log served by changes.list, oldest first
+        self.calls = Counter()
+        self.lock = threading.Lock()
+        self._ids = itertools.count(1)
+
+    def create(self, metadata, content=None):
+        """Stores a new file (or folder) and returns its metadata.
+
+        Raises LookupError (served as a 404) if a parent does not exist.
+        """
+        with self.lock:
+            for parent_id in metadata.get("parents", []):
+                if parent_id not in self.files:
+                    raise LookupError(f"File not found: {parent_id}")
+            file_id = f"fake-{next(self._ids)}"
+            record = {
+                "id": file_id,
+                "name": metadata.get("name", "Untitled"),
+                "mimeType": metadata.get("mimeType", "application/octet-stream"),
+                "parents": metadata.get("parents", [ROOT_FOLDER_ID]),
+                "trashed": False,
+            }
+            if content is not None:
+                record["size"] = str(len(content))
+                record["md5Checksum"] = hashlib.md5(content).hexdigest()
+                self.contents[file_id] = content
+            self.files[file_id] = record
+            self._log_change(file_id)
+            return dict(record)
+
+    def update(self, file_id, metadata=None, content=None):
+        """Changes a file's metadata (name, trashed, ...) and/or content.
+
+        Raises LookupError (served as a 404) if the file does not exist.
+        """
+        with self.lock:
+            record = self.files.get(file_id)
+            if record is None:
+                raise LookupError(f"File not found: {file_id}")
+            for field in ("name", "mimeType", "trashed"):
+                if field in (metadata or {}):
+                    record[field] = metadata[field]
+            if content is not None:
+                record["size"] = str(len(content))
+                record["md5Checksum"] = hashlib.md5(content).hexdigest()
+                self.contents[file_id] = content
+            self._log_change(file_id)
+            return dict(record)
+
+    def delete(self, file_id):
+        """Removes a file for good (a "removed" change)."""
+        with self.lock:
+            self.files.pop(file_id, None)
+            self.contents.pop(file_id, None)
+            self._log_change(file_id, removed=True)
+
+    def _log_change(self, file_id, removed=False):
+        # Called with the lock held
+        self.changes.append(
+            {"fileId": file_id, "removed": removed, "time": time.time()}
+        )
+
+    def start_page_token(self):
+        """Token for "changes from now on" (1-based position in the log)."""
+        with self.lock:
+            return str(len(self.changes) + 1)
+
+    def list_changes(self, page_token, page_size=100):
+        """Returns (changes, next_page_token, new_start_page_token)."""
+        start = int(page_token) - 1
+        with self.lock:
+            entries = self.changes[start : start + page_size]
+            end = start + len(entries)
+            more = end < len(self.changes)
+            changes = []
+            for entry in entries:
+                change = {"kind": "drive#change", "changeType": "file", **entry}
+                if not entry["removed"] and entry["fileId"] in self.files:
+                    change["file"] = dict(self.files[entry["fileId"]])
+                changes.append(change)
+        if more:
+            return changes, str(end + 1), None
+        return changes, None, str(end + 1)
+
+    def query(self, q):
+        """Evaluates the subset of Drive query syntax used by drive_utils."""
+        clauses = [c.strip() for c in re.split(r"\s+and\s+", q or "") if c.strip()]
+        with self.lock:
+            matches = list(self.files.values())
+        for clause in clauses:
+            if m := re.fullmatch(r"'(.+?)' in parents", clause):
+                matches = [f for f in matches if m.group(1) in f["parents"]]
+            elif m := re.fullmatch(r"(name|mimeType)\s*(!?=)\s*'(.*)'", clause):
+                field, op, value = m.groups()
+                value = value.replace("\\'", "'")
+                matches = [f for f in matches if (f.get(field) == value) == (op == "=")]
+            elif m := re.fullmatch(r"trashed\s*=\s*(true|false)", clause):
+                wanted = m.group(1) == "true"
+                matches = [f for f in matches if f.get("trashed", False) == wanted]
+            else:
+                raise ValueError(f"Unsupported query clause: {clause}")
+        return [dict(f) for f in matches if f["id"] != ROOT_FOLDER_ID]
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, format, *args):
+        pass  # Keep test output quiet
+
+    @property
+    def drive(self):
+        return self.server.drive
+
+    def _send_json(self, status, payload, headers=None):
+        body = json.dumps(payload).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _send_error(self, status, message):
+        self._send_json(status, {"error": {"code": status, "message": message}})
+
+    def _read_body(self):
+        length = int(self.headers.get("Content-Length") or 0)
+        return self.rfile.read(length) if length else b""
+
+    def _dispatch(self, method):
+        url = urlparse(self.path)
+        params = {k: v[-1] for k, v in parse_qs(url.query).items()}
+        body = self._read_body()
+        route = f"{method} {url.path}"
+        route_key = route if "/files/" not in url.path else f"{method} files/id"
+        self.drive.calls[route_key] += 1
+        if self.server.latency:
+            time.sleep(self.server.latency)
+        if self.server.failures.get(route_key, 0) > 0:
+            self.server.failures[route_key] -= 1
+            return self._send_error(503, "Injected failure")
+        try:
+            self._route(method, url, params, body)
+        except LookupError as error:
+            self._send_error(404, str(error))
+
+    def _route(self, method, url, params, body):
+        route = f"{method} {url.path}"
+        if method == "POST" and url.path == "/token":
+            return self._send_json(
+                200,
+                {
+                    "access_token": "fake-token",
+                    "expires_in": 3600,
+                    "token_type": "Bearer",
+                },
+            )
+        if url.path == "/drive/v3/files" and method == "GET":
+            return self._list_files(params)
+        if url.path == "/drive/v3/changes/startPageToken" and method == "GET":
+            return self._send_json(
+                200, {"startPageToken": self.drive.start_page_token()}
+            )
+        if url.path == "/drive/v3/changes" and method == "GET":
+            return self._list_changes(params)
+        if url.path == "/drive/v3/files" and method == "POST":
+            return self._send_json(200, self.drive.create(json.loads(body or b"{}")))
+        if url.path == "/upload/drive/v3/files" and method in ("POST", "PUT"):
+            return self._upload(method, params, body)
+        if m := re.fullmatch(r"/upload/drive/v3/files/([^/]+)", url.path):
+            return self._update_media(m.group(1), params, body)
+        if m := re.fullmatch(r"/drive/v3/files/([^/]+)", url.path):
+            return self._file(method, m.group(1), params)
+        self._send_error(404, f"No fake route for {route}")
+
+    def _list_files(self, params):
+        try:
+            files = self.drive.query(params.get("q"))
+        except ValueError as error:
+            return self._send_error(400, str(error))
+        page_size = int(params.get("pageSize", 100))
+        offset = int(params.get("pageToken", 0))
+        payload = {"files": files[offset : offset + page_size]}
+        if offset + page_size < len(files):
+            payload["nextPageToken"] = str(offset + page_size)
+        self._send_json(200, payload)
+
+    def _list_changes(self, params):
+        if "pageToken" not in params:
+            return self._send_error(400, "pageToken is required")
+        changes, next_token, new_start_token = self.drive.list_changes(
+            params["pageToken"], int(params.get("pageSize", 100))
+        )
+        payload = {"kind": "drive#changeList", "changes": changes}
+        if next_token:
+            payload["nextPageToken"] = next_token
+        else:
+            payload["newStartPageToken"] = new_start_token
+        self._send_json(200, payload)
+
+    def _update_media(self, file_id, params, body):
+        """files.update with new content (simple or multipart upload)."""
+        metadata, content = {}, body
+        if params.get("uploadType") == "multipart":
+            message = email.message_from_bytes(
+                f"Content-Type: {self.headers['Content-Type']}\r\n\r\n".encode() + body
+            )
+            metadata_part, media_part = message.get_payload()
+            metadata = json.loads(metadata_part.get_payload(decode=True))
+            content = media_part.get_payload(decode=True)
+        self._send_json(200, self.drive.update(file_id, metadata, content))
+
+    def _upload(self, method, params, body):
+        upload_type = params.get("uploadType")
+        sessions = self.server.upload_sessions
+        if upload_type == "resumable" and "upload_id" not in params:
+            upload_id = str(next(self.server.upload_ids))  # Never reused
+            sessions[upload_id] = {"metadata": json.loads(body or b"{}"), "data": b""}
+            location = (
+                f"http://{self.headers['Host']}/upload/drive/v3/files"
+                f"?uploadType=resumable&upload_id={upload_id}"
+            )
+            self.send_response(200)
+            self.send_header("Location", location)
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+            return
+        if upload_type == "resumable":
+            session = sessions[params["upload_id"]]
+            session["data"] += body
+            total = (self.headers.get("Content-Range") or "").rsplit("/", 1)[-1]
+            if total not in ("*", "") and len(session["data"]) < int(total):
+                self.send_response(308)
+                self.send_header("Range", f"bytes=0-{len(session['data']) - 1}")
+                self.send_header("Content-Length", "0")
+                self.end_headers()
+                return
+            record = self.drive.create(session["metadata"], session["data"])
+            del sessions[params["upload_id"]]
+            return self._send_json(200, record)
+        if upload_type == "multipart":
+            message = email.message_from_bytes(
+                f"Content-Type: {self.headers['Content-Type']}\r\n\r\n".encode() + body
+            )
+            metadata_part, media_part = message.get_payload()
+            metadata = json.loads(metadata_part.get_payload(decode=True))
+            content = media_part.get_payload(decode=True)
+            return self._send_json(200, self.drive.create(metadata, content))
+        return self._send_json(200, self.drive.create({}, body))
+
+    def _file(self, method, file_id, params):
+        with self.drive.lock:
+            record = self.drive.files.get(file_id)
+        if record is None:
+            return self._send_error(404, f"File not found: {file_id}")
+        if method == "PATCH":
+            return self._send_json(
+                200, self.drive.update(file_id, json.loads(body or b"{}"))
+            )
+        if method == "DELETE":
+            self.drive.delete(file_id)
+            self.send_response(204)
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+            return
+        if params.get("alt") != "media":
+            return self._send_json(200, dict(record))
+        content = self.drive.contents.get(file_id, b"")
+        status, headers = 200, {}
+        if m := re.fullmatch(r"bytes=(\d+)-(\d*)", self.headers.get("Range", "")):
+            start = int(m.group(1))
+            end = min(int(m.group(2) or len(content) - 1), len(content) - 1)
+            if start >= len(content):
+                return self._send_error(416, "Requested range not satisfiable")
+            status = 206
+            if self.server.omit_content_range > 0:
+                self.server.omit_content_range -= 1
+            else:
+                headers["Content-Range"] = f"bytes {start}-{end}/{len(content)}"
+            content = content[start : end + 1]
+        self.send_response(status)
+        self.send_header("Content-Type", record["mimeType"])
+        self.send_header("Content-Length", str(len(content)))
+        for name, value in headers.items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(content)
+
+    def do_GET(self):
+        self._dispatch("GET")
+
+    def do_POST(self):
+        self._dispatch("POST")
+
+    def do_PUT(self):
+        self._dispatch("PUT")
+
+    def do_PATCH(self):
+        self._dispatch("PATCH")
+
+    def do_DELETE(self):
+        self._dispatch("DELETE")
+
+
+class FakeDriveServer:
+    """Runs a FakeDrive behind a local HTTP server on a background thread."""
+
+    def __init__(self, host="127.0.0.1", port=0, latency=0.0):
+        self.drive = FakeDrive()
+        self.httpd = ThreadingHTTPServer((host, port), _Handler)
+        self.httpd.daemon_threads = True
+        self.httpd.drive = self.drive
+        self.httpd.latency = latency
+        self.httpd.upload_sessions = {}
+        self.httpd.upload_ids = itertools.count(1)
+        self.httpd.failures = Counter()
+        self.httpd.omit_content_range = 0
+        self._thread = None
+
+    @property
+    def root_url(self):
+        host, port = self.httpd.server_address[:2]
+        return f"http://{host}:{port}/"
+
+    def environ(self):
+        """Environment variables that point drive_utils at this server."""
+        return {
+            "GDRIVE_API_ROOT": self.root_url,
+            "GDRIVE_FOLDER_ID": ROOT_FOLDER_ID,
+            "GDRIVE_SERVICE_ACCOUNT": json.dumps(
+                fake_service_account_info(self.root_url + "token")
+            ),
+        }
+
+    def inject_failures(self, route_key, count=1):
+        """Makes the next ``count`` requests to ``route_key`` (as counted in
+        ``drive.calls``, e.g. "GET files/id") fail with HTTP 503."""
+        self.httpd.failures[route_key] += count
+
+    def omit_content_range(self, count=1):
+        """Serves the next ``count`` partial downloads (206) without a
+        Content-Range header."""
+        self.httpd.omit_content_range += count
+
+    def start(self):
+        self._thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Run a local fake Google Drive API.")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument(
+        "--latency", type=float, default=0.0, help="Seconds of delay per request."
+    )
+    args = parser.parse_args()
+
+    server = FakeDriveServer(port=args.port, latency=args.latency)
+    for name, value in server.environ().items():
+        print(f"export {name}='{value}'")
+    print(f"🧪 Fake Drive listening on {server.root_url} (Ctrl+C to stop)")
+    try:
+        server.httpd.serve_forever()
+    except KeyboardInterrupt:
+        server.stop()
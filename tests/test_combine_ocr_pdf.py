@@ -0,0 +1,52 @@
+import fitz
+import pytest
+from combine_ocr_pdf import load_shard_manifests, manifest_problems
+from manifest import Manifest, shard_manifest_path
+
+
+def page_pdf(path):
+    doc = fitz.open()
+    doc.new_page()
+    doc.save(path)
+    return str(path)
+
+
+def shard(tmp_path, index, count, pages, failed=(), page_count=4):
+    """A shard manifest as pipeline.py --shard leaves it; ``failed`` pages
+    keep split_pdf.py's annotations but got no output."""
+    path = shard_manifest_path(index, count, str(tmp_path / "manifest.json"))
+    manifest = Manifest(path, "demo.pdf", shard=(index, count), page_count=page_count)
+    for page_number in pages:
+        manifest.annotate(page_number, kind="scan", dpi=300)
+        if page_number not in failed:
+            manifest.set_page(page_number, page_pdf(tmp_path / f"p{page_number}.pdf"))
+    manifest.save()
+
+
+def test_shards_covering_every_page_merge(tmp_path):
+    shard(tmp_path, 1, 2, [1, 2])
+    shard(tmp_path, 2, 2, [3, 4])
+
+    merged = load_shard_manifests(2, str(tmp_path / "manifest.json"))
+
+    assert [n for n, _, _ in merged.ordered()] == [1, 2, 3, 4]
+
+
+def test_page_that_failed_in_a_shard_is_missing(tmp_path):
+    shard(tmp_path, 1, 2, [1, 2], failed=[2])
+    shard(tmp_path, 2, 2, [3, 4])
+
+    with pytest.raises(ValueError, match=r"1 pages have no output: \[2\]"):
+        load_shard_manifests(2, str(tmp_path / "manifest.json"))
+
+
+def test_unsharded_manifest_reports_failed_and_absent_pages(tmp_path):
+    manifest = Manifest(str(tmp_path / "manifest.json"), "demo.pdf", page_count=4)
+    manifest.set_page(1, page_pdf(tmp_path / "p1.pdf"))
+    manifest.annotate(2, kind="scan", dpi=300)  # OCR failed
+    manifest.set_blank(3, 595.0, 842.0)
+
+    assert manifest.missing_pages() == [2, 4]
+    assert manifest_problems(manifest) == ["2 pages have no output: [2, 4]"]
+    with pytest.raises(ValueError, match="Page 2 has no output"):
+        list(manifest.ordered())
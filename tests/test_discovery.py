@@ -0,0 +1,51 @@
+from discovery import DiscoveryState, scan
+from drive_utils import DriveStorage
+from fake_drive import ROOT_FOLDER_ID
+
+LIST_FILES = "GET /drive/v3/files"
+LIST_CHANGES = "GET /drive/v3/changes"
+
+
+def add_pdf(drive, name, content=b"%PDF-1.4", parents=(ROOT_FOLDER_ID,)):
+    return drive.create(
+        {"name": name, "mimeType": "application/pdf", "parents": list(parents)},
+        content,
+    )
+
+
+def test_second_scan_reads_only_the_changes_feed(fake_drive, tmp_path):
+    drive = fake_drive.drive
+    first = add_pdf(drive, "first.pdf")
+    drive.create({"name": "notes.txt", "mimeType": "text/plain"}, b"notes")
+    state = DiscoveryState(str(tmp_path / "discovery.json"))
+
+    queued = scan(state, DriveStorage(), ROOT_FOLDER_ID)
+
+    assert [file["id"] for file in queued] == [first["id"]]
+    assert drive.calls[LIST_FILES] == 1 and drive.calls[LIST_CHANGES] == 0
+    state.mark_done(first["id"])
+    state.save()
+
+    second = add_pdf(drive, "second.pdf")
+    drive.calls.clear()
+    state = DiscoveryState.load(state.path)
+    queued = scan(state, DriveStorage(), ROOT_FOLDER_ID)
+
+    assert [file["id"] for file in queued] == [second["id"]]
+    assert list(state.pending) == [second["id"]]
+    assert drive.calls[LIST_CHANGES] == 1 and drive.calls[LIST_FILES] == 0
+
+
+def test_changed_and_trashed_pdfs(fake_drive, tmp_path):
+    drive = fake_drive.drive
+    kept, trashed = add_pdf(drive, "kept.pdf"), add_pdf(drive, "trashed.pdf")
+    state = DiscoveryState(str(tmp_path / "discovery.json"))
+    scan(state, DriveStorage(), ROOT_FOLDER_ID)
+    state.mark_done(kept["id"])
+
+    drive.update(kept["id"], content=b"%PDF-1.4 edited")
+    drive.update(trashed["id"], {"trashed": True})
+    queued = scan(state, DriveStorage(), ROOT_FOLDER_ID)
+
+    assert [file["id"] for file in queued] == [kept["id"]]
+    assert list(state.pending) == [kept["id"]]
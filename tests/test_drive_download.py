@@ -0,0 +1,42 @@
+import os
+
+import drive_utils
+from fake_drive import ROOT_FOLDER_ID
+
+CONTENT = b"%PDF-1.4 " + bytes(range(256)) * 4
+
+
+def add_pdf(drive, name="source.pdf"):
+    return drive.create(
+        {"name": name, "mimeType": "application/pdf", "parents": [ROOT_FOLDER_ID]},
+        CONTENT,
+    )
+
+
+def test_download_resumes_from_the_partial_file(fake_drive, tmp_path):
+    file = add_pdf(fake_drive.drive)
+    part_path = tmp_path / "source.pdf.part"
+    part_path.write_bytes(CONTENT[:100])
+
+    drive_utils._download_chunks(
+        drive_utils.get_thread_service(), file["id"], str(part_path), chunk_size=256
+    )
+
+    assert part_path.read_bytes() == CONTENT
+    assert fake_drive.drive.calls["GET files/id"] == 4
+
+
+def test_download_without_content_range(fake_drive, tmp_path):
+    file = add_pdf(fake_drive.drive)
+    fake_drive.omit_content_range(count=100)
+    part_path = tmp_path / "source.pdf.part"
+
+    drive_utils._download_chunks(
+        drive_utils.get_thread_service(), file["id"], str(part_path), chunk_size=256
+    )
+    assert part_path.read_bytes() == CONTENT
+
+    os.remove(part_path)
+    path = drive_utils._drive_download_file(file, str(tmp_path), retries=1)
+    assert path == str(tmp_path / "source.pdf")
+    assert (tmp_path / "source.pdf").read_bytes() == CONTENT
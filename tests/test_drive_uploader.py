@@ -0,0 +1,120 @@
+import json
+import os
+import subprocess
+import sys
+import threading
+
+import drive_utils
+from conftest import reset_drive_state
+from drive_utils import DriveStorage, DriveUploader, LocalStorage
+from fake_drive import FOLDER_MIME_TYPE, ROOT_FOLDER_ID
+
+FOLDER_LOOKUP_OR_LISTING = "GET /drive/v3/files"
+FOLDER_CREATE = "POST /drive/v3/files"
+UPLOAD = "POST /upload/drive/v3/files"
+
+
+def make_pages(tmp_path, count):
+    paths = []
+    for page_number in range(1, count + 1):
+        path = tmp_path / f"page_{page_number}.png"
+        path.write_bytes(f"page {page_number}".encode())
+        paths.append(str(path))
+    return paths
+
+
+def upload_all(paths, workers=4):
+    with DriveUploader(workers=workers, storage=DriveStorage()) as uploader:
+        for path in paths:
+            uploader.submit(path, "Pages", parent_folder_id=ROOT_FOLDER_ID)
+    return uploader
+
+
+def folders(drive):
+    return [f for f in drive.files.values() if f["mimeType"] == FOLDER_MIME_TYPE]
+
+
+def test_uploads_resolve_the_folder_once(fake_drive, tmp_path):
+    paths = make_pages(tmp_path, 8)
+
+    uploader = upload_all(paths)
+
+    calls = fake_drive.drive.calls
+    assert sorted(p for p, _ in uploader.uploaded) == sorted(paths)
+    assert not uploader.failed and not uploader.reused
+    # One folder lookup, one create and one listing for the dedupe index,
+    # however many workers upload into the folder at once
+    assert calls[FOLDER_LOOKUP_OR_LISTING] == 2
+    assert calls[FOLDER_CREATE] == 1
+    assert calls[UPLOAD] == len(paths)
+    assert [f["name"] for f in folders(fake_drive.drive)] == ["root", "Pages"]
+
+
+def test_rerun_reuses_identical_files(fake_drive, tmp_path, monkeypatch):
+    paths = make_pages(tmp_path, 5)
+    upload_all(paths)
+    with open(paths[0], "ab") as f:
+        f.write(b" changed")
+
+    reset_drive_state(monkeypatch)  # A new run: nothing cached in memory
+    fake_drive.drive.calls.clear()
+    uploader = upload_all(paths)
+
+    calls = fake_drive.drive.calls
+    assert [p for p, _ in uploader.uploaded] == [paths[0]]
+    assert sorted(p for p, _ in uploader.reused) == sorted(paths[1:])
+    assert calls[FOLDER_LOOKUP_OR_LISTING] == 2  # Lookup (found) and listing
+    assert calls[FOLDER_CREATE] == 0
+    assert calls[UPLOAD] == 1
+    assert len(folders(fake_drive.drive)) == 2
+
+
+def test_folder_cache_is_shared_between_uploaders(fake_drive, tmp_path):
+    upload_all(make_pages(tmp_path, 2))
+    fake_drive.drive.calls.clear()
+
+    (tmp_path / "more").mkdir()
+    upload_all(make_pages(tmp_path / "more", 3)[2:])
+
+    calls = fake_drive.drive.calls
+    assert calls[FOLDER_LOOKUP_OR_LISTING] == 0  # Folder and index cached
+    assert calls[FOLDER_CREATE] == 0
+    assert calls[UPLOAD] == 1
+
+
+def test_disabled_stage_starts_no_threads(tmp_path, monkeypatch):
+    monkeypatch.setattr(drive_utils, "_upload_stages", frozenset({"final"}))
+    threads = threading.active_count()
+
+    with DriveUploader(stage="split", storage=LocalStorage(tmp_path)) as uploader:
+        uploader.submit(make_pages(tmp_path, 1)[0])
+        assert threading.active_count() == threads
+
+    assert uploader.skipped == 1 and not uploader.uploaded
+
+
+UPLOAD_TO_PATCHED_ROOT = """
+import drive_utils, sys
+drive_utils.FOLDER_ID = sys.argv[1]  # As a test or CLI override would
+with drive_utils.DriveUploader(workers=1, storage=drive_utils.DriveStorage()) as u:
+    u.submit(sys.argv[2], "Pages")
+drive_utils.upload_to_drive(sys.argv[2], "Pages")
+drive_utils.get_or_create_folder("Other")
+"""
+
+
+def test_root_folder_is_read_when_used(fake_drive, tmp_path):
+    drive = fake_drive.drive
+    root = drive.create({"name": "Run", "mimeType": FOLDER_MIME_TYPE})
+    (page,) = make_pages(tmp_path, 1)
+    env = {**os.environ, **fake_drive.environ(), "GDRIVE_FOLDER_ID": "stale-folder"}
+    env["PYTHONPATH"] = os.path.dirname(drive_utils.__file__)
+    subprocess.run(
+        [sys.executable, "-c", UPLOAD_TO_PATCHED_ROOT, root["id"], page],
+        cwd=tmp_path,
+        env=env,
+        check=True,
+    )
+
+    parents = {f["name"]: f["parents"] for f in folders(drive)}
+    assert parents["Pages"] == parents["Other"] == [root["id"]]
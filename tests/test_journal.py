@@ -0,0 +1,58 @@
+import json
+
+import pytest
+from journal import PARTIAL_FOLDER, Journal, atomic_output
+
+
+def write(path, text):
+    path.write_text(text)
+    return str(path)
+
+
+def test_torn_last_line_is_ignored_and_not_extended(tmp_path):
+    journal_path = tmp_path / "journal.jsonl"
+    first = write(tmp_path / "page_1.png", "one")
+    second = write(tmp_path / "page_2.png", "two")
+    Journal(str(journal_path)).record("split", 1, first, "k1")
+    with open(journal_path, "a") as f:
+        f.write('{"stage": "split", "page": 2, "key": "k2", "outp')  # Killed here
+
+    journal = Journal(str(journal_path), resume=True)
+    assert journal.done("split", 1, "k1")
+    assert not journal.done("split", 2, "k2")
+
+    journal.record("split", 2, second, "k2")
+    lines = journal_path.read_text().splitlines()
+    assert json.loads(lines[-1])["page"] == 2
+    assert Journal(str(journal_path), resume=True).done("split", 2, "k2")
+
+
+def test_atomic_output_leaves_no_partial_file(tmp_path):
+    path = tmp_path / "page_1.png"
+    with pytest.raises(RuntimeError):
+        with atomic_output(str(path)) as partial_path:
+            with open(partial_path, "w") as f:
+                f.write("half a page")
+            raise RuntimeError("killed mid-write")
+
+    assert not path.exists()
+    assert list((tmp_path / PARTIAL_FOLDER).iterdir()) == []
+
+    with atomic_output(str(path)) as partial_path:
+        with open(partial_path, "w") as f:
+            f.write("page")
+    assert path.read_text() == "page"
+    assert list((tmp_path / PARTIAL_FOLDER).iterdir()) == []
+
+
+def test_done_requires_the_recorded_output_hash(tmp_path):
+    journal_path = str(tmp_path / "journal.jsonl")
+    output = write(tmp_path / "page_1.pdf", "ocr output")
+    Journal(journal_path).record("ocr", 1, output, "k1")
+
+    assert Journal(journal_path, resume=True).done("ocr", 1, "k1")
+    assert not Journal(journal_path, resume=True).done("ocr", 1, "other key")
+    assert not Journal(journal_path).done("ocr", 1, "k1")  # Not resuming
+
+    write(tmp_path / "page_1.pdf", "damaged")
+    assert not Journal(journal_path, resume=True).done("ocr", 1, "k1")
@@ -0,0 +1,90 @@
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import shared_memory
+
+import numpy as np
+import pytest
+from page_buffers import PageBufferPool, worker_pool
+
+
+@pytest.fixture
+def pool():
+    with PageBufferPool(slots=2, slot_bytes=64 * 48 * 3) as pool:
+        yield pool
+
+
+def page_sum(handle):
+    """Image worker: reads a page through its handle and passes it back."""
+    pool = worker_pool()
+    try:
+        return int(pool.view(handle).sum())
+    finally:
+        pool.release(handle)
+
+
+def test_acquire_retain_release_refcounts(pool):
+    handle = pool.acquire((64, 48, 3))
+    assert pool.in_use() == 1
+
+    pool.retain(handle)
+    pool.release(handle)
+    assert pool.in_use() == 1
+
+    pool.release(handle)
+    assert pool.in_use() == 0
+    with pytest.raises(ValueError):
+        pool.release(handle)
+    with pytest.raises(ValueError):
+        pool.retain(handle)
+
+
+def test_handle_for_finds_the_slot_of_an_allocated_page(pool):
+    pool.allocate((10, 10))
+    page = pool.allocate((64, 48, 3))
+    page[:] = 7
+
+    handle = pool.handle_for(page)
+    assert (handle.slot, handle.shape, handle.dtype) == (1, (64, 48, 3), "|u1")
+    assert np.shares_memory(pool.view(handle), page)
+    assert pool.view(handle).sum() == 7 * page.size
+
+
+def test_exhausted_pool_blocks_until_a_slot_is_released(pool):
+    with pytest.raises(ValueError):
+        pool.acquire((64, 48, 4))  # Larger than a slot
+    first = pool.acquire((64, 48, 3))
+    pool.acquire((64, 48, 3))
+    with pytest.raises(TimeoutError):
+        pool.acquire((64, 48, 3), timeout=0.05)
+
+    releaser = threading.Timer(0.1, pool.release, [first])
+    releaser.start()
+    start = time.perf_counter()
+    handle = pool.acquire((64, 48, 3), timeout=5)
+    assert time.perf_counter() - start >= 0.05
+    assert handle.slot == first.slot
+    releaser.join()
+
+
+def test_worker_reads_the_page_through_attach_worker(pool):
+    page = pool.allocate((64, 48, 3))
+    page[:] = 3
+    handle = pool.handle_for(page)
+
+    with ProcessPoolExecutor(max_workers=1, initializer=pool.attach_worker) as ex:
+        assert ex.submit(page_sum, handle).result() == 3 * page.size
+    assert pool.in_use() == 0
+
+
+def test_close_keeps_pages_still_in_use_mapped(caplog):
+    pool = PageBufferPool(slots=2, slot_bytes=100)
+    page = pool.allocate((10, 10))
+    name = pool._segments[0].name
+
+    pool.close()
+    page[:] = 1  # Still mapped
+    assert page.sum() == 100
+    with pytest.raises(FileNotFoundError):
+        shared_memory.SharedMemory(name=name)  # But unlinked
+    assert "1 page buffers were still in use" in caplog.text
@@ -0,0 +1,58 @@
+import fitz
+from page_cache import pdf_page_hashes
+
+
+def vector_page(draw):
+    doc = fitz.open()
+    draw(doc.new_page(width=200, height=200))
+    return doc
+
+
+def line(page):
+    page.draw_line((10, 10), (190, 190))
+
+
+def circle(page):
+    page.draw_circle((100, 100), 50)
+
+
+def test_pages_drawing_different_forms_hash_differently(tmp_path):
+    doc = fitz.open()
+    for draw in (line, circle, line):
+        page = doc.new_page(width=200, height=200)
+        page.show_pdf_page(page.rect, vector_page(draw), 0)
+    path = tmp_path / "forms.pdf"
+    doc.save(path)
+    assert doc[0].read_contents() == doc[1].read_contents()  # Same "Do" call
+
+    first, second, third = pdf_page_hashes(path)
+
+    assert first != second
+    assert first == third
+
+
+def test_annotation_appearance_is_hashed(tmp_path):
+    doc = fitz.open()
+    for text in ("hello", "world", "hello"):
+        doc.new_page(width=200, height=200).add_freetext_annot((10, 10, 150, 50), text)
+    path = tmp_path / "annots.pdf"
+    doc.save(path)
+
+    first, second, third = pdf_page_hashes(path)
+
+    assert first != second
+    assert first == third
+
+
+def test_hashes_survive_appending_pages_and_renumbering(tmp_path):
+    doc = fitz.open()
+    page = doc.new_page(width=200, height=200)
+    page.show_pdf_page(page.rect, vector_page(circle), 0)
+    doc.new_page(width=200, height=200).insert_text((20, 50), "text")
+    doc.save(tmp_path / "before.pdf")
+    before = pdf_page_hashes(tmp_path / "before.pdf")
+
+    doc.new_page().insert_text((20, 50), "appended")
+    doc.save(tmp_path / "after.pdf", garbage=4)  # Renumbers objects
+
+    assert pdf_page_hashes(tmp_path / "after.pdf")[:2] == before
@@ -0,0 +1,46 @@
+import json
+import os
+import runpy
+import sys
+
+import fitz
+import page_cache
+import pytest
+
+PIPELINE = os.path.join(os.path.dirname(page_cache.__file__), "pipeline.py")
+
+
+def fake_ocr_page(image_path, output_pdf, langs=None, image_dpi=None):
+    """ocr_page whose worker fails on page 2."""
+    if output_pdf.endswith("_2.pdf"):
+        raise RuntimeError("OCR worker crashed")
+    doc = fitz.open()
+    doc.new_page()
+    doc.save(output_pdf)
+    return image_path, True, 0.0
+
+
+@pytest.mark.parametrize("image_workers", [1, 2])
+def test_failed_ocr_page_does_not_lose_the_others(
+    tmp_path, monkeypatch, capsys, image_workers
+):
+    import ocr
+
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(page_cache, "CACHE_DISABLED", True)
+    monkeypatch.setattr(ocr, "ocr_page", fake_ocr_page)
+    doc = fitz.open()
+    for page_number in range(1, 4):
+        doc.new_page().insert_text((72, 72), f"Page {page_number}", fontsize=40)
+    doc.save("source.pdf")
+    argv = ["pipeline.py", "--pdf", "source.pdf", "--dpi", "72", "--keep-blank"]
+    argv += ["--rasterize-all", "--profile", "fast", "--ocr-workers", "1"]
+    argv += ["--image-workers", str(image_workers)]
+    monkeypatch.setattr(sys, "argv", argv)
+
+    runpy.run_path(PIPELINE, run_name="__main__")
+
+    with open("main/pdfs/manifest.json") as f:
+        pages = json.load(f)["pages"]
+    assert sorted(n for n, page in pages.items() if page.get("pdf")) == ["1", "3"]
+    assert "Could not OCR Page 2. Reason: OCR worker crashed" in capsys.readouterr().out
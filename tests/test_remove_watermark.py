@@ -0,0 +1,83 @@
+import numpy as np
+import pytest
+from remove_watermark import (
+    remove_watermark,
+    remove_watermark_per_pixel,
+    select_watermark_pixel,
+)
+
+# Values on both sides of each band edge, plus the extremes
+EDGE_VALUES = np.array([0, 1, 208, 209, 210, 211, 254, 255], dtype=np.uint8)
+
+
+def edge_frame(channels):
+    """Every combination of edge values across the channels, as one frame."""
+    grids = np.meshgrid(*[EDGE_VALUES] * channels, indexing="ij")
+    pixels = np.stack([grid.ravel() for grid in grids], axis=-1)
+    return pixels.reshape(-1, len(EDGE_VALUES), channels).copy()
+
+
+def expected_count(img):
+    return sum(
+        select_watermark_pixel(*pixel) for pixel in img.reshape(-1, img.shape[-1])
+    )
+
+
+def test_bgr_matches_per_pixel():
+    img = edge_frame(3)
+    reference = remove_watermark_per_pixel(img.copy())
+    count = expected_count(img)
+
+    changed = remove_watermark(img)
+
+    assert changed == count
+    assert img.dtype == reference.dtype and img.tobytes() == reference.tobytes()
+
+
+def test_grayscale_matches_per_pixel():
+    gray = np.tile(EDGE_VALUES, (4, 1))
+    reference = remove_watermark_per_pixel(np.dstack([gray] * 3))[:, :, 0]
+    count = expected_count(np.dstack([gray] * 3))
+
+    changed = remove_watermark(gray)
+
+    assert changed == count
+    assert gray.tobytes() == np.ascontiguousarray(reference).tobytes()
+
+
+@pytest.mark.parametrize(
+    "window",
+    [
+        (slice(2, 10), slice(3, 13)),  # Crop: strided rows, packed pixels
+        (slice(None, None, 2), slice(1, None, 3)),  # Strided pixels too
+    ],
+)
+def test_non_contiguous_view_is_changed_in_place(window):
+    rng = np.random.default_rng(0)
+    base = rng.choice(EDGE_VALUES, size=(12, 16, 3))
+    reference = base.copy()
+    remove_watermark_per_pixel(reference[window])
+
+    view = base[window]
+    assert not view.flags["C_CONTIGUOUS"]
+    changed = remove_watermark(view)
+
+    assert changed == expected_count(reference[window])
+    assert base.tobytes() == reference.tobytes()  # Pixels outside the view kept
+
+
+@pytest.mark.parametrize("bands", [((0, 100), (50, 255), (210, 255))])
+def test_per_channel_bands(bands):
+    img = edge_frame(3)
+    inside = np.all(
+        [
+            (img[..., c] >= low) & (img[..., c] <= high)
+            for c, (low, high) in enumerate(bands)
+        ],
+        axis=0,
+    )
+    expected = img.copy()
+    expected[inside] = 255
+
+    assert remove_watermark(img, bands) == np.count_nonzero(inside)
+    assert img.tobytes() == expected.tobytes()
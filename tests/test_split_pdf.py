@@ -0,0 +1,55 @@
+import os
+import runpy
+import sys
+
+import fitz
+import page_cache
+from split_pdf import probe_blank_pages
+
+SPLIT_PDF = os.path.join(os.path.dirname(page_cache.__file__), "split_pdf.py")
+
+
+def test_blank_probe_keeps_light_print_on_dark_pages(tmp_path):
+    doc = fitz.open()
+    dark_titled = doc.new_page()
+    dark_titled.draw_rect(dark_titled.rect, color=None, fill=(0.1, 0.1, 0.1))
+    dark_titled.insert_text((200, 300), "Part II", fontsize=14, color=(1, 1, 1))
+    doc.new_page()  # Blank
+    doc.new_page().insert_text((72, 72), "A single line of text", fontsize=11)
+    dark = doc.new_page()
+    dark.draw_rect(dark.rect, color=None, fill=(0, 0, 0))
+    path = tmp_path / "pages.pdf"
+    doc.save(path)
+
+    assert [page_number for page_number, _ in probe_blank_pages(path)] == [2]
+
+
+def test_page_that_fails_to_render_does_not_stop_the_split(
+    tmp_path, monkeypatch, capsys
+):
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(page_cache, "CACHE_DISABLED", True)
+    doc = fitz.open()
+    for page_number in range(1, 4):
+        doc.new_page().insert_text((72, 72), f"Page {page_number}", fontsize=11)
+    doc.save(tmp_path / "source.pdf")
+
+    get_pixmap = fitz.Page.get_pixmap
+
+    def fail_on_page_2(page, *args, **kwargs):
+        if page.number == 1:
+            raise RuntimeError("broken page")
+        return get_pixmap(page, *args, **kwargs)
+
+    monkeypatch.setattr(fitz.Page, "get_pixmap", fail_on_page_2)
+    argv = ["split_pdf.py", "--pdf", "source.pdf", "--dpi", "72", "--keep-blank"]
+    argv += ["--rasterize-all", "--storage", "local", "--upload", "none"]
+    monkeypatch.setattr(sys, "argv", argv)
+    runpy.run_path(SPLIT_PDF, run_name="__main__")
+
+    output_folder = tmp_path / "main/pdfs/converted_images_600dpi"
+    assert sorted(output_folder.glob("*.png")) == [
+        output_folder / "final_output_page_1.png",
+        output_folder / "final_output_page_3.png",
+    ]
+    assert "Could not process Page 2. Reason: broken page" in capsys.readouterr().out
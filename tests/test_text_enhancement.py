@@ -0,0 +1,93 @@
+import os
+import subprocess
+import sys
+
+import cv2
+import numpy as np
+import pytest
+import text_enhancement
+from remove_watermark import remove_watermark
+from text_enhancement import (
+    BYTES_PER_PIXEL,
+    ENHANCE_BASE_DPI,
+    ENHANCE_PARAMS,
+    ENHANCE_PROFILES,
+    NOISE_THRESHOLD,
+    TILED_FRAME_BYTES_PER_PIXEL,
+    enhance_array,
+    enhance_array_tiled,
+    estimate_noise,
+    scale_params,
+    select_profile,
+)
+
+
+def noisy_page(sigma, shape=(400, 300)):
+    rng = np.random.default_rng(0)
+    page = np.full(shape, 235.0)
+    page[100:110, 50:250] = 30
+    return np.clip(page + rng.normal(0, sigma, shape), 0, 255).astype(np.uint8)
+
+
+def test_scale_params_keeps_base_resolution():
+    assert scale_params(ENHANCE_PARAMS, ENHANCE_BASE_DPI) is ENHANCE_PARAMS
+
+
+def test_scale_params_scales_dilation_with_resolution():
+    params = {**ENHANCE_PARAMS, "dilate_iterations": 2}
+
+    assert scale_params(params, 300)["dilate_iterations"] == 1
+    assert scale_params(params, 1200)["dilate_iterations"] == 4
+    assert scale_params(ENHANCE_PARAMS, 150)["dilate_iterations"] == 1
+    assert scale_params(ENHANCE_PARAMS, 1200)["dilate_iterations"] == 2
+
+
+def test_auto_judges_noise_before_watermark_removal():
+    img = noisy_page(20)
+    noise = estimate_noise(img)
+    remove_watermark(img)
+
+    assert noise >= NOISE_THRESHOLD
+    assert select_profile(img, "auto", noise=noise)[0] == "quality"
+    assert select_profile(noisy_page(0), "auto")[0] == "fast"
+
+
+def test_import_has_no_side_effects(tmp_path):
+    main_dir = os.path.dirname(text_enhancement.__file__)
+    code = "import text_enhancement; assert text_enhancement._page_cache is None"
+    env = {**os.environ, "PYTHONPATH": main_dir}
+    subprocess.run([sys.executable, "-c", code], cwd=tmp_path, env=env, check=True)
+
+    assert not (tmp_path / text_enhancement.output_folder).exists()
+
+
+@pytest.fixture(scope="module")
+def text_page():
+    """A noisy 750x1000 page of text on a background that darkens towards the
+    top, so every CLAHE tile row differs (1000 rows is not a multiple of the
+    grid, so the banded path also reproduces CLAHE's padding)."""
+    page = np.tile(np.linspace(140, 240, 1000, dtype=np.uint8)[:, None], (1, 750))
+    page[300:420, 100:400] = 60
+    for y in range(60, 940, 45):
+        cv2.putText(
+            page, "Lorem ipsum dolor sit amet", (30, y), 0, 0.9, 25, thickness=2
+        )
+    noise = np.random.default_rng(1).normal(0, 8, page.shape)
+    return np.clip(page + noise, 0, 255).astype(np.uint8)
+
+
+@pytest.mark.parametrize("profile", ["quality", "fast"])
+def test_banded_enhancement_matches_the_full_frame(text_page, profile):
+    params = ENHANCE_PROFILES[profile]
+    expected = enhance_array(text_page, params)
+    frame_bytes = text_page.size * TILED_FRAME_BYTES_PER_PIXEL
+    row_bytes = text_page.shape[1] * BYTES_PER_PIXEL
+
+    # From the smallest bands (one CLAHE tile row) to two bands per page
+    for band_rows in (1, 250, 500, 700):
+        memory_budget = frame_bytes + band_rows * row_bytes
+        different = enhance_array_tiled(text_page, params, memory_budget) != expected
+
+        # As documented: 99.9% identical, isolated pixels rather than seams
+        assert np.count_nonzero(different) <= different.size * 1e-3
+        assert different.sum(axis=1).max() <= 20